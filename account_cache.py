@@ -0,0 +1,185 @@
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List
+
+from exchange.binance_client import BinanceClient
+from ledger import Ledger
+
+
+def _f(x: Any) -> float:
+    try:
+        return float(x or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _utc_midnight_ms() -> int:
+    return int(datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).timestamp() * 1000)
+
+
+class AccountCache:
+    """
+    Pozisyon, açık emir, bakiye ve gerçekleşen PnL için bellek içi önbellek.
+    Başlangıçta REST ile bir kez doldurulur (`seed`), sonrasında user-data stream
+    olaylarıyla (`apply`) güncel tutulur; koruyucular okuma için REST çağırmaz.
+    `apply` WS thread'inden çağrılır, okumalar kilit altında yapılır.
+    `ledger` verilirse günlük PnL ve kayıp serisi yerel defterden okunur.
+    """
+
+    def __init__(self, streak_window: int = 20, ledger: Ledger | None = None) -> None:
+        self._lock = threading.Lock()
+        self.ledger = ledger
+        self.positions: Dict[str, Dict[str, float]] = {}
+        self.open_orders: Dict[int, Dict[str, Any]] = {}
+        self.balances: Dict[str, float] = {}
+        self._realized_today: float = 0.0
+        self._recent_realized: Deque[float] = deque(maxlen=streak_window)
+        self._day_start_ms: int = _utc_midnight_ms()
+        self.seeded: bool = False
+        self.last_event_ms: int = 0
+
+    # --- REST seed -------------------------------------------------------
+    def seed(self, client: BinanceClient, risks: List[Dict[str, Any]] | None = None, orders: List[Dict[str, Any]] | None = None) -> None:
+        # Açılış mutabakatı aynı toplu görüntüyü paylaşır (pozisyon / emir istekleri tekrarlanmaz)
+        risks = client.get_position_risk() if risks is None else risks
+        orders = client.get_open_orders() if orders is None else orders
+        balances = client.get_balances()
+        day_start = _utc_midnight_ms()
+        if self.ledger is not None:
+            # Gelir geçmişi yalnızca son senkrondan bu yana çekilir
+            self.ledger.sync(client, force=True)
+            income_today = realized = []
+        else:
+            income_today = client.income_history(start_time_ms=day_start)
+            realized = client.income_history(income_type="REALIZED_PNL")
+        with self._lock:
+            self.positions = {}
+            for p in risks or []:
+                amt = _f(p.get("positionAmt"))
+                if abs(amt) > 1e-9:
+                    self.positions[p["symbol"]] = {"amt": amt, "entry": _f(p.get("entryPrice")), "upnl": _f(p.get("unRealizedProfit"))}
+            self.open_orders = {int(o["orderId"]): self._order_row(o) for o in orders or [] if o.get("orderId") is not None}
+            self.balances = {b.get("asset", ""): _f(b.get("balance")) for b in balances or []}
+            self._day_start_ms = day_start
+            self._realized_today = sum(_f(i.get("income")) for i in income_today or [])
+            self._recent_realized.clear()
+            self._recent_realized.extend(_f(i.get("income")) for i in realized or [])
+            self.seeded = True
+
+    @staticmethod
+    def _order_row(o: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "symbol": o.get("symbol"),
+            "clientOrderId": o.get("clientOrderId"),
+            "type": o.get("type") or o.get("origType"),
+            "side": o.get("side"),
+            "status": o.get("status"),
+            "origQty": _f(o.get("origQty")),
+            "executedQty": _f(o.get("executedQty")),
+            "stopPrice": _f(o.get("stopPrice")),
+            "reduceOnly": bool(o.get("reduceOnly")) or bool(o.get("closePosition")),
+        }
+
+    # --- user-data events ------------------------------------------------
+    def _roll_day(self) -> None:
+        day_start = _utc_midnight_ms()
+        if day_start != self._day_start_ms:
+            self._day_start_ms = day_start
+            self._realized_today = 0.0
+
+    def apply(self, evt: Dict[str, Any]) -> None:
+        et = evt.get("e")
+        if self.ledger is not None:
+            try:
+                self.ledger.apply(evt)
+            except Exception:
+                pass
+        with self._lock:
+            self._roll_day()
+            self.last_event_ms = int(evt.get("E", 0) or 0) or int(time.time() * 1000)
+            if et == "ACCOUNT_UPDATE":
+                acc = evt.get("a", {}) or {}
+                for b in acc.get("B", []) or []:
+                    self.balances[b.get("a", "")] = _f(b.get("wb"))
+                    # bc: PnL ve komisyon dışındaki bakiye değişimi (funding fee vb.)
+                    if acc.get("m") == "FUNDING_FEE":
+                        self._realized_today += _f(b.get("bc"))
+                for p in acc.get("P", []) or []:
+                    symbol = p.get("s")
+                    if not symbol:
+                        continue
+                    amt = _f(p.get("pa"))
+                    if abs(amt) < 1e-9:
+                        self.positions.pop(symbol, None)
+                    else:
+                        self.positions[symbol] = {"amt": amt, "entry": _f(p.get("ep")), "upnl": _f(p.get("up"))}
+            elif et == "ORDER_TRADE_UPDATE":
+                o = evt.get("o", {}) or {}
+                oid = o.get("i")
+                if oid is None:
+                    return
+                oid = int(oid)
+                status = o.get("X")
+                if status in ("NEW", "PARTIALLY_FILLED"):
+                    self.open_orders[oid] = {
+                        "symbol": o.get("s"),
+                        "clientOrderId": o.get("c"),
+                        "type": o.get("ot") or o.get("o"),
+                        "side": o.get("S"),
+                        "status": status,
+                        "origQty": _f(o.get("q")),
+                        "executedQty": _f(o.get("z")),
+                        "stopPrice": _f(o.get("sp")),
+                        "reduceOnly": bool(o.get("R")) or bool(o.get("cp")),
+                    }
+                else:
+                    self.open_orders.pop(oid, None)
+                if o.get("x") == "TRADE":
+                    rp = _f(o.get("rp"))
+                    self._realized_today += rp - _f(o.get("n"))
+                    if abs(rp) > 1e-12:
+                        self._recent_realized.append(rp)
+
+    # --- reads -----------------------------------------------------------
+    def position_amt(self, symbol: str) -> float:
+        with self._lock:
+            return self.positions.get(symbol, {}).get("amt", 0.0)
+
+    def open_positions(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {s: dict(p) for s, p in self.positions.items()}
+
+    def open_positions_count(self) -> int:
+        with self._lock:
+            return len(self.positions)
+
+    def orders_for(self, symbol: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(o, orderId=oid) for oid, o in self.open_orders.items() if o.get("symbol") == symbol]
+
+    def balance(self, asset: str = "USDT") -> float:
+        with self._lock:
+            return self.balances.get(asset, 0.0)
+
+    def realized_pnl_today(self) -> float:
+        if self.ledger is not None:
+            return self.ledger.realized_pnl_today()
+        with self._lock:
+            self._roll_day()
+            return self._realized_today
+
+    def losing_streak(self, window: int = 5) -> int:
+        if self.ledger is not None:
+            return self.ledger.losing_streak(window)
+        with self._lock:
+            last = list(self._recent_realized)[-window:]
+        streak = 0
+        for v in reversed(last):
+            if v < 0:
+                streak += 1
+            else:
+                break
+        return streak
@@ -4,43 +4,126 @@ from datetime import datetime, timezone, timedelta
 import pandas as pd
 
 from config import CFG
-from exchange.binance_client import BinanceClient
-from indicators import to_dataframe
-from ws_manager import WSManager
+from exchange.binance_client import BinanceClient, BracketError
+from indicators import atr as atr_ind, to_dataframe
+from ws_manager import ClosedBar, CoalescingBridge, WSManager, rest_kline_row
+from price_feed import MarkPriceFeed
+from position_state import STOP_TAGS, PositionBook
+from entry_executor import EntryExecutor
+from trailing import TrailingManager
+from order_scheduler import ENTRY, FLATTEN, STOP, OrderScheduler
+from latency import LATENCY, Trace, mono_from_ms
 from user_stream import UserStream
-from strategy import StrategyParams, evaluate
-from simple_strategy import evaluate_simple
-from indicators import atr as atr_ind
+from account_cache import AccountCache
+from state_store import StateJournal
+from reconcile import commit, fetch_snapshot, plan, run_repairs
+from ledger import Ledger, summary_text
+from strategy import GATE_STATS, StrategyParams
+from signal_pool import EvalResult, SignalPool
 from notifier.telegram import TelegramNotifier
-from telegram_commands import TelegramCommandPoller
+from telegram_commands import CommandListener
 
 BAR_CACHE: dict[tuple[str,str], list[list]] = {}
 ACTIVE: dict[str, dict] = {}
+# Dolum / PnL defteri: günlük PnL ve kayıp serisi yerel sorgudan
+LEDGER = Ledger(CFG.ledger_path, CFG.ledger_sync_seconds, CFG.ledger_bootstrap_days)
+ACCOUNT = AccountCache(ledger=LEDGER)
+# ACTIVE değişiklikleri günlüğe (yeniden başlatmada geri yüklenir)
+JOURNAL = StateJournal(CFG.state_path, CFG.state_fsync_ms, CFG.state_compact_every)
+# clientOrderId etiketli bacaklardan pozisyon durum makinesi
+BOOK = PositionBook()
 DAILY_TRADES: int = 0
+# Giden emir kuyruğu (öncelik + sembol sırası + SL birleştirme); kova main'de istemciden bağlanır
+ORDERS = OrderScheduler(workers=CFG.order_workers, entry_reserve=CFG.entry_rate_reserve)
+# Giriş yürütücüsü: giriş başına bir task; bekleyen girişler limit hesabına dahil
+ENTRIES = EntryExecutor(CFG.maker_offset_bps, CFG.maker_wait_seconds, CFG.maker_reprice_max, CFG.order_retry_max, CFG.order_retry_backoff_ms, sched=ORDERS)
+PENDING_ENTRIES: set[str] = set()
+ENTRY_TASKS: set[asyncio.Task] = set()
+# Gölge mod karşılaştırması: aktif / gölge sinyal sayıları ve aynı yönde çakışanlar
+SHADOW: dict[str, int] = {"primary": 0, "shadow": 0, "agree": 0}
 LAST_REFRESH: datetime | None = None
 
 
-def upsert_bar_cache(k: dict) -> None:
-    s = k["s"].upper()
-    tf = k["i"]
-    key = (s, tf)
-    o = float(k["o"]); h = float(k["h"]); l = float(k["l"]); c = float(k["c"])
-    v = float(k["v"]); ot = int(k["t"]); ct = int(k["T"])
-    row = [ot, o, h, l, c, v, ct, 0.0, 0, 0.0, 0.0, ""]
-    BAR_CACHE.setdefault(key, []).append(row)
+def upsert_bar_cache(bar: ClosedBar) -> None:
+    key = (bar.symbol, bar.interval)
+    rows = BAR_CACHE.setdefault(key, [])
+    # Açılış zamanına göre sıralı birleştirme: geç gelen (backfill) bar yerine girer,
+    # aynı açılış zamanlı bar (ör. yeniden bağlanma sonrası tekrar) üzerine yazılır
+    i = len(rows)
+    while i > 0 and rows[i - 1][0] > bar.row[0]:
+        i -= 1
+    if i > 0 and rows[i - 1][0] == bar.row[0]:
+        rows[i - 1] = bar.row
+    else:
+        rows.insert(i, bar.row)
     if len(BAR_CACHE[key]) > 1200:
         BAR_CACHE[key] = BAR_CACHE[key][-800:]
 
 
+def bar_stamps(bar: ClosedBar, dequeued: float, offset_ms: float) -> dict[str, float]:
+    """Barın gecikme damgaları: kapanış (kline `T`, borsa saati), WS alımı, döngüden alınış."""
+    st = {"close": mono_from_ms(bar.row[6], offset_ms), "dequeue": dequeued}
+    if bar.recv:
+        st["recv"] = bar.recv
+    return st
+
+
 def df_for(symbol: str, tf: str) -> pd.DataFrame:
     rows = BAR_CACHE.get((symbol, tf), [])
     return to_dataframe(rows)
 
 
+def pick_symbols(client: BinanceClient) -> list[str]:
+    # Tek 24h ticker anlık görüntüsü (TTL önbellekli); sembol başına fiyat isteği yok
+    return client.get_top_usdt_perp_symbols(30, CFG.exclude_symbols, CFG.preferred_price_max, CFG.low_price_priority_max, min_quote_volume=CFG.universe_min_quote_volume)[:CFG.max_concurrent_symbols]
+
+
 def cid(tag: str, symbol: str) -> str:
     return f"{symbol}-{tag}-{int(time.time()*1000)}"
 
 
+def schedule_sl_move(symbol: str, target_sl: float, tag: str, client: BinanceClient, tg: TelegramNotifier, note: str, be: bool = False) -> None:
+    """
+    SL taşıma (iptal + yeni STOP_MARKET) STOP önceliğiyle kuyruğa girer; aynı pozisyonun
+    henüz gönderilmemiş taşıması yenisiyle birleşir, yalnızca en güncel seviye borsaya gider.
+    """
+    state = ACTIVE[symbol]
+    new_sl_fmt = client.format_price(symbol, target_sl)
+    close_side = "SELL" if state["side"] == "BUY" else "BUY"
+    # Bekleyen hedef: sonraki tick'ler yalnızca bundan daha iyi seviyeler için yeni iş açar
+    state["sl_target"] = float(new_sl_fmt)
+
+    def move() -> None:
+        # Kuyrukta beklerken pozisyon kapanmış olabilir: ölü SL'yi iptal edip düz sembole stop koyma
+        if ACTIVE.get(symbol) is not state or BOOK.is_flat(symbol):
+            return
+        try:
+            if state.get("sl_order_id"):
+                client.cancel_order(symbol, order_id=state["sl_order_id"])
+        except Exception:
+            pass
+        resp = client.place_stop_market(symbol, close_side, new_sl_fmt, close_position=True, reduce_only=True, client_id=cid(tag, symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
+        if ACTIVE.get(symbol) is not state:
+            # Gönderim sırasında kapandı: yeni stop sonraki pozisyonu eski seviyeden kapatmasın
+            if isinstance(resp, dict) and resp.get("orderId"):
+                client.cancel_order(symbol, order_id=resp["orderId"])
+            return
+        state["sl_order_id"] = resp.get("orderId") if isinstance(resp, dict) else None
+        state["sl_price"] = float(new_sl_fmt)
+        if be:
+            state["be_done"] = True
+        JOURNAL.update(symbol, sl_order_id=state["sl_order_id"], sl_price=state["sl_price"], be_done=state["be_done"])
+        # Ardışık taşımalar gönderilmeden önce tek mesajda birleşir (en güncel seviye)
+        tg.send(note.format(sl=new_sl_fmt), key=f"{symbol}:SL")
+
+    def done(f: asyncio.Future) -> None:
+        if not f.cancelled() and f.exception() is not None:
+            state["sl_target"] = state["sl_price"]
+            tg.send(f"⚠️ {symbol} SL taşıma hatası: {f.exception()}")
+
+    ORDERS.submit(STOP, symbol, move, coalesce=f"{symbol}:SL", weight=2, orders=1).add_done_callback(done)
+
+
 def maybe_move_to_lock_profit(symbol: str, last_price: float, client: BinanceClient, tg: TelegramNotifier) -> None:
     state = ACTIVE.get(symbol)
     if not state or state.get("be_done"):
@@ -48,74 +131,21 @@ def maybe_move_to_lock_profit(symbol: str, last_price: float, client: BinanceCli
     side = state["side"]
     entry = float(state["entry"])
     atr_val = float(state["atr"])
-    old_sl = float(state["sl_price"])
+    old_sl = float(state.get("sl_target", state["sl_price"]))
     be_trg = CFG.be_trigger_atr_mult * atr_val
     lock_atr = CFG.lock_profit_atr_mult * atr_val
     if side == "BUY":
         target_sl = entry + lock_atr
         if last_price >= entry + be_trg and target_sl > old_sl:
-            try:
-                if state.get("sl_order_id"):
-                    client.cancel_order(symbol, order_id=state["sl_order_id"])
-            except Exception:
-                pass
-            new_sl_fmt = client.format_price(symbol, target_sl)
-            resp = client.place_stop_market(symbol, "SELL", new_sl_fmt, close_position=True, reduce_only=True, client_id=cid("SLBE", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
-            state["sl_order_id"] = resp.get("orderId") if isinstance(resp, dict) else None
-            state["sl_price"] = float(new_sl_fmt)
-            state["be_done"] = True
-            asyncio.create_task(tg.send_async(f"🔒 {symbol} SL kilit kâr (LONG): {new_sl_fmt}"))
+            schedule_sl_move(symbol, target_sl, "SLBE", client, tg, f"🔒 {symbol} SL kilit kâr (LONG): {{sl}}", be=True)
     else:
         target_sl = entry - lock_atr
         if last_price <= entry - be_trg and target_sl < old_sl:
-            try:
-                if state.get("sl_order_id"):
-                    client.cancel_order(symbol, order_id=state["sl_order_id"])
-            except Exception:
-                pass
-            new_sl_fmt = client.format_price(symbol, target_sl)
-            resp = client.place_stop_market(symbol, "BUY", new_sl_fmt, close_position=True, reduce_only=True, client_id=cid("SLBE", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
-            state["sl_order_id"] = resp.get("orderId") if isinstance(resp, dict) else None
-            state["sl_price"] = float(new_sl_fmt)
-            state["be_done"] = True
-            asyncio.create_task(tg.send_async(f"🔒 {symbol} SL kilit kâr (SHORT): {new_sl_fmt}"))
+            schedule_sl_move(symbol, target_sl, "SLBE", client, tg, f"🔒 {symbol} SL kilit kâr (SHORT): {{sl}}", be=True)
 
 
-def apply_tp2_trailing(symbol: str, last_price: float, client: BinanceClient, tg: TelegramNotifier) -> None:
-    state = ACTIVE.get(symbol)
-    if not state or not state.get("tp1_hit"):
-        return
-    side = state["side"]
-    entry = float(state["entry"])
-    atr_val = float(state["atr"])
-    trail = CFG.trail_atr_mult * atr_val
-    old_sl = float(state["sl_price"])
-    if side == "BUY":
-        target_sl = max(old_sl, last_price - trail)
-        if target_sl > old_sl:
-            try:
-                if state.get("sl_order_id"):
-                    client.cancel_order(symbol, order_id=state["sl_order_id"])
-            except Exception:
-                pass
-            new_sl_fmt = client.format_price(symbol, target_sl)
-            resp = client.place_stop_market(symbol, "SELL", new_sl_fmt, close_position=True, reduce_only=True, client_id=cid("SLTR", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
-            state["sl_order_id"] = resp.get("orderId") if isinstance(resp, dict) else None
-            state["sl_price"] = float(new_sl_fmt)
-            asyncio.create_task(tg.send_async(f"🧭 {symbol} SL trail (LONG): {new_sl_fmt}"))
-    else:
-        target_sl = min(old_sl, last_price + trail)
-        if target_sl < old_sl:
-            try:
-                if state.get("sl_order_id"):
-                    client.cancel_order(symbol, order_id=state["sl_order_id"])
-            except Exception:
-                pass
-            new_sl_fmt = client.format_price(symbol, target_sl)
-            resp = client.place_stop_market(symbol, "BUY", new_sl_fmt, close_position=True, reduce_only=True, client_id=cid("SLTR", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
-            state["sl_order_id"] = resp.get("orderId") if isinstance(resp, dict) else None
-            state["sl_price"] = float(new_sl_fmt)
-            asyncio.create_task(tg.send_async(f"🧭 {symbol} SL trail (SHORT): {new_sl_fmt}"))
+# TP1 sonrası trailing: eşik + sembol başına hız sınırı + toplu geçiş (bkz. trailing.py)
+TRAILER = TrailingManager(ACTIVE, schedule_sl_move, CFG.trail_atr_mult, CFG.trail_min_ticks, CFG.trail_min_atr_frac, CFG.trail_min_interval_s, CFG.trail_settle_s, CFG.trail_batch_ms)
 
 
 async def consume_user_events(us: UserStream, client: BinanceClient, tg: TelegramNotifier) -> None:
@@ -127,7 +157,10 @@ async def consume_user_events(us: UserStream, client: BinanceClient, tg: Telegra
             today = datetime.now(timezone.utc).date()
             if today != last_day:
                 DAILY_TRADES = 0
+                prev = datetime(last_day.year, last_day.month, last_day.day, tzinfo=timezone.utc)
                 last_day = today
+                start_ms = int(prev.timestamp() * 1000)
+                tg.send(summary_text(LEDGER.day_summary(start_ms, start_ms + 86_400_000)))
 
             et = evt.get("e")
             if et == "ACCOUNT_UPDATE":
@@ -138,141 +171,277 @@ async def consume_user_events(us: UserStream, client: BinanceClient, tg: Telegra
                         amt = float(p.get("pa", 0) or 0)
                     except Exception:
                         amt = 0.0
+                    if symbol and abs(amt) < 1e-9:
+                        # Giriş dolumu kaçırılmış (miktarı bilinmeyen) kayıt pozisyondan uzun yaşamasın
+                        BOOK.drop(symbol)
                     if symbol and abs(amt) < 1e-9 and symbol in ACTIVE:
                         ACTIVE.pop(symbol, None)
+                        ORDERS.cancel(f"{symbol}:SL")
+                        JOURNAL.close(symbol)
                         tg.send(f"✅ Pozisyon kapandı: {symbol}")
             elif et == "ORDER_TRADE_UPDATE":
-                o = evt.get("o", {})
-                symbol = o.get("s")
-                order_type = o.get("ot")
-                status = o.get("X")
-                exec_type = o.get("x")
-                if status == "FILLED" and symbol:
-                    if order_type == "TAKE_PROFIT_MARKET":
-                        # TP1 veya TP2 olabilir: miktara bakmak için ek sorgu gerekir
-                        st = ACTIVE.get(symbol)
-                        if st and not st.get("tp1_hit"):
+                ENTRIES.on_event(evt)
+                LATENCY.on_event(evt)
+                # Bacaklar cid etiketine göre ayrışır (TP1/TP2/SL/SLBE/SLTR/TRAIL); ek REST sorgusu yok
+                for tr in BOOK.apply(evt):
+                    st = ACTIVE.get(tr.symbol)
+                    if tr.event == "FILLED" and tr.tag == "TP1":
+                        if st is not None:
                             st["tp1_hit"] = True
-                            tg.send(f"📥 {symbol} TP1 filled")
-                    elif order_type == "STOP_MARKET":
-                        tg.send(f"📥 {symbol} SL filled")
+                            JOURNAL.update(tr.symbol, tp1_hit=True)
+                        tg.send(f"📥 {tr.symbol} TP1 filled ({tr.qty:g} @ {tr.price:g})")
+                    elif tr.event == "PARTIAL" and tr.tag in ("TP1", "TP2"):
+                        tg.send(f"📥 {tr.symbol} {tr.tag} kısmi dolum: {tr.qty:g} @ {tr.price:g} (kalan {BOOK.open_size(tr.symbol):g})")
+                    elif tr.event == "FILLED" and tr.tag == "TP2":
+                        tg.send(f"📥 {tr.symbol} TP2 filled ({tr.qty:g} @ {tr.price:g})")
+                    elif tr.event == "FILLED" and tr.tag in STOP_TAGS:
+                        tg.send(f"📥 {tr.symbol} {tr.tag} filled ({tr.qty:g} @ {tr.price:g})")
+                    elif tr.event == "FILLED" and tr.tag == "TRAIL":
+                        tg.send(f"📥 {tr.symbol} trailing stop filled ({tr.qty:g} @ {tr.price:g})")
+                    elif tr.event == "CLOSED" and st is not None:
+                        ACTIVE.pop(tr.symbol, None)
+                        ORDERS.cancel(f"{tr.symbol}:SL")
+                        JOURNAL.close(tr.symbol)
+                        tg.send(f"✅ Pozisyon kapandı: {tr.symbol}")
         except Exception:
             pass
 
 
+async def backfill_gap(client: BinanceClient, wsm: WSManager, streams: list[str], since_ms: int) -> int:
+    """Kesinti boyunca kaçırılan kapanmış barları REST ile önbelleğe yaz; son barı değerlendirmeye gönder."""
+    now_ms = int(time.time() * 1000)
+    filled = 0
+    for stream in streams:
+        sym, _, tf = stream.partition("@kline_")
+        symbol = sym.upper()
+        rows = BAR_CACHE.get((symbol, tf), [])
+        start = int(rows[-1][0]) + 1 if rows else since_ms
+        try:
+            raw = await asyncio.to_thread(client.get_klines_range, symbol, tf, start, now_ms)
+        except Exception:
+            continue
+        missed = [rest_kline_row(r) for r in raw if int(r[6]) < now_ms]
+        # REST beklenirken canlı akış daha yeni bar eklemiş olabilir: sıralı birleştirilir
+        for row in missed[:-1]:
+            upsert_bar_cache(ClosedBar(symbol, tf, row))
+        if missed:
+            last = ClosedBar(symbol, tf, missed[-1])
+            rows = BAR_CACHE.get((symbol, tf), [])
+            if rows and rows[-1][0] >= last.row[0]:
+                upsert_bar_cache(last)
+            else:
+                # Son kaçırılan bar normal akıştan geliyormuş gibi bars_loop'a gider; slotta
+                # bekleyen daha yeni canlı barın yerine geçmez
+                wsm.bridge.put((symbol, tf), last, stale=lambda old, new: old.row[0] >= new.row[0])
+        filled += len(missed)
+    return filled
+
+
+async def reseed_after_user_gap(client: BinanceClient) -> None:
+    """Kesinti sırasında kaçan hesap / emir olayları: hesap önbelleği ve pozisyon defteri tek REST görüntüsüyle tazelenir."""
+    risks, orders = await asyncio.to_thread(fetch_snapshot, client)
+    await asyncio.to_thread(ACCOUNT.seed, client, risks, orders)
+    BOOK.reseed(risks, orders)
+
+
+async def ws_supervisor(client: BinanceClient, wsm: WSManager, us: UserStream, tg: TelegramNotifier) -> None:
+    """Kline shard'ları ve user stream için liveness watchdog + listenKey keepalive."""
+    async def on_gap(streams: list[str], since_ms: int) -> None:
+        n = await backfill_gap(client, wsm, streams, since_ms)
+        gap_s = max(0.0, time.time() - since_ms / 1000.0)
+        await tg.send_async(f"🔌 WS yeniden bağlandı ({len(streams)} stream, kesinti ~{gap_s:.0f}s), {n} bar REST ile tamamlandı")
+
+    async def on_user_reconnect() -> None:
+        await reseed_after_user_gap(client)
+        await tg.send_async("🔌 User stream yeniden bağlandı, hesap önbelleği ve pozisyon defteri tazelendi")
+
+    await asyncio.gather(
+        wsm.supervise(on_gap, stale_s=CFG.ws_stale_seconds),
+        us.supervise(on_user_reconnect),
+    )
+
+
+async def price_loop(client: BinanceClient, tg: TelegramNotifier, feed: MarkPriceFeed, prices: CoalescingBridge) -> None:
+    """Açık pozisyonların fiyat tick'leri: kilit kâr / trailing bar kapanışını beklemez."""
+    prices.bind(asyncio.get_running_loop())
+    while True:
+        # Abonelikleri açık pozisyonlarla eşitle
+        if set(ACTIVE) != feed.symbols:
+            try:
+                await asyncio.to_thread(feed.set_symbols, list(ACTIVE.keys()))
+            except Exception:
+                pass
+        try:
+            symbol, px = await asyncio.wait_for(prices.get(), timeout=1.0)
+        except asyncio.TimeoutError:
+            # Tick gelmiyorsa akışı yokla (ölü/sessiz bağlantı -> yeniden bağlan)
+            await asyncio.to_thread(feed.check)
+            continue
+        if CFG.trailing_enabled and symbol in ACTIVE:
+            maybe_move_to_lock_profit(symbol, px, client, tg)
+            TRAILER.on_price(symbol, px)
+
+
 async def symbol_refresh_loop(client: BinanceClient, wsm: WSManager, tg: TelegramNotifier) -> None:
     global LAST_REFRESH
     LAST_REFRESH = datetime.now(timezone.utc)
     while True:
         await asyncio.sleep(CFG.symbol_refresh_hours * 3600)
         try:
-            symbols = client.get_top_usdt_perp_symbols(30, CFG.exclude_symbols, CFG.preferred_price_max, CFG.low_price_priority_max)[:CFG.max_concurrent_symbols]
-            # basit re-subscribe: yeni WSManager başlat (kapanış basit bırakıldı)
-            await wsm.restart(symbols, [CFG.entry_tf, CFG.mtf_fast, CFG.mtf_slow1, CFG.mtf_slow2])
-            await tg.send_async("🔁 WS symbols refreshed: " + ", ".join(symbols))
+            symbols = await asyncio.to_thread(pick_symbols, client)
+            # Artımlı SUBSCRIBE/UNSUBSCRIBE: açık bağlantılar ve akan barlar korunur
+            diff = await wsm.update(symbols, [CFG.entry_tf, CFG.mtf_fast, CFG.mtf_slow1, CFG.mtf_slow2])
+            await tg.send_async(f"🔁 WS symbols refreshed (+{diff['added']} / -{diff['removed']} stream, {diff['connections']} conn): " + ", ".join(symbols))
             LAST_REFRESH = datetime.now(timezone.utc)
         except Exception as e:
             tg.send(f"⚠️ WS symbol refresh error: {e}")
 
 
-async def command_loop(client: BinanceClient, tg: TelegramNotifier, poller: TelegramCommandPoller, paused_state: dict) -> None:
-    while True:
-        await asyncio.sleep(2)
-        # Offload blocking HTTP polling to a thread
-        cmds = await asyncio.to_thread(poller.get_commands)
-        for (cmd, from_id) in cmds:
-            if CFG.admin_user_id and from_id != str(CFG.admin_user_id):
-                continue
-            # Komut adını normalize et: "/cmd arg" veya "/cmd@bot" -> "/cmd"
-            name = cmd.strip().split()[0].lower()
-            if "@" in name:
-                name = name.split("@", 1)[0]
-
-            if name == "/pause":
-                paused_state["paused"] = True
-                await tg.send_async("⏸️ Sistem durduruldu (manuel işlem serbest)")
-            elif name == "/resume":
-                paused_state["paused"] = False
-                await tg.send_async("▶️ Sistem devam ediyor")
-            elif name == "/status":
-                await tg.send_async(f"ℹ️ RUN_MODE={CFG.run_mode}, Mod={'simple' if CFG.simple_mode else 'advanced'}, Lev={CFG.leverage}x, Size={CFG.order_usdt_size} USDT")
-            elif name == "/autocoins":
-                try:
-                    symbols = await asyncio.to_thread(client.get_top_usdt_perp_symbols, 30, CFG.exclude_symbols, CFG.preferred_price_max, CFG.low_price_priority_max)
-                    symbols = symbols[:CFG.max_concurrent_symbols]
-                    await tg.send_async("🔁 Auto symbols: " + ", ".join(symbols))
-                except Exception as e:
-                    await tg.send_async(f"⚠️ autocoins error: {e}")
-            elif name == "/symbols":
-                try:
-                    risks = await asyncio.to_thread(client.get_position_risk)
-                    pos = [f"{p.get('symbol')}:{p.get('positionAmt')}" for p in risks if abs(float(p.get('positionAmt',0) or 0))>1e-9]
-                    await tg.send_async("ℹ️ Positions: " + (", ".join(pos) if pos else "none"))
-                except Exception as e:
-                    await tg.send_async(f"⚠️ symbols error: {e}")
-            elif name == "/risk":
-                await tg.send_async(f"ℹ️ Risk USDT: {CFG.risk_usdt_per_trade}, Leverage: {CFG.leverage}x")
-            elif name == "/flat":
-                try:
-                    risks = await asyncio.to_thread(client.get_position_risk)
-                    for p in risks:
-                        symbol = p.get("symbol")
-                        amt = float(p.get("positionAmt", 0) or 0)
-                        if not symbol or abs(amt) < 1e-9:
-                            continue
-                        side = "SELL" if amt > 0 else "BUY"
-                        qty = client.format_qty(symbol, abs(amt))
-                        await asyncio.to_thread(client.place_market_order, symbol, side, qty, True, cid("FLAT", symbol), CFG.order_retry_max, CFG.order_retry_backoff_ms)
-                    await tg.send_async("🧹 Tüm pozisyonlar kapatıldı (flat)")
-                except Exception as e:
-                    await tg.send_async(f"⚠️ flat error: {e}")
-            elif name in ("/selftest", "selftest"):
-                try:
-                    await tg.send_async("🧪 SelfTest başladı...")
-
-                    # 1) Test sembolü: aktif listeden ya da düşmezse BTCUSDT
-                    try:
-                        top = client.get_top_usdt_perp_symbols(limit=1, min_price=0.0, exclude=["BNB","BTC","ETH","SOL"])
-                        symbol = top[0] if top else "BTCUSDT"
-                        await tg.send_async(f"🧪 Symbol seçildi: {symbol}")
-                    except Exception as e:
-                        symbol = "BTCUSDT"
-                        await tg.send_async(f"🧪 Symbol hatası, BTCUSDT kullanılıyor: {e}")
-
-                    # 2) Piyasa fiyatı ve küçük miktar
-                    ticker = await asyncio.to_thread(client._retry, lambda: client.um.mark_price(symbol=symbol))
-                    mark = float(ticker.get("markPrice", "0"))
-                    qty = client.format_qty(symbol, max(0.001, (CFG.order_size_usdt or 5.0) / max(mark, 1e-8)))
-                    await tg.send_async(f"🧪 Fiyat: {mark}, Miktar: {qty}")
-
-                    # 3) Post-only (GTX) limit buy (fill olmasın); 2 sn sonra iptal
-                    limit_price = client.format_price(symbol, mark * (1 - CFG.maker_offset_bps / 10000.0))
-                    res = await asyncio.to_thread(client._retry, lambda: client.um.new_order(
-                        symbol=symbol, side="BUY", type="LIMIT",
-                        quantity=qty, price=limit_price, timeInForce="GTX",
-                        newClientOrderId=cid("selftest", symbol)
-                    ))
-                    oid = (res or {}).get("orderId") or (res or {}).get("clientOrderId")
-                    await tg.send_async(f"🧪 GTX LIMIT gönderildi: {symbol} {qty} @{limit_price} (oid={oid})")
-                    await asyncio.sleep(2)
-                    try:
-                        if oid:
-                            if isinstance(oid, int):
-                                await asyncio.to_thread(client.cancel_order, symbol, oid, None)
-                            else:
-                                await asyncio.to_thread(client.cancel_order, symbol, None, str(oid))
-                            await tg.send_async("🧪 Emir iptal edildi")
-                    except Exception as e:
-                        await tg.send_async(f"🧪 İptal hatası: {e}")
+def register_commands(listener: CommandListener, client: BinanceClient, tg: TelegramNotifier, paused_state: dict, wsm: WSManager | None = None) -> None:
+    """Telegram komut işleyicileri; her komut geldiği anda kendi task'ında çalışır (bkz. CommandListener)."""
 
-                    await tg.send_async("✅ SelfTest tamamlandı!")
-                except Exception as e:
-                    await tg.send_async(f"⚠️ SelfTest genel hata: {e}")
+    @listener.command("/pause")
+    async def cmd_pause(cmd: str, args: list[str]) -> None:
+        paused_state["paused"] = True
+        await tg.send_async("⏸️ Sistem durduruldu (manuel işlem serbest)")
 
+    @listener.command("/resume")
+    async def cmd_resume(cmd: str, args: list[str]) -> None:
+        paused_state["paused"] = False
+        await tg.send_async("▶️ Sistem devam ediyor")
 
-async def bars_loop(client: BinanceClient, tg: TelegramNotifier, wsm: WSManager, paused_state: dict) -> None:
-    global DAILY_TRADES
-    params = StrategyParams(
+    @listener.command("/mode")
+    async def cmd_mode(cmd: str, args: list[str]) -> None:
+        arg = args[0] if args else ""
+        if arg in ("simple", "advanced"):
+            # Bar önbelleği ve gösterge grafı ortak: geçiş bir sonraki bar kapanışında etkili
+            paused_state["simple_mode"] = arg == "simple"
+            await tg.send_async("✅ Mod: Basit" if arg == "simple" else "✅ Mod: Gelişmiş")
+        else:
+            await tg.send_async("⚠️ /mode kullanım: /mode simple | /mode advanced")
+
+    @listener.command("/status")
+    async def cmd_status(cmd: str, args: list[str]) -> None:
+        clk = client.clock.metrics()
+        simple = paused_state.get("simple_mode", CFG.simple_mode)
+        await tg.send_async(f"ℹ️ RUN_MODE={CFG.run_mode}, Mod={'simple' if simple else 'advanced'}, Lev={CFG.leverage}x, Size={CFG.order_usdt_size} USDT, Clock={clk['offset_ms']}ms (rtt {clk['rtt_ms']}ms)")
+        if CFG.shadow_mode:
+            await tg.send_async(f"ℹ️ Gölge ({'advanced' if simple else 'simple'}): aktif {SHADOW['primary']} / gölge {SHADOW['shadow']} sinyal, aynı yönde {SHADOW['agree']}")
+        if ORDERS.limiter is not None:
+            lim = ORDERS.limiter.metrics()
+            q = ORDERS.depth()
+            await tg.send_async(f"ℹ️ Emir kuyruğu: flatten {q['flatten']} / stop {q['stop']} / tp {q['tp']} / entry {q['entry']}, birleşen SL {ORDERS.stats['coalesced']}, beklenen {ORDERS.stats['paced']} | kova ağırlık {lim['weight_free']:.0%} emir {lim['orders_free']:.0%}, 429/418 {lim['banned']}")
+        if CFG.trail_mode != "native":
+            tm = TRAILER.metrics()
+            await tg.send_async(f"ℹ️ Trailing: {tm['tracked']} pozisyon, taşıma {tm['moves']} + yerleşme {tm['settled']}, eşik altı {tm['suppressed']} / {tm['ticks']} fiyat")
+        await tg.send_async(f"ℹ️ Telegram: kuyruk {tg.depth()}, gönderim {tg.stats['posts']}, özete katılan {tg.stats['merged']}, birleşen {tg.stats['coalesced']}, atlanan {tg.stats['dropped']}, 429 {tg.stats['rate_limited']}")
+        if wsm is not None:
+            ws = wsm.stats()
+            await tg.send_async(f"ℹ️ WS: {ws['connections']} conn / {ws['streams']} stream, kuyruk {ws['depth']} (max {ws['max_depth']}), birleşen {ws['coalesced']}, düşen {ws['dropped']}, yeniden bağlanma {ws['reconnects']}, en eski stream {ws['oldest_stream_age_s']}s")
+
+    @listener.command("/autocoins")
+    async def cmd_autocoins(cmd: str, args: list[str]) -> None:
+        try:
+            symbols = await asyncio.to_thread(pick_symbols, client)
+            await tg.send_async("🔁 Auto symbols: " + ", ".join(symbols))
+        except Exception as e:
+            await tg.send_async(f"⚠️ autocoins error: {e}")
+
+    @listener.command("/symbols")
+    async def cmd_symbols(cmd: str, args: list[str]) -> None:
+        try:
+            pos = [f"{s}:{p['amt']}" for s, p in ACCOUNT.open_positions().items()]
+            await tg.send_async("ℹ️ Positions: " + (", ".join(pos) if pos else "none"))
+            legs = BOOK.summary()
+            if legs:
+                await tg.send_async("ℹ️ Legs:\n" + "\n".join(legs))
+        except Exception as e:
+            await tg.send_async(f"⚠️ symbols error: {e}")
+
+    @listener.command("/risk")
+    async def cmd_risk(cmd: str, args: list[str]) -> None:
+        await tg.send_async(f"ℹ️ Risk USDT: {CFG.risk_usdt_per_trade}, Leverage: {CFG.leverage}x")
+
+    @listener.command("/gates")
+    async def cmd_gates(cmd: str, args: list[str]) -> None:
+        lines = GATE_STATS.lines()
+        await tg.send_async("ℹ️ Kapılar (reddedilen/toplam, ort. süre):\n" + ("\n".join(lines) if lines else "henüz değerlendirme yok"))
+
+    @listener.command("/latency")
+    async def cmd_latency(cmd: str, args: list[str]) -> None:
+        arg = args[0].upper() if args else "*"
+        lines = LATENCY.lines(arg)
+        title = "tüm semboller" if arg == "*" else arg
+        await tg.send_async(f"ℹ️ Gecikme ({title}; tamamlanan {LATENCY.completed}, düşen {LATENCY.dropped}):\n" + ("\n".join(lines) if lines else "henüz dolum yok"))
+
+    @listener.command("/flat")
+    async def cmd_flat(cmd: str, args: list[str]) -> None:
+        try:
+            # Önbellek user stream ile güncel: kapatma emirleri ek REST turu beklemeden çıkar
+            if ACCOUNT.seeded:
+                positions = [(symbol, p["amt"]) for symbol, p in ACCOUNT.open_positions().items()]
+            else:
+                positions = [(p.get("symbol"), float(p.get("positionAmt", 0) or 0)) for p in await asyncio.to_thread(client.get_position_risk)]
+            closes = []
+            for symbol, amt in positions:
+                if not symbol or abs(amt) < 1e-9:
+                    continue
+                side = "SELL" if amt > 0 else "BUY"
+                qty = client.format_qty(symbol, abs(amt))
+                # En yüksek öncelik: kuyruktaki girişlerin ve SL taşımalarının önüne geçer
+                closes.append(ORDERS.submit(FLATTEN, symbol, client.place_market_order, symbol, side, qty, True, cid("FLAT", symbol), CFG.order_retry_max, CFG.order_retry_backoff_ms))
+            await asyncio.gather(*closes)
+            await tg.send_async("🧹 Tüm pozisyonlar kapatıldı (flat)")
+        except Exception as e:
+            await tg.send_async(f"⚠️ flat error: {e}")
+
+    @listener.command("/selftest", "selftest")
+    async def cmd_selftest(cmd: str, args: list[str]) -> None:
+        try:
+            await tg.send_async("🧪 SelfTest başladı...")
+
+            # 1) Test sembolü: aktif listeden ya da düşmezse BTCUSDT
+            try:
+                top = client.get_top_usdt_perp_symbols(limit=1, min_price=0.0, exclude=["BNB","BTC","ETH","SOL"])
+                symbol = top[0] if top else "BTCUSDT"
+                await tg.send_async(f"🧪 Symbol seçildi: {symbol}")
+            except Exception as e:
+                symbol = "BTCUSDT"
+                await tg.send_async(f"🧪 Symbol hatası, BTCUSDT kullanılıyor: {e}")
+
+            # 2) Piyasa fiyatı ve küçük miktar
+            ticker = await asyncio.to_thread(client._retry, lambda: client.um.mark_price(symbol=symbol))
+            mark = float(ticker.get("markPrice", "0"))
+            qty = client.format_qty(symbol, max(0.001, (CFG.order_size_usdt or 5.0) / max(mark, 1e-8)))
+            await tg.send_async(f"🧪 Fiyat: {mark}, Miktar: {qty}")
+
+            # 3) Post-only (GTX) limit buy (fill olmasın); 2 sn sonra iptal
+            limit_price = client.format_price(symbol, mark * (1 - CFG.maker_offset_bps / 10000.0))
+            res = await asyncio.to_thread(client._retry, lambda: client.um.new_order(
+                symbol=symbol, side="BUY", type="LIMIT",
+                quantity=qty, price=limit_price, timeInForce="GTX",
+                newClientOrderId=cid("selftest", symbol)
+            ))
+            oid = (res or {}).get("orderId") or (res or {}).get("clientOrderId")
+            await tg.send_async(f"🧪 GTX LIMIT gönderildi: {symbol} {qty} @{limit_price} (oid={oid})")
+            await asyncio.sleep(2)
+            try:
+                if oid:
+                    if isinstance(oid, int):
+                        await asyncio.to_thread(client.cancel_order, symbol, oid, None)
+                    else:
+                        await asyncio.to_thread(client.cancel_order, symbol, None, str(oid))
+                    await tg.send_async("🧪 Emir iptal edildi")
+            except Exception as e:
+                await tg.send_async(f"🧪 İptal hatası: {e}")
+
+            await tg.send_async("✅ SelfTest tamamlandı!")
+        except Exception as e:
+            await tg.send_async(f"⚠️ SelfTest genel hata: {e}")
+
+
+def strategy_params() -> StrategyParams:
+    return StrategyParams(
         rsi_period=CFG.rsi_period,
         hab_rsi_low=CFG.hab_rsi_low,
         hab_rsi_high=CFG.hab_rsi_high,
@@ -285,61 +454,95 @@ async def bars_loop(client: BinanceClient, tg: TelegramNotifier, wsm: WSManager,
         tp2_atr_mult=CFG.tp2_atr_mult,
         smart_close_adj_pct=CFG.smart_close_adj_pct,
     )
-    while True:
-        k = await wsm.get_closed_bar()
-        upsert_bar_cache(k)
-        symbol = k["s"].upper()
-        close_price = float(k["c"]) if k.get("c") is not None else None
 
-        if CFG.trailing_enabled and symbol in ACTIVE and close_price is not None:
-            maybe_move_to_lock_profit(symbol, close_price, client, tg)
-            apply_tp2_trailing(symbol, close_price, client, tg)
 
-        if paused_state.get("paused"):
+async def bars_loop(client: BinanceClient, tg: TelegramNotifier, wsm: WSManager, paused_state: dict, pool: SignalPool) -> None:
+    tfs = (CFG.entry_tf, CFG.mtf_fast, CFG.mtf_slow1, CFG.mtf_slow2)
+    while True:
+        # Dakika sınırında tüm semboller birlikte kapanır: hepsini tek batch'te değerlendir
+        batch = await wsm.get_closed_batch(CFG.eval_batch_ms / 1000.0)
+        dequeued = time.monotonic()
+        closed: dict[str, int] = {}
+        stamps: dict[str, dict[str, float]] = {}
+        for bar in batch:
+            upsert_bar_cache(bar)
+            symbol = bar.symbol
+            close_price = bar.row[4]
+            if CFG.trailing_enabled and symbol in ACTIVE and close_price is not None:
+                maybe_move_to_lock_profit(symbol, close_price, client, tg)
+                TRAILER.on_price(symbol, close_price)
+            # Aynı sınırda kapanan MTF barları sembol başına tek değerlendirmeye iner
+            if int(bar.row[6]) > closed.get(symbol, 0):
+                closed[symbol] = int(bar.row[6])
+                stamps[symbol] = bar_stamps(bar, dequeued, client.clock.offset_ms)
+
+        if paused_state.get("paused") or DAILY_TRADES >= CFG.max_daily_trades:
             continue
+        pool.simple_mode = paused_state.get("simple_mode", pool.simple_mode)
 
-        if DAILY_TRADES >= CFG.max_daily_trades:
+        jobs = []
+        for symbol, close_ms in closed.items():
+            if symbol not in ACTIVE and ACCOUNT.open_positions_count() >= CFG.max_open_positions:
+                continue
+            frames = [BAR_CACHE.get((symbol, tf), []) for tf in tfs]
+            if min(len(f) for f in frames) < 50:
+                continue
+            jobs.append((symbol, close_ms, frames))
+        if not jobs:
             continue
 
-        df1 = df_for(symbol, CFG.entry_tf)
-        df5 = df_for(symbol, CFG.mtf_fast)
-        df15 = df_for(symbol, CFG.mtf_slow1)
-        df1h = df_for(symbol, CFG.mtf_slow2)
-        if min(len(df1), len(df5), len(df15), len(df1h)) < 50:
-            continue
+        try:
+            async for res in pool.evaluate_batch(jobs):
+                record_shadow(res)
+                if res.side == "NONE":
+                    continue
+                submit_signal(client, tg, res._replace(stamps={**stamps.get(res.symbol, {}), "eval": time.monotonic()}))
+        except Exception as e:
+            tg.send(f"⚠️ Sinyal havuzu hatası: {e}")
 
-        sig = evaluate_simple(df1, params) if CFG.simple_mode else evaluate(df1, df5, df15, df1h, params)
-        # MTF EMA20/50 gate (5m): trendle aynı yönde değilse sinyali atla
-        if CFG.mtf_ema_filter and sig.side != "NONE":
-            try:
-                ema20 = df5["close"].ewm(span=20, adjust=False).mean().iloc[-1]
-                ema50 = df5["close"].ewm(span=50, adjust=False).mean().iloc[-1]
-                if sig.side == "LONG" and not (ema20 > ema50):
-                    sig.side = "NONE"
-                if sig.side == "SHORT" and not (ema20 < ema50):
-                    sig.side = "NONE"
-            except Exception:
-                pass
-        if sig.side == "NONE" or None in (sig.entry, sig.sl, sig.tp1, sig.tp2):
-            continue
 
-        # LIVE yürütme
-        price = float(df1["close"].iloc[-1])
-        atr_val = float(atr_ind(df1, CFG.atr_period).iloc[-1])
+def record_shadow(res: EvalResult) -> None:
+    if res.shadow is None:
+        return
+    if res.side != "NONE":
+        SHADOW["primary"] += 1
+    if res.shadow != "NONE":
+        SHADOW["shadow"] += 1
+        if res.shadow == res.side:
+            SHADOW["agree"] += 1
+
+
+def submit_signal(client: BinanceClient, tg: TelegramNotifier, sig: EvalResult) -> bool:
+    """
+    Limitleri (bekleyen girişler dahil) kontrol edip girişi ayrı bir task olarak başlatır;
+    bar işleme beklemez. Aynı sembolde eşzamanlı ikinci giriş açılmaz.
+    """
+    symbol = sig.symbol
+    if symbol in PENDING_ENTRIES:
+        return False
+    if DAILY_TRADES + len(PENDING_ENTRIES) >= CFG.max_daily_trades:
+        return False
+    if symbol not in ACTIVE and ACCOUNT.open_positions_count() + len(PENDING_ENTRIES) >= CFG.max_open_positions:
+        return False
+    PENDING_ENTRIES.add(symbol)
+    trace = LATENCY.start(symbol, sig.stamps)
+    task = asyncio.create_task(execute_signal(client, tg, sig, trace))
+    ENTRY_TASKS.add(task)
+    task.add_done_callback(ENTRY_TASKS.discard)
+    return True
+
+
+async def execute_signal(client: BinanceClient, tg: TelegramNotifier, sig: EvalResult, trace: Trace | None = None) -> None:
+    global DAILY_TRADES
+    symbol = sig.symbol
+    # Giriş emirlerinin clientOrderId'leri gecikme izine bağlanır (send/ack/fill damgaları)
+    entry_cid = LATENCY.cid_fn(trace, cid)
+    try:
+        price = sig.price
+        atr_val = sig.atr
         side = "BUY" if sig.side == "LONG" else "SELL"
         sl_side = "SELL" if side == "BUY" else "BUY"
 
-        # maker attempt
-        try:
-            best_price = price * (1 - CFG.maker_offset_bps/10000.0) if side == "BUY" else price * (1 + CFG.maker_offset_bps/10000.0)
-            maker_px = client.format_price(symbol, best_price)
-            qty_guess = CFG.order_usdt_size * CFG.leverage / max(price, 1e-9)
-            qty_guess = client.format_qty(symbol, qty_guess)
-            client.client.new_order(symbol=symbol, side=side, type="LIMIT", timeInForce="GTX", price=str(maker_px), quantity=qty_guess, newClientOrderId=cid("MAKER", symbol))
-            await asyncio.sleep(CFG.maker_wait_seconds)
-        except Exception:
-            pass
-
         # boyut
         if CFG.sizing_mode == "atr":
             stop_dist = max(CFG.sl_atr_mult * atr_val, 1e-9)
@@ -349,60 +552,148 @@ async def bars_loop(client: BinanceClient, tg: TelegramNotifier, wsm: WSManager,
             raw_qty = notional / max(price, 1e-9)
         qty = client.format_qty(symbol, raw_qty)
         if qty <= 0.0 or not client.min_notional_ok(symbol, price, qty):
-            continue
+            return
 
-        client.set_leverage(symbol, CFG.leverage)
+        await ORDERS.run(ENTRY, symbol, client.set_leverage, symbol, CFG.leverage, orders=0)
 
         sl_price_fmt = client.format_price(symbol, float(sig.sl))
         tp1_price = client.format_price(symbol, float(sig.tp1))
         tp2_price = client.format_price(symbol, float(sig.tp2))
-        tp_qty = client.format_qty(symbol, qty / 2.0)
+        # Native modda TP1 seviyesinde aktifleşen borsa tarafı trailing stop (iz = TRAIL_ATR_MULT × ATR)
+        trail = (tp1_price, client.callback_rate_for(CFG.trail_atr_mult * atr_val, tp1_price)) if CFG.trail_mode == "native" else None
 
         try:
-            order = client.place_market_order(symbol, side, qty, client_id=cid("MKT", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
-            sl_resp = client.place_stop_market(symbol, sl_side, sl_price_fmt, close_position=True, reduce_only=True, client_id=cid("SL", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
-            client.place_take_profit_market(symbol, sl_side, tp1_price, quantity=tp_qty, reduce_only=True, client_id=cid("TP1", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
-            client.place_take_profit_market(symbol, sl_side, tp2_price, quantity=tp_qty, reduce_only=True, client_id=cid("TP2", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
+            if CFG.maker_enabled:
+                # GTX -> dolum izleme -> iptal/yeniden fiyat -> yalnızca kalan için MARKET
+                fill = await ENTRIES.enter(client, symbol, side, qty, price, entry_cid)
+                if fill.stuck:
+                    tg.send(f"⚠️ {symbol} maker emri iptali gecikti, kalan MARKET ile tamamlanmadı (dolan {fill.filled_qty:g} korumaya alınıyor)")
+                qty = fill.filled_qty
+                maker_note = f" maker {fill.maker_qty:g}/{qty:g}" if fill.maker_qty > 0 else ""
+            else:
+                mkt_cid = entry_cid("MKT", symbol)
+                LATENCY.mark(mkt_cid, "send")
+                await ORDERS.run(ENTRY, symbol, client.place_market_order, symbol, side, qty, False, mkt_cid, CFG.order_retry_max, CFG.order_retry_backoff_ms)
+                LATENCY.mark(mkt_cid, "ack")
+                maker_note = ""
+            if qty <= 0.0:
+                return
+            tp_qty = client.format_qty(symbol, qty / 2.0)
+            try:
+                legs = await ORDERS.run(STOP, symbol, lambda: client.place_bracket(symbol, sl_side, sl_price_fmt, tp1_price, tp2_price, tp_qty, client_ids={t: cid(t, symbol) for t in ("SL", "TP1", "TP2", "TRAIL")}, trail=trail, max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms), weight=5, orders=4)
+            except BracketError as be:
+                # Korumasız pozisyon bırakma: girişi geri al
+                await ORDERS.run(FLATTEN, symbol, lambda: client.place_market_order(symbol, sl_side, qty, reduce_only=True, client_id=cid("FLAT", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms))
+                tg.send(f"⚠️ {symbol} bracket hatası, pozisyon kapatıldı: {be}")
+                return
             ACTIVE[symbol] = {
                 "side": side,
                 "entry": float(sig.entry),
                 "atr": atr_val,
-                "sl_order_id": sl_resp.get("orderId") if isinstance(sl_resp, dict) else None,
+                "sl_order_id": legs["SL"].order_id,
+                "trail_order_id": legs["TRAIL"].order_id if "TRAIL" in legs else None,
+                "tp1_order_id": legs["TP1"].order_id,
+                "tp2_order_id": legs["TP2"].order_id,
                 "sl_price": float(sl_price_fmt),
                 "be_done": False,
                 "tp1_hit": False,
             }
+            JOURNAL.open(symbol, ACTIVE[symbol])
             DAILY_TRADES += 1
-            try:
-                rsi_now = pd.Series(df1["close"]).pct_change().rolling(14).std().iloc[-1] if "rsi" not in df1.columns else df1["rsi"].iloc[-1]
-            except Exception:
-                rsi_now = 0.0
-            tg.send(f"🟢 LIVE {symbol} {side} qty={qty} entry≈{price:.6f} sl={sl_price_fmt} | ATR={atr_val:.6f} RSI≈{float(rsi_now):.2f}")
+            tg.send(f"🟢 LIVE {symbol} {side} qty={qty} entry≈{price:.6f} sl={sl_price_fmt} | ATR={atr_val:.6f} RSI≈{sig.rsi:.2f}{maker_note}")
         except Exception as e:
             tg.send(f"⚠️ LIVE order error {symbol}: {e}")
+    finally:
+        PENDING_ENTRIES.discard(symbol)
+        LATENCY.release(trace)
+
+def atr_for(client: BinanceClient, symbol: str) -> float:
+    df = to_dataframe(client.get_klines(symbol, CFG.entry_tf, limit=CFG.atr_period + 2))
+    val = float(atr_ind(df, CFG.atr_period).iloc[-1])
+    return val if val == val else 0.0
+
+
+async def reconcile_startup(client: BinanceClient, tg: TelegramNotifier) -> None:
+    """
+    Açılış mutabakatı: tüm pozisyonlar + açık emirler tek seferde çekilir, günlükten yüklenen
+    ACTIVE cid etiketleriyle eşlenir (bayat id'ler düzeltilir, kapanmışlar silinir, bilinmeyen
+    pozisyonlar devralınır), eksik SL/TP emir kuyruğundan paralel onarılır.
+    """
+    t0 = time.monotonic()
+    risks, orders = await asyncio.to_thread(fetch_snapshot, client)
+    await asyncio.to_thread(ACCOUNT.seed, client, risks, orders)
+    ACTIVE.update(JOURNAL.load())
+    report, repairs = await asyncio.to_thread(
+        plan, client, risks, orders, ACTIVE, cid, BOOK, CFG.sl_atr_mult, CFG.tp1_atr_mult, CFG.tp2_atr_mult, lambda s: atr_for(client, s))
+    await run_repairs(repairs, ORDERS, report)
+    commit(report, ACTIVE, JOURNAL)
+    report.elapsed_s = time.monotonic() - t0
+    tg.send(report.text())
+
+
+async def journal_loop() -> None:
+    # fsync toplu; yeterli kayıt birikince anlık görüntü (dosya G/Ç'si döngüyü bloklamasın)
+    while True:
+        await asyncio.sleep(CFG.state_fsync_ms / 1000.0)
+        await asyncio.to_thread(JOURNAL.flush)
 
 
-async def main():
-    client = BinanceClient(CFG.binance_api_key, CFG.binance_api_secret)
-    tg = TelegramNotifier(CFG.telegram_bot_token, CFG.telegram_chat_id)
-    poller = TelegramCommandPoller(CFG.telegram_bot_token, CFG.telegram_chat_id)
+async def ledger_loop(client: BinanceClient) -> None:
+    # Funding ve olay akışında kaçan satırlar için artımlı gelir senkronu
+    while True:
+        await asyncio.sleep(CFG.ledger_sync_seconds)
+        try:
+            await asyncio.to_thread(LEDGER.sync, client)
+        except Exception:
+            pass
 
-    symbols = client.get_top_usdt_perp_symbols(30, CFG.exclude_symbols, CFG.preferred_price_max, CFG.low_price_priority_max)[:CFG.max_concurrent_symbols]
 
-    wsm = WSManager(symbols, [CFG.entry_tf, CFG.mtf_fast, CFG.mtf_slow1, CFG.mtf_slow2])
-    us = UserStream(CFG.binance_api_key, CFG.binance_api_secret)
+async def main():
+    client = BinanceClient(CFG.binance_api_key, CFG.binance_api_secret, CFG.universe_ttl_seconds, CFG.universe_score, CFG.clock_sync_seconds, CFG.recv_window_ms, base_url=CFG.binance_base_url,
+                           weight_per_min=CFG.rate_weight_per_min, orders_per_10s=CFG.rate_orders_per_10s, rate_headroom=CFG.rate_headroom)
+    tg = TelegramNotifier(CFG.telegram_bot_token, CFG.telegram_chat_id, CFG.tg_rate_per_s, CFG.tg_burst, CFG.tg_queue_max, CFG.tg_digest_ms)
+    listener = CommandListener(CFG.telegram_bot_token, CFG.telegram_chat_id, CFG.admin_user_id, on_error=lambda name, e: tg.send(f"⚠️ {name} error: {e}"))
+
+    await asyncio.to_thread(client.clock.sync)
+    client.clock.start()
+    ORDERS.limiter = client.limiter
+    if abs(client.clock.offset_ms) > CFG.time_drift_max_ms:
+        tg.send(f"⚠️ Saat farkı yüksek: {client.clock.offset_ms:.0f} ms (istekler düzeltiliyor, NTP senkron önerilir)")
+
+    symbols = pick_symbols(client)
+
+    wsm = WSManager(symbols, [CFG.entry_tf, CFG.mtf_fast, CFG.mtf_slow1, CFG.mtf_slow2], stream_url=CFG.binance_ws_url, bridge_maxsize=CFG.ws_bridge_max)
+    us = UserStream(CFG.binance_api_key, CFG.binance_api_secret, base_url=CFG.binance_base_url, stream_url=CFG.binance_ws_url, listeners=[ACCOUNT.apply])
+    await us.start()
+    try:
+        await reconcile_startup(client, tg)
+    except Exception as e:
+        tg.send(f"⚠️ Hesap önbelleği doldurulamadı: {e}")
+
+    # Gerçek zamanlı fiyat: WS thread'inden sembol başına tek slotlu köprüyle döngüye
+    price_bridge = CoalescingBridge(maxsize=256)
+    feed = MarkPriceFeed(CFG.binance_ws_url, source=CFG.price_stream, debounce_ms=CFG.price_debounce_ms,
+                         listeners=[lambda s, px: price_bridge.put(s, (s, px))])
 
     tg.send("🔌 WS trader started (LIVE/PAPER)")
 
-    paused_state = {"paused": False}
+    pool = SignalPool(strategy_params(), CFG.eval_workers, CFG.eval_pool, simple_mode=CFG.simple_mode, mtf_ema_filter=CFG.mtf_ema_filter, shadow=CFG.shadow_mode)
+    await asyncio.to_thread(pool.warm_up)
+
+    paused_state = {"paused": False, "simple_mode": CFG.simple_mode}
+    register_commands(listener, client, tg, paused_state, wsm)
     # Tüm görevleri tek bir gather içinde paralel çalıştır
     await asyncio.gather(
         wsm.start(),
-        us.start(),
-        bars_loop(client, tg, wsm, paused_state),
+        bars_loop(client, tg, wsm, paused_state, pool),
         consume_user_events(us, client, tg),
         symbol_refresh_loop(client, wsm, tg),
-        command_loop(client, tg, poller, paused_state),
+        listener.run(),
+        ws_supervisor(client, wsm, us, tg),
+        journal_loop(),
+        ledger_loop(client),
+        *([TRAILER.run(client, tg)] if CFG.trail_mode != "native" else []),
+        *([price_loop(client, tg, feed, price_bridge)] if CFG.price_stream != "off" else []),
     )
 
 
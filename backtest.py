@@ -12,7 +12,7 @@ from config import CFG
 
 
 def run_backtest(symbol: str, start: datetime, end: datetime, mode: str = "simple") -> None:
-    client = BinanceClient(CFG.binance_api_key, CFG.binance_api_secret)
+    client = BinanceClient(CFG.binance_api_key, CFG.binance_api_secret, base_url=CFG.binance_base_url)
     start_ms = int(start.replace(tzinfo=timezone.utc).timestamp() * 1000)
     end_ms = int(end.replace(tzinfo=timezone.utc).timestamp() * 1000)
 
@@ -0,0 +1,861 @@
+"""
+Yerel Binance USDⓈ-M Futures simülatörü (çevrimdışı yük / gecikme testi).
+
+Botun kullandığı REST uçlarını (klines, ticker, exchangeInfo, order, batchOrders,
+openOrders, positionRisk, income, balance, listenKey) ve kline / markPrice /
+bookTicker / user-data WebSocket akışlarını sunar. Basit bir eşleştirme motoru
+MARKET, LIMIT (GTX), STOP_MARKET, TAKE_PROFIT_MARKET ve TRAILING_STOP_MARKET
+emirlerini fiyat yürüyüşüne göre doldurur. İmzalar doğrulanmaz.
+
+    python binance_sim.py --symbols 300 --latency-ms 20 --jitter-ms 10 --error-rate 0.01
+    BINANCE_BASE_URL=http://127.0.0.1:8800 BINANCE_WS_URL=ws://127.0.0.1:8801 python async_trader.py
+
+Yalnızca standart kütüphane kullanır.
+"""
+from __future__ import annotations
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import socket
+import socketserver
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import parse_qsl, unquote, urlparse
+
+INTERVAL_MS: Dict[str, int] = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "1d": 86_400_000,
+}
+TAKER_FEE = 0.0004
+MAKER_FEE = 0.0002
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _dumps(obj: Any) -> str:
+    # Binance çerçeveleri boşluksuz JSON'dur (ör. "x":true); hızlı-yol filtreleri buna güvenir
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def _truthy(v: Any) -> bool:
+    return str(v).lower() == "true"
+
+
+def _fmt(x: float, digits: int = 8) -> str:
+    return f"{x:.{digits}f}".rstrip("0").rstrip(".") or "0"
+
+
+class SimError(Exception):
+    def __init__(self, code: int, msg: str, status: int = 400) -> None:
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+        self.status = status
+
+
+# --------------------------------------------------------------------------- market
+
+@dataclass
+class SymbolSpec:
+    symbol: str
+    tick: float
+    step: float
+    price_precision: int
+    qty_precision: int
+
+
+def _spec_for(symbol: str, price: float) -> SymbolSpec:
+    mag = int(math.floor(math.log10(max(price, 1e-8))))
+    price_precision = max(0, 4 - mag)
+    qty_precision = max(0, min(3, mag + 1))
+    return SymbolSpec(symbol, 10.0 ** -price_precision, 10.0 ** -qty_precision, price_precision, qty_precision)
+
+
+class Market:
+    """Sembol başına geometrik rastgele yürüyüş; her interval için canlı bar + kapanmış geçmiş."""
+
+    def __init__(self, symbols: List[str], intervals: List[str], vol: float, history: int, rng: random.Random) -> None:
+        self.rng = rng
+        self.vol = vol
+        self.history_len = history
+        self.intervals = intervals
+        self.price: Dict[str, float] = {}
+        self.specs: Dict[str, SymbolSpec] = {}
+        self.stats24: Dict[str, Dict[str, float]] = {}
+        for s in symbols:
+            p = 10 ** rng.uniform(-2.5, 2.3)
+            self.price[s] = p
+            self.specs[s] = _spec_for(s, p)
+            swing = rng.uniform(0.02, 0.25)
+            self.stats24[s] = {"open": p * (1 + rng.uniform(-swing / 2, swing / 2)), "high": p * (1 + swing / 2), "low": p * (1 - swing / 2), "qv": 10 ** rng.uniform(6, 9.5), "n": 0}
+        now = _now_ms()
+        self.cur: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.closed: Dict[Tuple[str, str], List[List[Any]]] = {}
+        for s in symbols:
+            for tf in intervals:
+                self.cur[(s, tf)] = self._new_bar(s, tf, now, self.price[s])
+
+    def _new_bar(self, s: str, tf: str, now: int, p: float) -> Dict[str, Any]:
+        ms = INTERVAL_MS[tf]
+        t = now - now % ms
+        return {"t": t, "T": t + ms - 1, "o": p, "h": p, "l": p, "c": p, "v": 0.0, "q": 0.0, "n": 0, "V": 0.0, "Q": 0.0}
+
+    @staticmethod
+    def _row(b: Dict[str, Any]) -> List[Any]:
+        return [b["t"], _fmt(b["o"]), _fmt(b["h"]), _fmt(b["l"]), _fmt(b["c"]), _fmt(b["v"]), b["T"], _fmt(b["q"]), b["n"], _fmt(b["V"]), _fmt(b["Q"]), "0"]
+
+    def _ensure_history(self, s: str, tf: str) -> List[List[Any]]:
+        key = (s, tf)
+        rows = self.closed.get(key)
+        if rows is not None:
+            return rows
+        # Canlı barın açılışından geriye doğru yürüyüş: geçmiş mevcut fiyata bağlanır
+        ms = INTERVAL_MS[tf]
+        sigma = self.vol * math.sqrt(ms / 1000.0)
+        t = self.cur[key]["t"]
+        close = self.cur[key]["o"]
+        out: List[List[Any]] = []
+        for _ in range(self.history_len):
+            t -= ms
+            o = close * math.exp(self.rng.gauss(0.0, sigma))
+            h = max(o, close) * (1 + abs(self.rng.gauss(0.0, sigma / 2)))
+            l = min(o, close) * (1 - abs(self.rng.gauss(0.0, sigma / 2)))
+            v = 10 ** self.rng.uniform(2, 5) / max(close, 1e-8)
+            tb = v * self.rng.uniform(0.3, 0.7)
+            out.append(self._row({"t": t, "T": t + ms - 1, "o": o, "h": h, "l": l, "c": close, "v": v, "q": v * close, "n": self.rng.randint(10, 500), "V": tb, "Q": tb * close}))
+            close = o
+        out.reverse()
+        self.closed[key] = out
+        return out
+
+    def klines(self, s: str, tf: str, limit: int, start: int | None, end: int | None) -> List[List[Any]]:
+        rows = self._ensure_history(s, tf) + [self._row(self.cur[(s, tf)])]
+        if start is not None:
+            rows = [r for r in rows if r[0] >= start]
+        if end is not None:
+            rows = [r for r in rows if r[0] <= end]
+        return rows[:limit] if start is not None else rows[-limit:]
+
+    def tick(self, now: int, dt_s: float) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Fiyatları ilerletir; kapanan barları (sembol, tf, bar) olarak döndürür."""
+        closed: List[Tuple[str, str, Dict[str, Any]]] = []
+        sigma = self.vol * math.sqrt(max(dt_s, 1e-3))
+        for s, p in self.price.items():
+            p = p * math.exp(self.rng.gauss(0.0, sigma))
+            self.price[s] = p
+            st = self.stats24[s]
+            st["high"] = max(st["high"], p)
+            st["low"] = min(st["low"], p)
+            qty = 10 ** self.rng.uniform(0, 3) / max(p, 1e-8)
+            taker_buy = qty if self.rng.random() < 0.5 else 0.0
+            st["qv"] += qty * p
+            st["n"] += 1
+            for tf in self.intervals:
+                key = (s, tf)
+                b = self.cur[key]
+                if now > b["T"]:
+                    self._ensure_history(s, tf).append(self._row(b))
+                    if len(self.closed[key]) > self.history_len * 2:
+                        del self.closed[key][: self.history_len]
+                    closed.append((s, tf, b))
+                    b = self._new_bar(s, tf, now, b["c"])
+                    self.cur[key] = b
+                b["h"] = max(b["h"], p)
+                b["l"] = min(b["l"], p)
+                b["c"] = p
+                b["v"] += qty
+                b["q"] += qty * p
+                b["n"] += 1
+                b["V"] += taker_buy
+                b["Q"] += taker_buy * p
+        return closed
+
+
+# --------------------------------------------------------------------------- matching engine
+
+@dataclass
+class SimOrder:
+    order_id: int
+    symbol: str
+    side: str
+    type: str
+    qty: float
+    client_id: str
+    price: float = 0.0
+    stop_price: float = 0.0
+    reduce_only: bool = False
+    close_position: bool = False
+    time_in_force: str = "GTC"
+    activation_price: float = 0.0
+    callback_rate: float = 0.0
+    status: str = "NEW"
+    executed: float = 0.0
+    avg_price: float = 0.0
+    update_ms: int = field(default_factory=_now_ms)
+    trail_active: bool = False
+    trail_extreme: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "orderId": self.order_id, "symbol": self.symbol, "status": self.status, "clientOrderId": self.client_id,
+            "price": _fmt(self.price), "avgPrice": _fmt(self.avg_price), "origQty": _fmt(self.qty),
+            "executedQty": _fmt(self.executed), "cumQuote": _fmt(self.executed * self.avg_price),
+            "timeInForce": self.time_in_force, "type": self.type, "origType": self.type, "side": self.side,
+            "stopPrice": _fmt(self.stop_price), "reduceOnly": self.reduce_only, "closePosition": self.close_position,
+            "positionSide": "BOTH", "workingType": "CONTRACT_PRICE", "activatePrice": _fmt(self.activation_price),
+            "priceRate": _fmt(self.callback_rate), "updateTime": self.update_ms,
+        }
+
+
+class Engine:
+    def __init__(self, market: Market, balance: float, slippage_bps: float, emit: Callable[[Dict[str, Any]], None]) -> None:
+        self.market = market
+        self.balance = balance
+        self.slippage = slippage_bps / 10_000.0
+        self.emit = emit
+        self.orders: Dict[int, SimOrder] = {}
+        self.positions: Dict[str, Dict[str, float]] = {}
+        self.income: List[Dict[str, Any]] = []
+        self.leverage: Dict[str, int] = {}
+        self._next_order = 1_000_000
+        self._next_trade = 1
+        self._next_tran = 1
+
+    # --- helpers
+    def _pos(self, s: str) -> float:
+        return self.positions.get(s, {}).get("amt", 0.0)
+
+    def _open_for(self, s: str) -> List[SimOrder]:
+        return [o for o in self.orders.values() if o.symbol == s and o.status in ("NEW", "PARTIALLY_FILLED")]
+
+    def _add_income(self, s: str, kind: str, amount: float, now: int, trade_id: int | None = None) -> None:
+        self.income.append({"symbol": s, "incomeType": kind, "income": _fmt(amount), "asset": "USDT", "info": kind, "time": now, "tranId": self._next_tran, "tradeId": str(trade_id) if trade_id else ""})
+        self._next_tran += 1
+
+    def _order_event(self, o: SimOrder, exec_type: str, now: int, last_qty: float = 0.0, last_px: float = 0.0, rp: float = 0.0, fee: float = 0.0) -> None:
+        self.emit({"e": "ORDER_TRADE_UPDATE", "E": now, "T": now, "o": {
+            "s": o.symbol, "c": o.client_id, "S": o.side, "o": o.type, "f": o.time_in_force, "q": _fmt(o.qty),
+            "p": _fmt(o.price), "ap": _fmt(o.avg_price), "sp": _fmt(o.stop_price), "x": exec_type, "X": o.status,
+            "i": o.order_id, "l": _fmt(last_qty), "z": _fmt(o.executed), "L": _fmt(last_px), "N": "USDT",
+            "n": _fmt(fee), "T": now, "t": self._next_trade if exec_type == "TRADE" else 0, "R": o.reduce_only,
+            "ot": o.type, "ps": "BOTH", "cp": o.close_position, "AP": _fmt(o.activation_price), "cr": _fmt(o.callback_rate),
+            "rp": _fmt(rp), "wt": "CONTRACT_PRICE",
+        }})
+
+    def _account_event(self, s: str, now: int, reason: str = "ORDER") -> None:
+        p = self.positions.get(s, {"amt": 0.0, "entry": 0.0})
+        mark = self.market.price[s]
+        up = (mark - p["entry"]) * p["amt"]
+        self.emit({"e": "ACCOUNT_UPDATE", "E": now, "T": now, "a": {
+            "m": reason,
+            "B": [{"a": "USDT", "wb": _fmt(self.balance), "cw": _fmt(self.balance), "bc": "0"}],
+            "P": [{"s": s, "pa": _fmt(p["amt"]), "ep": _fmt(p["entry"]), "cr": "0", "up": _fmt(up), "mt": "cross", "iw": "0", "ps": "BOTH"}],
+        }})
+
+    # --- order entry
+    def new_order(self, p: Dict[str, str]) -> Dict[str, Any]:
+        s = p.get("symbol", "")
+        if s not in self.market.price:
+            raise SimError(-1121, "Invalid symbol.")
+        side = p.get("side", "").upper()
+        typ = p.get("type", "").upper()
+        if side not in ("BUY", "SELL"):
+            raise SimError(-1117, "Invalid side.")
+        cid = p.get("newClientOrderId") or f"sim-{self._next_order}"
+        if any(o.client_id == cid for o in self._open_for(s)):
+            raise SimError(-4116, "ClientOrderId is duplicated.")
+        last = self.market.price[s]
+        o = SimOrder(
+            order_id=self._next_order, symbol=s, side=side, type=typ, qty=float(p.get("quantity", 0) or 0), client_id=cid,
+            price=float(p.get("price", 0) or 0), stop_price=float(p.get("stopPrice", 0) or 0),
+            reduce_only=_truthy(p.get("reduceOnly", "false")), close_position=_truthy(p.get("closePosition", "false")),
+            time_in_force=p.get("timeInForce", "GTC"), activation_price=float(p.get("activationPrice", 0) or 0),
+            callback_rate=float(p.get("callbackRate", 0) or 0),
+        )
+        now = _now_ms()
+        if typ == "MARKET":
+            if o.qty <= 0:
+                raise SimError(-4003, "Quantity less than or equal to zero.")
+            self._next_order += 1
+            self.orders[o.order_id] = o
+            self._order_event(o, "NEW", now)
+            self._fill(o, last * (1 + self.slippage if side == "BUY" else 1 - self.slippage), now, taker=True)
+            return o.as_dict()
+        if typ == "LIMIT":
+            crosses = o.price >= last if side == "BUY" else o.price <= last
+            if o.time_in_force == "GTX" and crosses:
+                raise SimError(-5022, "Due to the order could not be executed as maker, the Post Only order will be rejected.")
+        elif typ in ("STOP_MARKET", "TAKE_PROFIT_MARKET"):
+            if self._stop_triggered(o, last):
+                raise SimError(-2021, "Order would immediately trigger.")
+        elif typ == "TRAILING_STOP_MARKET":
+            if not (0.1 <= o.callback_rate <= 5.0):
+                raise SimError(-2007, "Invalid callBack rate.")
+            if o.activation_price <= 0:
+                o.activation_price = last
+        else:
+            raise SimError(-1116, "Invalid orderType.")
+        if o.reduce_only and not o.close_position and abs(self._pos(s)) < 1e-12:
+            raise SimError(-2022, "ReduceOnly Order is rejected.")
+        self._next_order += 1
+        self.orders[o.order_id] = o
+        self._order_event(o, "NEW", now)
+        return o.as_dict()
+
+    def cancel(self, s: str, order_id: int | None, client_id: str | None) -> Dict[str, Any]:
+        for o in self._open_for(s):
+            if (order_id is not None and o.order_id == order_id) or (client_id and o.client_id == client_id):
+                o.status = "CANCELED"
+                o.update_ms = _now_ms()
+                self._order_event(o, "CANCELED", o.update_ms)
+                return o.as_dict()
+        raise SimError(-2011, "Unknown order sent.")
+
+    def query(self, s: str, order_id: int | None, client_id: str | None) -> Dict[str, Any]:
+        for o in self.orders.values():
+            if o.symbol == s and ((order_id is not None and o.order_id == order_id) or (client_id and o.client_id == client_id)):
+                return o.as_dict()
+        raise SimError(-2013, "Order does not exist.")
+
+    # --- matching
+    @staticmethod
+    def _stop_triggered(o: SimOrder, px: float) -> bool:
+        if o.type == "STOP_MARKET":
+            return px <= o.stop_price if o.side == "SELL" else px >= o.stop_price
+        return px >= o.stop_price if o.side == "SELL" else px <= o.stop_price
+
+    def _fill(self, o: SimOrder, px: float, now: int, taker: bool) -> None:
+        s = o.symbol
+        pos = self._pos(s)
+        qty = o.qty
+        if o.close_position:
+            qty = abs(pos)
+        if o.reduce_only or o.close_position:
+            reducing = (pos > 0 and o.side == "SELL") or (pos < 0 and o.side == "BUY")
+            qty = min(qty, abs(pos)) if reducing else 0.0
+        if qty <= 1e-12:
+            o.status = "EXPIRED"
+            o.update_ms = now
+            self._order_event(o, "EXPIRED", now)
+            return
+        signed = qty if o.side == "BUY" else -qty
+        p = self.positions.setdefault(s, {"amt": 0.0, "entry": 0.0})
+        rp = 0.0
+        if pos == 0 or (pos > 0) == (signed > 0):
+            new_amt = pos + signed
+            p["entry"] = (p["entry"] * abs(pos) + px * qty) / abs(new_amt)
+            p["amt"] = new_amt
+        else:
+            closing = min(abs(signed), abs(pos))
+            rp = (px - p["entry"]) * closing * (1 if pos > 0 else -1)
+            new_amt = pos + signed
+            if abs(new_amt) < 1e-12:
+                new_amt = 0.0
+            elif (new_amt > 0) != (pos > 0):
+                p["entry"] = px
+            p["amt"] = new_amt
+        fee = px * qty * (TAKER_FEE if taker else MAKER_FEE)
+        self.balance += rp - fee
+        if rp:
+            self._add_income(s, "REALIZED_PNL", rp, now, self._next_trade)
+        self._add_income(s, "COMMISSION", -fee, now, self._next_trade)
+        o.avg_price = (o.avg_price * o.executed + px * qty) / (o.executed + qty)
+        o.executed += qty
+        o.status = "FILLED"
+        o.update_ms = now
+        self._order_event(o, "TRADE", now, qty, px, rp, fee)
+        self._next_trade += 1
+        if p["amt"] == 0.0:
+            self.positions.pop(s, None)
+            # Pozisyon kapandı: reduce-only / closePosition emirleri düşer
+            for other in self._open_for(s):
+                if other.reduce_only or other.close_position:
+                    other.status = "EXPIRED"
+                    other.update_ms = now
+                    self._order_event(other, "EXPIRED", now)
+        self._account_event(s, now)
+
+    def on_price(self, s: str, px: float, now: int) -> None:
+        for o in self._open_for(s):
+            if o.type == "LIMIT":
+                if (o.side == "BUY" and px <= o.price) or (o.side == "SELL" and px >= o.price):
+                    self._fill(o, o.price, now, taker=False)
+            elif o.type in ("STOP_MARKET", "TAKE_PROFIT_MARKET"):
+                if self._stop_triggered(o, px):
+                    self._fill(o, px, now, taker=True)
+            elif o.type == "TRAILING_STOP_MARKET":
+                if not o.trail_active:
+                    if (o.side == "SELL" and px >= o.activation_price) or (o.side == "BUY" and px <= o.activation_price):
+                        o.trail_active = True
+                        o.trail_extreme = px
+                    continue
+                if o.side == "SELL":
+                    o.trail_extreme = max(o.trail_extreme, px)
+                    if px <= o.trail_extreme * (1 - o.callback_rate / 100.0):
+                        self._fill(o, px, now, taker=True)
+                else:
+                    o.trail_extreme = min(o.trail_extreme, px)
+                    if px >= o.trail_extreme * (1 + o.callback_rate / 100.0):
+                        self._fill(o, px, now, taker=True)
+
+    # --- account views
+    def position_risk(self, s: str | None) -> List[Dict[str, Any]]:
+        out = []
+        for sym, p in self.positions.items():
+            if s and sym != s:
+                continue
+            mark = self.market.price[sym]
+            out.append({"symbol": sym, "positionAmt": _fmt(p["amt"]), "entryPrice": _fmt(p["entry"]), "markPrice": _fmt(mark),
+                        "unRealizedProfit": _fmt((mark - p["entry"]) * p["amt"]), "leverage": str(self.leverage.get(sym, 20)),
+                        "positionSide": "BOTH", "marginType": "cross"})
+        if s and not out:
+            out.append({"symbol": s, "positionAmt": "0", "entryPrice": "0", "markPrice": _fmt(self.market.price.get(s, 0.0)),
+                        "unRealizedProfit": "0", "leverage": str(self.leverage.get(s, 20)), "positionSide": "BOTH", "marginType": "cross"})
+        return out
+
+
+# --------------------------------------------------------------------------- faults
+
+@dataclass
+class Faults:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    errors: Tuple[str, ...] = ("500", "429", "-1021")
+    clock_skew_ms: int = 0
+
+    def delay(self, rng: random.Random) -> None:
+        d = self.latency_ms + (rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+        if d > 0:
+            time.sleep(d / 1000.0)
+
+    def maybe_fail(self, rng: random.Random) -> Tuple[int, Dict[str, Any]] | None:
+        if self.error_rate <= 0 or rng.random() >= self.error_rate:
+            return None
+        kind = rng.choice(self.errors)
+        if kind == "500":
+            return 500, {"code": -1000, "msg": "An unknown error occured while processing the request."}
+        if kind == "429":
+            return 429, {"code": -1003, "msg": "Too many requests; simulated rate limit."}
+        return 400, {"code": -1021, "msg": "Timestamp for this request is outside of the recvWindow."}
+
+
+# --------------------------------------------------------------------------- websocket server
+
+class WSClient:
+    def __init__(self, sock: socket.socket, combined: bool) -> None:
+        self.sock = sock
+        self.combined = combined
+        self.subs: set[str] = set()
+        self.lock = threading.Lock()
+        self.alive = True
+        self.stalled = False
+
+    def send_text(self, text: str) -> None:
+        data = text.encode("utf-8")
+        n = len(data)
+        if n < 126:
+            header = bytes([0x81, n])
+        elif n < 65536:
+            header = bytes([0x81, 126]) + n.to_bytes(2, "big")
+        else:
+            header = bytes([0x81, 127]) + n.to_bytes(8, "big")
+        with self.lock:
+            try:
+                self.sock.sendall(header + data)
+            except OSError:
+                self.alive = False
+
+    def push(self, stream: str, payload: Dict[str, Any] | List[Any]) -> None:
+        if self.stalled or not self.alive:
+            return
+        self.send_text(_dumps({"stream": stream, "data": payload}) if self.combined else _dumps(payload))
+
+
+class Simulator:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.rng = random.Random(args.seed)
+        symbols = [s.strip().upper() for s in args.symbol_list.split(",") if s.strip()] if args.symbol_list else [f"SIM{i:04d}USDT" for i in range(args.symbols)]
+        self.market = Market(symbols, args.intervals.split(","), args.vol, args.history, self.rng)
+        self.lock = threading.RLock()
+        self.clients: List[WSClient] = []
+        self.engine = Engine(self.market, args.balance, args.slippage_bps, self._emit_user)
+        self.faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate, tuple(e.strip() for e in args.errors.split(",") if e.strip()), args.clock_skew_ms)
+        self.listen_keys: set[str] = set()
+        self.tick_ms = args.tick_ms
+        self.stall_every = args.ws_stall_every
+        self.stats: Dict[str, int] = {}
+        self.order_latency_ms: List[float] = []
+
+    # --- user data fan-out (engine kilidi altında çağrılır)
+    def _emit_user(self, evt: Dict[str, Any]) -> None:
+        for c in list(self.clients):
+            for lk in c.subs & self.listen_keys:
+                c.push(lk, evt)
+
+    # --- REST routing
+    def handle_rest(self, method: str, path: str, params: Dict[str, str]) -> Tuple[int, Any]:
+        self.stats[f"{method} {path}"] = self.stats.get(f"{method} {path}", 0) + 1
+        m = self.market
+        with self.lock:
+            if path == "/fapi/v1/ping":
+                return 200, {}
+            if path == "/fapi/v1/time":
+                return 200, {"serverTime": _now_ms() + self.faults.clock_skew_ms}
+            if path == "/fapi/v1/exchangeInfo":
+                return 200, {"timezone": "UTC", "serverTime": _now_ms(), "symbols": [{
+                    "symbol": sp.symbol, "pair": sp.symbol, "contractType": "PERPETUAL", "status": "TRADING",
+                    "baseAsset": sp.symbol[:-4], "quoteAsset": "USDT", "marginAsset": "USDT",
+                    "pricePrecision": sp.price_precision, "quantityPrecision": sp.qty_precision,
+                    "filters": [
+                        {"filterType": "PRICE_FILTER", "tickSize": _fmt(sp.tick, 10), "minPrice": _fmt(sp.tick, 10), "maxPrice": "1000000"},
+                        {"filterType": "LOT_SIZE", "stepSize": _fmt(sp.step, 10), "minQty": _fmt(sp.step, 10), "maxQty": "100000000"},
+                        {"filterType": "MIN_NOTIONAL", "notional": "5"},
+                    ]} for sp in m.specs.values()]}
+            if path == "/fapi/v1/klines":
+                s, tf = params.get("symbol", ""), params.get("interval", "")
+                if s not in m.price or tf not in INTERVAL_MS:
+                    raise SimError(-1121, "Invalid symbol.")
+                if tf not in m.intervals:
+                    raise SimError(-1120, "Invalid interval (not simulated).")
+                start = int(params["startTime"]) if "startTime" in params else None
+                end = int(params["endTime"]) if "endTime" in params else None
+                return 200, m.klines(s, tf, min(int(params.get("limit", 500)), 1500), start, end)
+            if path == "/fapi/v1/ticker/24hr":
+                rows = [{"symbol": s, "lastPrice": _fmt(m.price[s]), "openPrice": _fmt(st["open"]), "highPrice": _fmt(st["high"]),
+                         "lowPrice": _fmt(st["low"]), "quoteVolume": _fmt(st["qv"], 2), "volume": _fmt(st["qv"] / m.price[s], 2),
+                         "priceChangePercent": _fmt(100.0 * (m.price[s] / st["open"] - 1.0), 3), "count": int(st["n"])}
+                        for s, st in m.stats24.items()]
+                if "symbol" in params:
+                    rows = [r for r in rows if r["symbol"] == params["symbol"]]
+                    return 200, rows[0] if rows else {}
+                return 200, rows
+            if path in ("/fapi/v1/ticker/price", "/fapi/v2/ticker/price"):
+                if "symbol" in params:
+                    return 200, {"symbol": params["symbol"], "price": _fmt(m.price.get(params["symbol"], 0.0)), "time": _now_ms()}
+                return 200, [{"symbol": s, "price": _fmt(p), "time": _now_ms()} for s, p in m.price.items()]
+            if path == "/fapi/v1/premiumIndex":
+                def mp(s: str) -> Dict[str, Any]:
+                    return {"symbol": s, "markPrice": _fmt(m.price[s]), "indexPrice": _fmt(m.price[s]), "lastFundingRate": "0.0001", "time": _now_ms()}
+                return 200, mp(params["symbol"]) if "symbol" in params else [mp(s) for s in m.price]
+            if path == "/fapi/v1/leverage":
+                self.engine.leverage[params.get("symbol", "")] = int(params.get("leverage", 20))
+                return 200, {"symbol": params.get("symbol"), "leverage": int(params.get("leverage", 20)), "maxNotionalValue": "1000000"}
+            if path == "/fapi/v1/order":
+                s = params.get("symbol", "")
+                oid = int(params["orderId"]) if params.get("orderId") else None
+                cid = params.get("origClientOrderId")
+                if method == "POST":
+                    t0 = time.perf_counter()
+                    out = self.engine.new_order(params)
+                    self.order_latency_ms.append((time.perf_counter() - t0) * 1000.0)
+                    return 200, out
+                if method == "DELETE":
+                    return 200, self.engine.cancel(s, oid, cid)
+                return 200, self.engine.query(s, oid, cid)
+            if path == "/fapi/v1/batchOrders":
+                if method == "POST":
+                    batch = json.loads(params.get("batchOrders", "[]"))
+                    if len(batch) > 5:
+                        raise SimError(-1130, "Data sent for parameter 'batchOrders' is not valid.")
+                    out: List[Any] = []
+                    for b in batch:
+                        try:
+                            out.append(self.engine.new_order({k: str(v) for k, v in b.items()}))
+                        except SimError as e:
+                            out.append({"code": e.code, "msg": e.msg})
+                    return 200, out
+                s = params.get("symbol", "")
+                ids = json.loads(params.get("orderIdList", "[]") or "[]")
+                cids = json.loads(params.get("origClientOrderIdList", "[]") or "[]")
+                res: List[Any] = []
+                for oid in ids:
+                    try:
+                        res.append(self.engine.cancel(s, int(oid), None))
+                    except SimError as e:
+                        res.append({"code": e.code, "msg": e.msg})
+                for cid in cids:
+                    try:
+                        res.append(self.engine.cancel(s, None, cid))
+                    except SimError as e:
+                        res.append({"code": e.code, "msg": e.msg})
+                return 200, res
+            if path in ("/fapi/v1/openOrders", "/fapi/v1/openOrder"):
+                s = params.get("symbol")
+                rows = [o.as_dict() for o in self.engine.orders.values() if o.status in ("NEW", "PARTIALLY_FILLED") and (not s or o.symbol == s)]
+                if path == "/fapi/v1/openOrder":
+                    oid = params.get("orderId")
+                    rows = [r for r in rows if oid and str(r["orderId"]) == oid]
+                    if not rows:
+                        raise SimError(-2013, "Order does not exist.")
+                    return 200, rows[0]
+                return 200, rows
+            if path == "/fapi/v1/allOpenOrders":
+                for o in self.engine._open_for(params.get("symbol", "")):
+                    self.engine.cancel(o.symbol, o.order_id, None)
+                return 200, {"code": 200, "msg": "The operation of cancel all open order is done."}
+            if path in ("/fapi/v2/positionRisk", "/fapi/v3/positionRisk"):
+                return 200, self.engine.position_risk(params.get("symbol"))
+            if path in ("/fapi/v2/balance", "/fapi/v3/balance"):
+                b = _fmt(self.engine.balance)
+                return 200, [{"accountAlias": "sim", "asset": "USDT", "balance": b, "crossWalletBalance": b, "availableBalance": b, "crossUnPnl": "0"}]
+            if path == "/fapi/v1/income":
+                rows = self.engine.income
+                if "symbol" in params:
+                    rows = [r for r in rows if r["symbol"] == params["symbol"]]
+                if "incomeType" in params:
+                    rows = [r for r in rows if r["incomeType"] == params["incomeType"]]
+                if "startTime" in params:
+                    rows = [r for r in rows if r["time"] >= int(params["startTime"])]
+                if "endTime" in params:
+                    rows = [r for r in rows if r["time"] <= int(params["endTime"])]
+                limit = min(int(params.get("limit", 100)), 1000)
+                return 200, rows[:limit] if "startTime" in params else rows[-limit:]
+            if path == "/fapi/v1/listenKey":
+                if method == "POST":
+                    lk = base64.b32encode(self.rng.randbytes(20)).decode().lower()
+                    self.listen_keys.add(lk)
+                    return 200, {"listenKey": lk}
+                if method == "DELETE":
+                    self.listen_keys.discard(params.get("listenKey", ""))
+                return 200, {}
+            if path == "/sim/stats":
+                lat = sorted(self.order_latency_ms[-10000:])
+                pct = (lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))], 3) if lat else None)
+                return 200, {"requests": self.stats, "ws_clients": len(self.clients), "open_orders": sum(1 for o in self.engine.orders.values() if o.status in ("NEW", "PARTIALLY_FILLED")),
+                             "positions": len(self.engine.positions), "balance": self.engine.balance,
+                             "order_engine_ms": {"p50": pct(0.5), "p99": pct(0.99), "n": len(lat)}}
+        raise SimError(-1000, f"Endpoint not simulated: {method} {path}", 404)
+
+    # --- WS subscription handling
+    def handle_ws_text(self, c: WSClient, text: str) -> None:
+        try:
+            msg = json.loads(text)
+        except ValueError:
+            return
+        method = msg.get("method")
+        params = [str(p) for p in msg.get("params", []) or []]
+        with self.lock:
+            if method == "SUBSCRIBE":
+                c.subs.update(params)
+            elif method == "UNSUBSCRIBE":
+                c.subs.difference_update(params)
+            elif method == "LIST_SUBSCRIPTIONS":
+                c.send_text(_dumps({"result": sorted(c.subs), "id": msg.get("id")}))
+                return
+        c.send_text(_dumps({"result": None, "id": msg.get("id")}))
+
+    def _kline_payload(self, s: str, tf: str, b: Dict[str, Any], final: bool, now: int) -> Dict[str, Any]:
+        return {"e": "kline", "E": now, "s": s, "k": {
+            "t": b["t"], "T": b["T"], "s": s, "i": tf, "f": 0, "L": 0, "o": _fmt(b["o"]), "c": _fmt(b["c"]),
+            "h": _fmt(b["h"]), "l": _fmt(b["l"]), "v": _fmt(b["v"]), "n": b["n"], "x": final, "q": _fmt(b["q"]),
+            "V": _fmt(b["V"]), "Q": _fmt(b["Q"]), "B": "0"}}
+
+    def run_ticker(self) -> None:
+        last = time.monotonic()
+        last_mark = 0.0
+        last_stall = time.monotonic()
+        while True:
+            time.sleep(self.tick_ms / 1000.0)
+            mono = time.monotonic()
+            now = _now_ms()
+            with self.lock:
+                closed = self.market.tick(now, mono - last)
+                last = mono
+                for s, px in self.market.price.items():
+                    self.engine.on_price(s, px, now)
+                self.clients = [c for c in self.clients if c.alive]
+                closed_by_stream = {f"{s.lower()}@kline_{tf}": (s, tf, b) for s, tf, b in closed}
+                push_marks = mono - last_mark >= 1.0
+                if push_marks:
+                    last_mark = mono
+                    marks = [{"e": "markPriceUpdate", "E": now, "s": s, "p": _fmt(px), "i": _fmt(px), "r": "0.0001", "T": now} for s, px in self.market.price.items()]
+                if self.stall_every and mono - last_stall >= self.stall_every and self.clients:
+                    # Sessiz ölüm simülasyonu: soket açık kalır ama mesaj gelmez
+                    self.rng.choice(self.clients).stalled = True
+                    last_stall = mono
+                for c in self.clients:
+                    for stream in c.subs:
+                        if "@kline_" in stream:
+                            sym, tf = stream.split("@kline_", 1)
+                            S = sym.upper()
+                            if stream in closed_by_stream:
+                                _, _, b = closed_by_stream[stream]
+                                c.push(stream, self._kline_payload(S, tf, b, True, now))
+                            b = self.market.cur.get((S, tf))
+                            if b is not None:
+                                c.push(stream, self._kline_payload(S, tf, b, False, now))
+                        elif stream.endswith("@bookTicker"):
+                            S = stream.split("@", 1)[0].upper()
+                            px = self.market.price.get(S)
+                            if px is not None:
+                                tick = self.market.specs[S].tick
+                                c.push(stream, {"e": "bookTicker", "E": now, "T": now, "s": S, "b": _fmt(px - tick), "B": "10", "a": _fmt(px + tick), "A": "10"})
+                        elif stream.startswith("!markPrice@arr") and push_marks:
+                            c.push(stream, marks)
+                        elif stream.endswith("@markPrice") or stream.endswith("@markPrice@1s"):
+                            if push_marks:
+                                S = stream.split("@", 1)[0].upper()
+                                px = self.market.price.get(S)
+                                if px is not None:
+                                    c.push(stream, {"e": "markPriceUpdate", "E": now, "s": S, "p": _fmt(px), "i": _fmt(px), "r": "0.0001", "T": now})
+
+
+def _make_http_handler(sim: Simulator):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args: Any) -> None:
+            return
+
+        def _handle(self, method: str) -> None:
+            u = urlparse(self.path)
+            params = dict(parse_qsl(u.query, keep_blank_values=True))
+            length = int(self.headers.get("Content-Length", 0) or 0)
+            if length:
+                body = self.rfile.read(length).decode("utf-8", "replace")
+                params.update(dict(parse_qsl(body, keep_blank_values=True)))
+            sim.faults.delay(sim.rng)
+            fail = None if u.path.startswith("/sim/") else sim.faults.maybe_fail(sim.rng)
+            if fail is not None:
+                status, payload = fail
+            else:
+                try:
+                    status, payload = sim.handle_rest(method, u.path, params)
+                except SimError as e:
+                    status, payload = e.status, {"code": e.code, "msg": e.msg}
+                except Exception as e:  # simülatör hatası istemciye 500 olarak döner
+                    status, payload = 500, {"code": -1000, "msg": str(e)}
+            data = _dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            self._handle("GET")
+
+        def do_POST(self) -> None:
+            self._handle("POST")
+
+        def do_PUT(self) -> None:
+            self._handle("PUT")
+
+        def do_DELETE(self) -> None:
+            self._handle("DELETE")
+
+    return Handler
+
+
+def _make_ws_handler(sim: Simulator):
+    class Handler(socketserver.BaseRequestHandler):
+        def _recv_exact(self, n: int) -> bytes:
+            buf = b""
+            while len(buf) < n:
+                chunk = self.request.recv(n - len(buf))
+                if not chunk:
+                    raise ConnectionError("closed")
+                buf += chunk
+            return buf
+
+        def handle(self) -> None:
+            raw = b""
+            while b"\r\n\r\n" not in raw:
+                chunk = self.request.recv(4096)
+                if not chunk:
+                    return
+                raw += chunk
+            head = raw.split(b"\r\n\r\n", 1)[0].decode("latin-1").split("\r\n")
+            path = head[0].split(" ")[1] if len(head[0].split(" ")) > 1 else "/ws"
+            headers = {h.split(":", 1)[0].strip().lower(): h.split(":", 1)[1].strip() for h in head[1:] if ":" in h}
+            accept = base64.b64encode(hashlib.sha1((headers.get("sec-websocket-key", "") + WS_GUID).encode()).digest()).decode()
+            self.request.sendall((
+                "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+            u = urlparse(path)
+            client = WSClient(self.request, combined=u.path.startswith("/stream"))
+            # Yol tabanlı abonelik: /ws/<stream> veya /stream?streams=a/b
+            if u.path.startswith("/ws/"):
+                client.subs.add(unquote(u.path[4:]))
+            for k, v in parse_qsl(u.query):
+                if k == "streams":
+                    client.subs.update(s for s in v.split("/") if s)
+            with sim.lock:
+                sim.clients.append(client)
+            try:
+                while client.alive:
+                    b1, b2 = self._recv_exact(2)
+                    opcode = b1 & 0x0F
+                    n = b2 & 0x7F
+                    if n == 126:
+                        n = int.from_bytes(self._recv_exact(2), "big")
+                    elif n == 127:
+                        n = int.from_bytes(self._recv_exact(8), "big")
+                    mask = self._recv_exact(4) if b2 & 0x80 else b"\x00\x00\x00\x00"
+                    payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self._recv_exact(n)))
+                    if opcode == 0x8:
+                        with client.lock:
+                            self.request.sendall(bytes([0x88, 0]))
+                        break
+                    if opcode == 0x9:
+                        with client.lock:
+                            self.request.sendall(bytes([0x8A, len(payload)]) + payload)
+                    elif opcode == 0x1:
+                        sim.handle_ws_text(client, payload.decode("utf-8", "replace"))
+            except (ConnectionError, OSError, ValueError):
+                pass
+            finally:
+                client.alive = False
+
+    return Handler
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Local Binance USDⓈ-M Futures stand-in")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8800, help="REST portu")
+    ap.add_argument("--ws-port", type=int, default=8801, help="WebSocket portu")
+    ap.add_argument("--symbols", type=int, default=50, help="üretilecek sembol sayısı (SIM0000USDT...)")
+    ap.add_argument("--symbol-list", default="", help="virgülle ayrılmış sembol adları (--symbols yerine)")
+    ap.add_argument("--intervals", default="1m,5m,15m,1h")
+    ap.add_argument("--history", type=int, default=600, help="interval başına geçmiş bar sayısı")
+    ap.add_argument("--vol", type=float, default=0.0008, help="saniye başına log-getiri std")
+    ap.add_argument("--tick-ms", type=int, default=250)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="REST isteklerinde hata olasılığı")
+    ap.add_argument("--errors", default="500,429,-1021", help="enjekte edilecek hata türleri")
+    ap.add_argument("--clock-skew-ms", type=int, default=0, help="serverTime kaydırması")
+    ap.add_argument("--ws-stall-every", type=float, default=0.0, help="N saniyede bir rastgele WS bağlantısını sessizce dondur")
+    ap.add_argument("--balance", type=float, default=1000.0)
+    ap.add_argument("--slippage-bps", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    sim = Simulator(args)
+    http = ThreadingHTTPServer((args.host, args.port), _make_http_handler(sim))
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    ws = socketserver.ThreadingTCPServer((args.host, args.ws_port), _make_ws_handler(sim))
+    ws.daemon_threads = True
+    http.daemon_threads = True
+    threading.Thread(target=sim.run_ticker, name="sim-ticker", daemon=True).start()
+    threading.Thread(target=ws.serve_forever, name="sim-ws", daemon=True).start()
+    print(f"REST http://{args.host}:{args.port}  WS ws://{args.host}:{args.ws_port}  symbols={len(sim.market.price)}", flush=True)
+    try:
+        http.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -14,9 +14,17 @@ def _get_list(var_name: str, default: str) -> list[str]:
 class Config:
     binance_api_key: str = os.getenv("BINANCE_API_KEY", "")
     binance_api_secret: str = os.getenv("BINANCE_API_SECRET", "")
+    # Yerel simülatör için: http://127.0.0.1:8800 / ws://127.0.0.1:8801 (bkz. binance_sim.py)
+    binance_base_url: str = os.getenv("BINANCE_BASE_URL", "https://fapi.binance.com")
+    binance_ws_url: str = os.getenv("BINANCE_WS_URL", "wss://fstream.binance.com")
 
     telegram_bot_token: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
     telegram_chat_id: str = os.getenv("TELEGRAM_CHAT_ID", "")
+    # Telegram gönderim kuyruğu: sohbet başına hız (mesaj/sn, patlama), kuyruk sınırı, özet penceresi
+    tg_rate_per_s: float = float(os.getenv("TG_RATE_PER_S", "1"))
+    tg_burst: int = int(os.getenv("TG_BURST", "3"))
+    tg_queue_max: int = int(os.getenv("TG_QUEUE_MAX", "200"))
+    tg_digest_ms: float = float(os.getenv("TG_DIGEST_MS", "500"))
 
     leverage: int = int(os.getenv("LEVERAGE", "15"))
     order_usdt_size: float = float(os.getenv("ORDER_USDT_SIZE", "20"))
@@ -46,12 +54,17 @@ class Config:
 
     preferred_price_max: float = float(os.getenv("PREFERRED_PRICE_MAX", "100"))
     low_price_priority_max: float = float(os.getenv("LOW_PRICE_PRIORITY_MAX", "1"))
+    universe_ttl_seconds: float = float(os.getenv("UNIVERSE_TTL_SECONDS", "300"))
+    universe_score: str = os.getenv("UNIVERSE_SCORE", "volume").lower()  # volume | volatility
+    universe_min_quote_volume: float = float(os.getenv("UNIVERSE_MIN_QUOTE_VOLUME", "0"))
 
     cooldown_bars: int = int(os.getenv("COOLDOWN_BARS", "3"))
     poll_seconds: int = int(os.getenv("POLL_SECONDS", "15"))
 
     # Modes and control
     simple_mode: bool = os.getenv("SIMPLE_MODE", "true").lower() == "true"
+    # Diğer modu aynı gösterge grafı üzerinde emir vermeden değerlendir (karşılaştırma sayaçları /status'ta)
+    shadow_mode: bool = os.getenv("SHADOW_MODE", "false").lower() == "true"
     paused: bool = os.getenv("PAUSED", "false").lower() == "true"
     run_mode: str = os.getenv("RUN_MODE", "LIVE")  # BACKTEST | PAPER | LIVE
 
@@ -60,6 +73,16 @@ class Config:
     be_trigger_atr_mult: float = float(os.getenv("BE_TRIGGER_ATR_MULT", "0.8"))
     lock_profit_atr_mult: float = float(os.getenv("LOCK_PROFIT_ATR_MULT", "0.1"))
     trail_atr_mult: float = float(os.getenv("TRAIL_ATR_MULT", "1.0"))
+    # Açık pozisyonlar için gerçek zamanlı fiyat akışı: markPrice | bookTicker | off
+    price_stream: str = os.getenv("PRICE_STREAM", "markPrice")
+    price_debounce_ms: float = float(os.getenv("PRICE_DEBOUNCE_MS", "250"))
+    trail_mode: str = os.getenv("TRAIL_MODE", "replace").lower()  # replace | native (TRAILING_STOP_MARKET)
+    # replace modunda SL taşıma eşiği: max(tick × TRAIL_MIN_TICKS, ATR × TRAIL_MIN_ATR_FRAC); sembol başına en az TRAIL_MIN_INTERVAL_S arayla
+    trail_min_ticks: int = int(os.getenv("TRAIL_MIN_TICKS", "3"))
+    trail_min_atr_frac: float = float(os.getenv("TRAIL_MIN_ATR_FRAC", "0.1"))
+    trail_min_interval_s: float = float(os.getenv("TRAIL_MIN_INTERVAL_S", "10"))
+    trail_settle_s: float = float(os.getenv("TRAIL_SETTLE_S", "60"))
+    trail_batch_ms: float = float(os.getenv("TRAIL_BATCH_MS", "250"))
 
     # Sizing
     sizing_mode: str = os.getenv("SIZING_MODE", "fixed")  # fixed | atr
@@ -67,6 +90,13 @@ class Config:
 
     # State
     state_path: str = os.getenv("STATE_PATH", "state.json")
+    # Değişiklik günlüğü (STATE_PATH.journal): fsync aralığı ve anlık görüntü sıklığı (kayıt sayısı)
+    state_fsync_ms: float = float(os.getenv("STATE_FSYNC_MS", "200"))
+    state_compact_every: int = int(os.getenv("STATE_COMPACT_EVERY", "500"))
+    # Yerel işlem defteri (SQLite): gelir geçmişi senkron aralığı ve ilk açılışta geriye çekilen gün
+    ledger_path: str = os.getenv("LEDGER_PATH", "ledger.db")
+    ledger_sync_seconds: float = float(os.getenv("LEDGER_SYNC_SECONDS", "300"))
+    ledger_bootstrap_days: int = int(os.getenv("LEDGER_BOOTSTRAP_DAYS", "7"))
 
     # Admin & risk guards
     admin_user_id: str = os.getenv("ADMIN_USER_ID", "")
@@ -77,8 +107,27 @@ class Config:
 
     # Drift & retry
     time_drift_max_ms: int = int(os.getenv("TIME_DRIFT_MAX_MS", "1500"))
+    clock_sync_seconds: float = float(os.getenv("CLOCK_SYNC_SECONDS", "30"))
+    recv_window_ms: int = int(os.getenv("RECV_WINDOW_MS", "5000"))
+    # Bu süre boyunca mesaj gelmeyen kline bağlantısı ölü sayılır ve yeniden kurulur
+    ws_stale_seconds: float = float(os.getenv("WS_STALE_SECONDS", "10"))
+    # WS -> asyncio köprüsü: (symbol, tf) başına tek slot, toplam kapasite
+    ws_bridge_max: int = int(os.getenv("WS_BRIDGE_MAX", "2048"))
+    # Sinyal değerlendirme havuzu: 0 = döngü içinde sırayla; process | thread
+    eval_workers: int = int(os.getenv("EVAL_WORKERS", "0"))
+    eval_pool: str = os.getenv("EVAL_POOL", "process").lower()
+    # Aynı dakika sınırında kapanan barları tek batch'te toplama penceresi
+    eval_batch_ms: int = int(os.getenv("EVAL_BATCH_MS", "20"))
+    # sharded_trader.py worker süreci sayısı (0 = çekirdek sayısı - 1)
+    shard_workers: int = int(os.getenv("SHARD_WORKERS", "0"))
     order_retry_max: int = int(os.getenv("ORDER_RETRY_MAX", "3"))
     order_retry_backoff_ms: int = int(os.getenv("ORDER_RETRY_BACKOFF_MS", "400"))
+    # Emir kuyruğu ve rate limit kovası (Binance USDⓈ-M: 2400 ağırlık/dk, 300 emir/10 sn)
+    order_workers: int = int(os.getenv("ORDER_WORKERS", "4"))
+    rate_weight_per_min: int = int(os.getenv("RATE_WEIGHT_PER_MIN", "2400"))
+    rate_orders_per_10s: int = int(os.getenv("RATE_ORDERS_PER_10S", "300"))
+    rate_headroom: float = float(os.getenv("RATE_HEADROOM", "0.8"))
+    entry_rate_reserve: float = float(os.getenv("ENTRY_RATE_RESERVE", "0.25"))
 
     # Order Block filter
     ob_enabled: bool = os.getenv("OB_ENABLED", "false").lower() == "true"
@@ -88,7 +137,10 @@ class Config:
 
     # Maker attempt
     maker_offset_bps: float = float(os.getenv("MAKER_OFFSET_BPS", "5"))
+    maker_enabled: bool = os.getenv("MAKER_ENABLED", "true").lower() == "true"
     maker_wait_seconds: float = float(os.getenv("MAKER_WAIT_SECONDS", "2"))
+    # Süre dolunca kalan miktar için en fazla bu kadar yeniden fiyatlanmış GTX, sonra MARKET
+    maker_reprice_max: int = int(os.getenv("MAKER_REPRICE_MAX", "1"))
 
     # MTF EMA filter (5m EMA20/50 trend gate)
     mtf_ema_filter: bool = os.getenv("MTF_EMA_FILTER", "false").lower() == "true"
@@ -0,0 +1,183 @@
+from __future__ import annotations
+import asyncio
+from typing import Any, Callable, Dict, NamedTuple
+
+from exchange.binance_client import BinanceClient
+from latency import LATENCY
+from order_scheduler import ENTRY, OrderScheduler
+
+
+class EntryFill(NamedTuple):
+    filled_qty: float
+    avg_price: float
+    maker_qty: float
+    market_qty: float
+    stuck: bool = False     # iptal ilk denemelerde kesinleşmedi: MARKET tamamlaması yapılmadı
+
+
+class _Working:
+    def __init__(self, client_id: str) -> None:
+        self.client_id = client_id
+        self.order_id: int | None = None
+        self.filled = 0.0
+        self.avg = 0.0
+        self.status = "NEW"
+        self.done = asyncio.Event()
+
+
+FINAL_STATUSES = ("FILLED", "CANCELED", "EXPIRED", "REJECTED")
+# -5022: GTX emri karşı tarafı geçerdi (kesin red); -2013: emir borsada yok
+POST_ONLY_REJECT = -5022
+NO_SUCH_ORDER = -2013
+SETTLE_BACKOFF_MAX_S = 5.0
+
+
+def _f(x: Any) -> float:
+    try:
+        return float(x or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class EntryExecutor:
+    """
+    Maker-first giriş: GTX limit emri gönderilir, dolum user-data olaylarından izlenir; süre
+    dolunca emir iptal edilir (iptal yanıtındaki executedQty kesin kabul edilir), gerekirse
+    güncel fiyattan yeniden fiyatlanır ve yalnızca dolmayan kalan için MARKET gönderilir.
+    Yalnızca kesin red (-5022 / EXPIRED) doğrudan MARKET'e geçer; belirsiz gönderim hatasında
+    emir clientOrderId ile kesinleştirilir, iptal doğrulanmadan tamamlama yapılmaz.
+    Her giriş kendi task'ında çalışır; olay döngüsünü bloklayan REST çağrıları thread'de.
+    """
+
+    def __init__(self, offset_bps: float = 5.0, wait_s: float = 2.0, reprices: int = 1, max_retry: int = 3, backoff_ms: int = 400, sched: OrderScheduler | None = None) -> None:
+        self.offset_bps = offset_bps
+        self.wait_s = wait_s
+        self.reprices = max(0, reprices)
+        self.max_retry = max_retry
+        self.backoff_ms = backoff_ms
+        self.sched = sched
+        self._working: Dict[str, _Working] = {}
+        self.stats = {"entries": 0, "maker_qty": 0.0, "market_qty": 0.0, "rejected": 0, "canceled": 0, "stuck": 0}
+
+    def on_event(self, evt: Dict[str, Any]) -> None:
+        """consume_user_events'ten (olay döngüsünde) çağrılır."""
+        if evt.get("e") != "ORDER_TRADE_UPDATE":
+            return
+        o = evt.get("o", {}) or {}
+        w = self._working.get(str(o.get("c")))
+        if w is None:
+            return
+        w.order_id = int(o["i"]) if o.get("i") is not None else w.order_id
+        w.filled = max(w.filled, _f(o.get("z")))
+        w.avg = _f(o.get("ap")) or w.avg
+        w.status = o.get("X", w.status)
+        if w.status in FINAL_STATUSES:
+            w.done.set()
+
+    async def _call(self, symbol: str, fn: Callable[..., Any], *args: Any, orders: float = 0.0) -> Any:
+        # Zamanlayıcı varsa ENTRY önceliğiyle (koruma emirlerinin arkasında) gönderilir
+        if self.sched is None:
+            return await asyncio.to_thread(fn, *args)
+        return await self.sched.run(ENTRY, symbol, fn, *args, orders=orders)
+
+    async def _settle(self, client: BinanceClient, symbol: str, w: _Working, forever: bool = False) -> bool:
+        """
+        İptal ile dolum yarışabilir: iptal yanıtı (yoksa emir sorgusu) kesin dolan miktarı verir.
+        Emir kesin duruma (FILLED/CANCELED/...) ulaşana kadar iptal yeniden denenir; ulaşmazsa
+        False döner ve çağıran ne yeniden fiyatlar ne de kalanı MARKET ile tamamlar. Emir id'si
+        bilinmiyorsa (gönderim yanıtı kayıp) clientOrderId ile iptal/sorgu yapılır.
+        `forever=True`: iptal kesinleşene kadar bırakılmaz (emir sahipsiz kalmasın).
+        """
+        attempt = 0
+        while True:
+            try:
+                r = await self._call(symbol, client.cancel_order, symbol, w.order_id, w.client_id, 1)
+                self.stats["canceled"] += 1
+            except Exception:
+                try:
+                    r = await self._call(symbol, client.query_order, symbol, w.order_id, w.client_id)
+                except Exception as e:
+                    r = None
+                    if getattr(e, "error_code", None) == NO_SUCH_ORDER:
+                        # Gönderim borsaya hiç ulaşmamış: dolum yok, kesin
+                        w.status = "EXPIRED"
+            if r is not None:
+                w.order_id = int(r["orderId"]) if r.get("orderId") is not None else w.order_id
+                w.filled = max(w.filled, _f(r.get("executedQty")))
+                w.avg = _f(r.get("avgPrice")) or w.avg
+                w.status = r.get("status", w.status)
+            # Olaylar da durumu kesinleştirebilir (on_event bekleme sırasında çalışır)
+            if w.status in FINAL_STATUSES:
+                return True
+            attempt += 1
+            if not forever and attempt >= max(1, self.max_retry):
+                return False
+            await asyncio.sleep(min(self.backoff_ms / 1000.0 * attempt, SETTLE_BACKOFF_MAX_S))
+
+    async def enter(self, client: BinanceClient, symbol: str, side: str, qty: float, ref_price: float, new_cid: Callable[[str, str], str]) -> EntryFill:
+        maker_qty = 0.0
+        cost = 0.0
+        px = ref_price
+        stuck = False
+        for attempt in range(1 + self.reprices):
+            remaining = client.format_qty(symbol, qty - maker_qty)
+            if remaining <= 0.0 or not client.min_notional_ok(symbol, px, remaining):
+                break
+            if attempt > 0:
+                try:
+                    px = await self._call(symbol, client.get_price, symbol)
+                except Exception:
+                    break
+            off = self.offset_bps / 10000.0
+            limit_px = client.format_price(symbol, px * (1 - off) if side == "BUY" else px * (1 + off))
+            cid_ = new_cid("MAKER", symbol)
+            w = _Working(cid_)
+            self._working[cid_] = w
+            try:
+                LATENCY.mark(cid_, "send")
+                try:
+                    resp = await self._call(symbol, client.place_limit_order, symbol, side, remaining, limit_px, "GTX", cid_, orders=1)
+                    LATENCY.mark(cid_, "ack")
+                except Exception as e:
+                    if getattr(e, "error_code", None) == POST_ONLY_REJECT:
+                        # Post-only reddi: fiyat karşı tarafı geçti, emir hiç açılmadı -> doğrudan market
+                        self.stats["rejected"] += 1
+                        break
+                    # Zaman aşımı / 5xx / bağlantı kopması: emir açılmış olabilir, önce kesinleştir
+                    resp = {}
+                    stuck = not await self._settle(client, symbol, w)
+                if resp:
+                    w.order_id = int(resp["orderId"]) if resp.get("orderId") is not None else None
+                    if resp.get("status") in ("EXPIRED", "REJECTED"):
+                        self.stats["rejected"] += 1
+                        break
+                    try:
+                        await asyncio.wait_for(w.done.wait(), timeout=self.wait_s)
+                    except asyncio.TimeoutError:
+                        stuck = not await self._settle(client, symbol, w)
+                if stuck:
+                    # İlk emir hâlâ çalışıyor olabilir: ikinci emir çift boyut riski doğurur. Emir
+                    # sahipsiz bırakılmaz; iptal kesinleşene kadar denenir, dolan kısım korumaya girer
+                    self.stats["stuck"] += 1
+                    await self._settle(client, symbol, w, forever=True)
+            finally:
+                self._working.pop(cid_, None)
+            maker_qty += w.filled
+            cost += w.filled * (w.avg or limit_px)
+            if stuck or w.status == "FILLED":
+                break
+
+        market_qty = 0.0
+        remaining = client.format_qty(symbol, qty - maker_qty)
+        if not stuck and remaining > 0.0 and client.min_notional_ok(symbol, px, remaining):
+            mkt_cid = new_cid("MKT", symbol)
+            LATENCY.mark(mkt_cid, "send")
+            resp = await self._call(symbol, client.place_market_order, symbol, side, remaining, False, mkt_cid, self.max_retry, self.backoff_ms, orders=1)
+            LATENCY.mark(mkt_cid, "ack")
+            market_qty = _f(resp.get("executedQty")) or remaining
+            cost += market_qty * (_f(resp.get("avgPrice")) or px)
+        filled = maker_qty + market_qty
+        self.stats["entries"] += 1
+        self.stats["maker_qty"] += maker_qty
+        self.stats["market_qty"] += market_qty
+        return EntryFill(client.format_qty(symbol, filled), cost / filled if filled > 0 else 0.0, maker_qty, market_qty, stuck)
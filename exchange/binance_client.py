@@ -1,31 +1,77 @@
 from __future__ import annotations
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from typing import Any, Dict, List, Tuple, Callable
 
 import requests
 from binance.um_futures import UMFutures
 
+from exchange.clock import ClockSync
+from exchange.rate_limit import RateLimiter
+from exchange.universe import SCORERS, UniverseScanner, volume_score
+
+
+# Binance batchOrders uç noktası istek başına en fazla 5 emir kabul eder
+BATCH_MAX_ORDERS = 5
+
+
+@dataclass
+class OrderLegResult:
+    tag: str
+    client_id: str | None
+    ok: bool
+    order_id: int | None = None
+    error: str | None = None
+
+
+class BracketError(Exception):
+    """Koruma emirlerinden en az biri reddedildi; başarılı bacaklar geri alındı."""
+
+    def __init__(self, message: str, legs: Dict[str, OrderLegResult]) -> None:
+        super().__init__(message)
+        self.legs = legs
+
 
 class BinanceClient:
-    def __init__(self, api_key: str, api_secret: str) -> None:
+    def __init__(self, api_key: str, api_secret: str, universe_ttl_seconds: float = 300.0, universe_score: str = "volume", clock_sync_seconds: float = 30.0, recv_window_ms: int = 5000, base_url: str | None = None, weight_per_min: int = 2400, orders_per_10s: int = 300, rate_headroom: float = 0.8) -> None:
         # UMFutures resmi Binance Futures (USDⓈ-M) istemcisi
-        self.client = UMFutures(key=api_key, secret=api_secret)
+        self.client = UMFutures(key=api_key, secret=api_secret, **({"base_url": base_url} if base_url else {}))
         # Geriye dönük uyumluluk: bazı yerlerde `um` alanı kullanılıyor
         # (ör. eski selftest/probe scriptleri). AttributeError'ı önlemek için alias.
         self.um = self.client  # type: ignore[attr-defined]
         self._exchange_info_cache: Dict[str, Any] | None = None
         self._symbol_filters: Dict[str, Dict[str, Any]] = {}
+        # Sunucu saati ofseti: tüm imzalı istekler düzeltilmiş timestamp + recvWindow alır
+        self.clock = ClockSync(self.server_time, interval_s=clock_sync_seconds, base_recv_window_ms=recv_window_ms)
+        self.clock.install(self.client)
+        # Ağırlık / emir sayısı kovası: yanıt başlıklarıyla borsanın gördüğü kullanıma eşitlenir
+        self.limiter = RateLimiter(weight_per_min, orders_per_10s, rate_headroom)
+        self.client.session.hooks["response"].append(self.limiter.on_response)
+        self.universe = UniverseScanner(self, ttl_seconds=universe_ttl_seconds, score_fn=SCORERS.get(universe_score, volume_score))
 
     def server_time(self) -> int:
         return int(self.client.time()["serverTime"])  # type: ignore
 
-    def _retry(self, func: Callable, *args, max_retry: int = 3, backoff_ms: int = 400, **kwargs):
+    def _retry(self, func: Callable, *args, max_retry: int = 3, backoff_ms: int = 400, rejected_only: bool = False, **kwargs):
+        # rejected_only: yalnızca borsanın isteği işlemeden reddettiği hatalar tekrar denenir
+        # (timestamp, rate limit); zaman aşımı / 5xx sonrası istek uygulanmış olabilir
         last_err = None
         for i in range(max_retry):
             try:
                 return func(*args, **kwargs)
             except Exception as e:
                 last_err = e
+                if getattr(e, "error_code", None) == -1021:
+                    # Timestamp reddi: ofseti hemen yenile ve beklemeden tekrar dene
+                    self.clock.force_resync()
+                    continue
+                if getattr(e, "status_code", None) in (418, 429):
+                    # Rate limit: Retry-After süresi dolmadan tekrar deneme
+                    time.sleep(max(self.limiter.delay(0.0), backoff_ms / 1000.0))
+                    continue
+                if rejected_only:
+                    raise
                 time.sleep((backoff_ms / 1000.0) * (1.5 ** i))
         if last_err:
             raise last_err
@@ -73,6 +119,13 @@ class BinanceClient:
             params["newClientOrderId"] = client_id
         return self._retry(self.client.new_order, **params, max_retry=max_retry, backoff_ms=backoff_ms)
 
+    def place_limit_order(self, symbol: str, side: str, quantity: float, price: float, time_in_force: str = "GTX", client_id: str | None = None, max_retry: int = 1, backoff_ms: int = 400) -> Dict[str, Any]:
+        # GTX (post-only) reddi (-5022) tekrar denenmez: varsayılan tek deneme
+        params = dict(symbol=symbol, side=side, type="LIMIT", timeInForce=time_in_force, price=str(price), quantity=quantity)
+        if client_id:
+            params["newClientOrderId"] = client_id
+        return self._retry(self.client.new_order, **params, max_retry=max_retry, backoff_ms=backoff_ms)
+
     def place_stop_market(self, symbol: str, side: str, stop_price: float, close_position: bool = True, reduce_only: bool = True, client_id: str | None = None, max_retry: int = 3, backoff_ms: int = 400) -> Dict[str, Any]:
         params = dict(symbol=symbol, side=side, type="STOP_MARKET", stopPrice=str(stop_price), closePosition=close_position, reduceOnly=reduce_only, timeInForce="GTC", workingType="CONTRACT_PRICE")
         if client_id:
@@ -87,59 +140,181 @@ class BinanceClient:
             params["newClientOrderId"] = client_id
         return self._retry(self.client.new_order, **params, max_retry=max_retry, backoff_ms=backoff_ms)
 
-    def cancel_order(self, symbol: str, order_id: int | None = None, orig_client_order_id: str | None = None):
-        return self._retry(self.client.cancel_order, symbol=symbol, orderId=order_id, origClientOrderId=orig_client_order_id)
+    @staticmethod
+    def _batch_params(params: Dict[str, Any]) -> Dict[str, str]:
+        # batchOrders JSON olarak gönderilir; tüm değerler string, bool'lar küçük harf olmalı
+        out: Dict[str, str] = {}
+        for k, v in params.items():
+            if v is None:
+                continue
+            out[k] = ("true" if v else "false") if isinstance(v, bool) else str(v)
+        return out
+
+    @staticmethod
+    def _leg_result(tag: str, params: Dict[str, Any], resp: Any) -> OrderLegResult:
+        client_id = params.get("newClientOrderId")
+        if isinstance(resp, dict) and resp.get("orderId") is not None:
+            return OrderLegResult(tag, client_id, True, order_id=int(resp["orderId"]))
+        if isinstance(resp, dict):
+            return OrderLegResult(tag, client_id, False, error=f"{resp.get('code')}: {resp.get('msg')}")
+        return OrderLegResult(tag, client_id, False, error=str(resp))
+
+    def _find_leg(self, tag: str, params: Dict[str, Any]) -> OrderLegResult | None:
+        """clientOrderId ile borsada zaten açılmış bacağı bul (yanıtı kaybolmuş gönderim); yoksa None."""
+        client_id = params.get("newClientOrderId")
+        if not client_id:
+            return None
+        try:
+            o = self.query_order(params["symbol"], orig_client_order_id=client_id)
+        except Exception:
+            return None
+        if o.get("orderId") is None or o.get("status") in ("CANCELED", "EXPIRED", "REJECTED"):
+            return None
+        return OrderLegResult(tag, client_id, True, order_id=int(o["orderId"]))
+
+    def place_orders(self, legs: List[Tuple[str, Dict[str, Any]]], max_retry: int = 3, backoff_ms: int = 400) -> Dict[str, OrderLegResult]:
+        """
+        Emirleri tek bir batchOrders isteğinde gönderir (en fazla 5 bacak).
+        Batch yalnızca kesin redde (timestamp / rate limit) tekrar denenir; başka bir hatada
+        istek uygulanmış olabilir, bu yüzden her bacak önce clientOrderId ile sorgulanır ve
+        açık olanlar gönderilmiş sayılır (geri alma onları da iptal eder), kalanlar eşzamanlı
+        `new_order` çağrılarıyla gönderilir.
+        """
+        if len(legs) <= BATCH_MAX_ORDERS:
+            try:
+                batch = [self._batch_params(p) for _, p in legs]
+                resp = self._retry(self.client.new_batch_order, batchOrders=batch, max_retry=max_retry, backoff_ms=backoff_ms, rejected_only=True)
+                if isinstance(resp, list) and len(resp) == len(legs):
+                    return {tag: self._leg_result(tag, p, r) for (tag, p), r in zip(legs, resp)}
+            except Exception:
+                pass
+
+        def _one(tag: str, params: Dict[str, Any]) -> OrderLegResult:
+            found = self._find_leg(tag, params)
+            if found is not None:
+                return found
+            try:
+                resp = self._retry(self.client.new_order, **params, max_retry=max_retry, backoff_ms=backoff_ms)
+                return self._leg_result(tag, params, resp)
+            except Exception as e:
+                # Tekrar denemede cid çakışması: ilk gönderim ulaşmış olabilir
+                return self._find_leg(tag, params) or OrderLegResult(tag, params.get("newClientOrderId"), False, error=str(e))
+
+        with ThreadPoolExecutor(max_workers=max(len(legs), 1)) as pool:
+            futures = [(tag, pool.submit(_one, tag, p)) for tag, p in legs]
+            return {tag: f.result() for tag, f in futures}
+
+    def place_bracket(self, symbol: str, side: str, sl_price: float, tp1_price: float, tp2_price: float, tp_qty: float, client_ids: Dict[str, str] | None = None, trail: Tuple[float, float] | None = None, max_retry: int = 3, backoff_ms: int = 400) -> Dict[str, OrderLegResult]:
+        """
+        Giriş sonrası SL + TP1 + TP2 koruma emirlerini tek istekte yerleştirir.
+        `side` kapanış yönüdür (LONG için SELL). `trail=(activation_price, callback_rate)`
+        verilirse ikinci yarı için borsa tarafında TRAILING_STOP_MARKET bacağı eklenir.
+        Bacaklardan biri reddedilirse başarılı olanlar iptal edilir ve BracketError
+        yükseltilir; pozisyonu kapatmak çağıranın sorumluluğundadır.
+        """
+        ids = client_ids or {}
+        legs: List[Tuple[str, Dict[str, Any]]] = [
+            ("SL", dict(symbol=symbol, side=side, type="STOP_MARKET", stopPrice=str(sl_price), closePosition=True, timeInForce="GTC", workingType="CONTRACT_PRICE", newClientOrderId=ids.get("SL"))),
+            ("TP1", dict(symbol=symbol, side=side, type="TAKE_PROFIT_MARKET", stopPrice=str(tp1_price), quantity=tp_qty, reduceOnly=True, timeInForce="GTC", workingType="CONTRACT_PRICE", newClientOrderId=ids.get("TP1"))),
+            ("TP2", dict(symbol=symbol, side=side, type="TAKE_PROFIT_MARKET", stopPrice=str(tp2_price), quantity=tp_qty, reduceOnly=True, timeInForce="GTC", workingType="CONTRACT_PRICE", newClientOrderId=ids.get("TP2"))),
+        ]
+        if trail is not None:
+            activation_price, callback_rate = trail
+            legs.append(("TRAIL", dict(symbol=symbol, side=side, type="TRAILING_STOP_MARKET", quantity=tp_qty, reduceOnly=True, activationPrice=str(activation_price), callbackRate=str(callback_rate), workingType="CONTRACT_PRICE", newClientOrderId=ids.get("TRAIL"))))
+        legs = [(tag, {k: v for k, v in p.items() if v is not None}) for tag, p in legs]
+        results = self.place_orders(legs, max_retry=max_retry, backoff_ms=backoff_ms)
+        failed = [r for r in results.values() if not r.ok]
+        if failed:
+            placed = [r.order_id for r in results.values() if r.ok and r.order_id is not None]
+            if placed:
+                try:
+                    self._retry(self.client.cancel_batch_order, symbol=symbol, orderIdList=placed, origClientOrderIdList=None)
+                except Exception:
+                    for oid in placed:
+                        try:
+                            self.cancel_order(symbol, order_id=oid)
+                        except Exception:
+                            pass
+            for r in failed:
+                # Durumu belirsiz bacak (sorgu da başarısız) borsada açık kalmış olabilir: cid ile iptal
+                if r.client_id:
+                    try:
+                        self.cancel_order(symbol, orig_client_order_id=r.client_id, max_retry=1)
+                    except Exception:
+                        pass
+            raise BracketError(f"{symbol} bracket failed: " + ", ".join(f"{r.tag}={r.error}" for r in failed), results)
+        return results
+
+    def place_trailing_stop(self, symbol: str, side: str, quantity: float, callback_rate: float, activation_price: float | None = None, client_id: str | None = None, max_retry: int = 3, backoff_ms: int = 400) -> Dict[str, Any]:
+        params: Dict[str, Any] = dict(symbol=symbol, side=side, type="TRAILING_STOP_MARKET", quantity=quantity, reduceOnly=True, callbackRate=str(callback_rate), workingType="CONTRACT_PRICE")
+        if activation_price is not None:
+            params["activationPrice"] = str(activation_price)
+        if client_id:
+            params["newClientOrderId"] = client_id
+        return self._retry(self.client.new_order, **params, max_retry=max_retry, backoff_ms=backoff_ms)
+
+    @staticmethod
+    def callback_rate_for(trail_distance: float, ref_price: float) -> float:
+        """Mutlak iz mesafesini Binance callbackRate yüzdesine çevirir (0.1–5.0, 0.1 adım)."""
+        rate = 100.0 * trail_distance / max(ref_price, 1e-9)
+        return round(min(max(rate, 0.1), 5.0), 1)
+
+    def cancel_order(self, symbol: str, order_id: int | None = None, orig_client_order_id: str | None = None, max_retry: int = 3):
+        return self._retry(self.client.cancel_order, symbol=symbol, orderId=order_id, origClientOrderId=orig_client_order_id, max_retry=max_retry)
+
+    def query_order(self, symbol: str, order_id: int | None = None, orig_client_order_id: str | None = None) -> Dict[str, Any]:
+        return self._retry(self.client.query_order, symbol=symbol, orderId=order_id, origClientOrderId=orig_client_order_id)
 
     def cancel_open_orders(self, symbol: str):
         return self._retry(self.client.cancel_open_orders, symbol=symbol)
 
-    def get_open_orders(self, symbol: str) -> List[Dict[str, Any]]:
-        return self._retry(self.client.get_open_orders, symbol=symbol)
+    def get_open_orders(self, symbol: str | None = None) -> List[Dict[str, Any]]:
+        # /fapi/v1/openOrders: symbol verilmezse tüm semboller tek istekte döner
+        return self._retry(self.client.get_orders, symbol=symbol)
+
+    def get_balances(self) -> List[Dict[str, Any]]:
+        return self._retry(self.client.balance)
 
     def get_position_risk(self, symbol: str | None = None) -> List[Dict[str, Any]]:
-        return self._retry(self.client.position_risk, symbol=symbol)
+        # connector 4.x: get_position_risk; eski sürümler: position_risk
+        fn = getattr(self.client, "get_position_risk", None) or self.client.position_risk
+        return self._retry(fn, symbol=symbol)
 
-    def income_history(self, start_time_ms: int | None = None, end_time_ms: int | None = None, income_type: str | None = None) -> List[Dict[str, Any]]:
+    def income_history(self, start_time_ms: int | None = None, end_time_ms: int | None = None, income_type: str | None = None, limit: int | None = None) -> List[Dict[str, Any]]:
         params: Dict[str, Any] = {}
+        if limit is not None:
+            params["limit"] = limit
         if start_time_ms is not None:
             params["startTime"] = start_time_ms
         if end_time_ms is not None:
             params["endTime"] = end_time_ms
         if income_type is not None:
             params["incomeType"] = income_type
-        return self._retry(self.client.income, **params)
+        fn = getattr(self.client, "get_income_history", None) or self.client.income
+        return self._retry(fn, **params)
 
     def get_24h_tickers(self) -> List[Dict[str, Any]]:
         return self._retry(self.client.ticker_24hr_price_change)
 
     def get_top_usdt_perp_symbols(self, top_n: int = 30, exclude: Tuple[str, ...] = tuple(), price_max: float = 100.0, prefer_low_price_max: float = 1.0, **kwargs) -> List[str]:
         """
-        24h hacme göre USDT vadeli en likit sembolleri döndürür.
+        24h ticker anlık görüntüsünden USDT vadeli sembolleri sıralar (tek istek, TTL önbellekli).
         Eski çağrılarla uyum için limit/min_price/low_price_priority_max anahtarlarını da kabul eder.
         """
         # Eski imza uyumluluğu
         if "limit" in kwargs and isinstance(kwargs["limit"], int):
             top_n = kwargs["limit"]
-        if "min_price" in kwargs:
-            # min_price burada kullanılmıyor; mantık gereği düşük fiyat tercihleri `prefer_low_price_max` ile kontrol ediliyor
-            pass
         if "low_price_priority_max" in kwargs:
             prefer_low_price_max = float(kwargs["low_price_priority_max"])  # type: ignore[arg-type]
-        tickers = self.get_24h_tickers()
-        filtered = [t for t in tickers if t.get("symbol", "").endswith("USDT") and t.get("symbol") not in exclude]
-        filtered.sort(key=lambda x: float(x.get("quoteVolume", 0.0)), reverse=True)
-        symbols = [t["symbol"] for t in filtered]
-        prices: Dict[str, float] = {}
-        for s in symbols[:top_n*2]:
-            try:
-                prices[s] = self.get_price(s)
-                time.sleep(0.05)
-            except Exception:
-                continue
-        low = [s for s in symbols if s in prices and prices[s] <= prefer_low_price_max]
-        mid = [s for s in symbols if s in prices and prefer_low_price_max < prices[s] <= price_max]
-        out = (low + mid)[:top_n]
-        return out
+        return self.universe.top(
+            top_n=top_n,
+            exclude=exclude,
+            price_max=price_max,
+            prefer_low_price_max=prefer_low_price_max,
+            min_price=float(kwargs.get("min_price", 0.0) or 0.0),
+            min_quote_volume=float(kwargs.get("min_quote_volume", 0.0) or 0.0),
+            score_fn=kwargs.get("score_fn"),
+        )
 
     def _load_symbol_filters(self, symbol: str) -> Dict[str, Any]:
         if symbol in self._symbol_filters:
@@ -169,6 +344,10 @@ class BinanceClient:
         qty_precision, _ = self.get_symbol_precision(symbol)
         return float(f"{quantity:.{qty_precision}f}")
 
+    def tick_size(self, symbol: str) -> float:
+        filters = self._load_symbol_filters(symbol)
+        return float(filters.get("PRICE_FILTER", {}).get("tickSize", 0.0) or 0.0)
+
     def format_price(self, symbol: str, price: float) -> float:
         filters = self._load_symbol_filters(symbol)
         tick_size = float(filters.get("PRICE_FILTER", {}).get("tickSize", 0.0) or 0.0)
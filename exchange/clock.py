@@ -0,0 +1,123 @@
+from __future__ import annotations
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+
+
+class ClockSync:
+    """
+    Sunucu saati ofseti servisi. Periyodik olarak /time örneklenir; en düşük RTT'li
+    örnek seçilip ofset üstel ortalamayla yumuşatılır. İmzalı istekler `now_ms()` ile
+    düzeltilmiş timestamp ve RTT'ye göre ayarlanan recvWindow alır (bkz. `install`).
+    """
+
+    def __init__(
+        self,
+        fetch_server_ms: Callable[[], int],
+        interval_s: float = 30.0,
+        alpha: float = 0.2,
+        base_recv_window_ms: int = 5000,
+        step_threshold_ms: float = 1000.0,
+    ) -> None:
+        self._fetch = fetch_server_ms
+        self.interval_s = interval_s
+        self.alpha = alpha
+        self.base_recv_window_ms = base_recv_window_ms
+        self.step_threshold_ms = step_threshold_ms
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.offset_ms: float = 0.0
+        self.rtt_ms: float = 0.0
+        self.samples: int = 0
+        self.resyncs: int = 0
+        self.max_abs_offset_ms: float = 0.0
+        self.last_sync_mono: float | None = None
+
+    def _sample(self) -> Tuple[float, float]:
+        t0 = time.time() * 1000.0
+        server = float(self._fetch())
+        t1 = time.time() * 1000.0
+        rtt = t1 - t0
+        return server - (t0 + t1) / 2.0, rtt
+
+    def sync(self, burst: int = 3) -> None:
+        best: Tuple[float, float] | None = None
+        for _ in range(max(burst, 1)):
+            try:
+                off, rtt = self._sample()
+            except Exception:
+                continue
+            if best is None or rtt < best[1]:
+                best = (off, rtt)
+        if best is None:
+            return
+        off, rtt = best
+        with self._lock:
+            # İlk örnek veya büyük sıçrama (ör. host saati ayarlandı): doğrudan uygula
+            if self.samples == 0 or abs(off - self.offset_ms) > self.step_threshold_ms:
+                self.offset_ms = off
+                self.rtt_ms = rtt
+            else:
+                self.offset_ms += self.alpha * (off - self.offset_ms)
+                self.rtt_ms += self.alpha * (rtt - self.rtt_ms)
+            self.samples += 1
+            self.max_abs_offset_ms = max(self.max_abs_offset_ms, abs(self.offset_ms))
+            self.last_sync_mono = time.monotonic()
+
+    def force_resync(self) -> None:
+        """-1021 (timestamp outside recvWindow) sonrası hemen yeniden örnekle."""
+        self.resyncs += 1
+        self.sync()
+
+    def now_ms(self) -> int:
+        return int(time.time() * 1000.0 + self.offset_ms)
+
+    def recv_window_ms(self) -> int:
+        # Ağ gecikmesi büyüdükçe pencere genişler; Binance üst sınırı 60000
+        return int(min(60000, self.base_recv_window_ms + 2.0 * self.rtt_ms))
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            age = None if self.last_sync_mono is None else time.monotonic() - self.last_sync_mono
+            return {
+                "offset_ms": round(self.offset_ms, 1),
+                "rtt_ms": round(self.rtt_ms, 1),
+                "recv_window_ms": self.recv_window_ms(),
+                "samples": self.samples,
+                "resyncs": self.resyncs,
+                "max_abs_offset_ms": round(self.max_abs_offset_ms, 1),
+                "last_sync_age_s": None if age is None else round(age, 1),
+            }
+
+    def install(self, api: Any) -> None:
+        """
+        binance-connector imzalı istekleri `binance.api.get_timestamp` ile damgalar;
+        bu modül fonksiyonu düzeltilmiş saatle değiştirilir (süreç genelinde) ve
+        istemcinin `sign_request`'i varsayılan recvWindow ekleyecek şekilde sarılır.
+        """
+        import binance.api as _api
+
+        _api.get_timestamp = self.now_ms  # type: ignore[assignment]
+        orig = api.sign_request
+
+        def sign_request(http_method, url_path, payload=None, special=False):
+            payload = payload if payload is not None else {}
+            payload.setdefault("recvWindow", self.recv_window_ms())
+            return orig(http_method, url_path, payload, special)
+
+        api.sign_request = sign_request
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.sync()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="clock-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+import threading
+import time
+from typing import Any, Dict
+
+
+class RateLimiter:
+    """
+    İstek ağırlığı (dakika) ve emir sayısı (10 sn) için iki token bucket. Kovalar sürekli
+    dolar; borsanın X-MBX-USED-WEIGHT-1M / X-MBX-ORDER-COUNT-10S başlıkları (zamanlayıcı
+    dışındaki REST çağrıları dahil) kalan tokenları aşağı çeker, 429/418 `Retry-After`
+    süresi boyunca tüm gönderimleri durdurur.
+    """
+
+    def __init__(self, weight_per_min: int = 2400, orders_per_10s: int = 300, headroom: float = 0.8) -> None:
+        self._lock = threading.Lock()
+        self.weight_limit = weight_per_min
+        self.order_limit = orders_per_10s
+        self.w_cap = max(weight_per_min * headroom, 1.0)
+        self.o_cap = max(orders_per_10s * headroom, 1.0)
+        self.w_rate = self.w_cap / 60.0
+        self.o_rate = self.o_cap / 10.0
+        self.w_tokens = self.w_cap
+        self.o_tokens = self.o_cap
+        self.blocked_until = 0.0
+        self._t = time.monotonic()
+        self.throttled = 0
+        self.banned = 0
+
+    def _refill(self, now: float) -> None:
+        dt = max(now - self._t, 0.0)
+        self._t = now
+        self.w_tokens = min(self.w_cap, self.w_tokens + dt * self.w_rate)
+        self.o_tokens = min(self.o_cap, self.o_tokens + dt * self.o_rate)
+
+    def delay(self, weight: float = 1.0, orders: float = 0.0, reserve: float = 0.0) -> float:
+        """Gönderim için beklenecek süre (sn); `reserve` kovanın bu oranı boş kalacak şekilde hesaplanır."""
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            need_w = weight + reserve * self.w_cap - self.w_tokens
+            need_o = (orders + reserve * self.o_cap - self.o_tokens) if orders else 0.0
+            wait = max(need_w / self.w_rate if need_w > 0 else 0.0, need_o / self.o_rate if need_o > 0 else 0.0)
+            if wait > 0:
+                self.throttled += 1
+            return wait
+
+    def take(self, weight: float = 1.0, orders: float = 0.0) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.w_tokens -= weight
+            self.o_tokens -= orders
+
+    def on_response(self, resp: Any, *args: Any, **kwargs: Any) -> None:
+        """requests `response` hook'u: sunucunun gördüğü kullanım yerel kovadan büyükse ona uy."""
+        h = resp.headers
+        with self._lock:
+            self._refill(time.monotonic())
+            used_w = h.get("X-MBX-USED-WEIGHT-1M") or h.get("x-mbx-used-weight-1m")
+            if used_w is not None:
+                self.w_tokens = min(self.w_tokens, self.w_cap - float(used_w) * self.w_cap / self.weight_limit)
+            used_o = h.get("X-MBX-ORDER-COUNT-10S") or h.get("x-mbx-order-count-10s")
+            if used_o is not None:
+                self.o_tokens = min(self.o_tokens, self.o_cap - float(used_o) * self.o_cap / self.order_limit)
+            if resp.status_code in (418, 429):
+                try:
+                    retry = float(h.get("Retry-After") or 0) or 5.0
+                except ValueError:
+                    retry = 5.0
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry)
+                self.banned += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "weight_free": round(self.w_tokens / self.w_cap, 2),
+                "orders_free": round(self.o_tokens / self.o_cap, 2),
+                "blocked_s": round(max(self.blocked_until - time.monotonic(), 0.0), 1),
+                "throttled": self.throttled,
+                "banned": self.banned,
+            }
@@ -0,0 +1,121 @@
+from __future__ import annotations
+import math
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List
+
+if TYPE_CHECKING:
+    from exchange.binance_client import BinanceClient
+
+
+@dataclass
+class SymbolStats:
+    symbol: str
+    last_price: float
+    quote_volume: float
+    range_pct: float   # (24h high - low) / last: ATR% benzeri oynaklık
+    change_pct: float
+
+
+ScoreFn = Callable[[SymbolStats], float]
+
+
+def volume_score(st: SymbolStats) -> float:
+    return st.quote_volume
+
+
+def volatility_score(st: SymbolStats) -> float:
+    # log-hacim × günlük aralık: hem likit hem hareketli semboller öne çıkar
+    return math.log10(max(st.quote_volume, 1.0)) * st.range_pct
+
+
+SCORERS: Dict[str, ScoreFn] = {
+    "volume": volume_score,
+    "volatility": volatility_score,
+}
+
+
+def _stats_from_ticker(t: Dict[str, Any]) -> SymbolStats | None:
+    try:
+        last = float(t.get("lastPrice", 0.0) or 0.0)
+        if last <= 0:
+            return None
+        high = float(t.get("highPrice", last) or last)
+        low = float(t.get("lowPrice", last) or last)
+        return SymbolStats(
+            symbol=str(t["symbol"]),
+            last_price=last,
+            quote_volume=float(t.get("quoteVolume", 0.0) or 0.0),
+            range_pct=max(high - low, 0.0) / last,
+            change_pct=float(t.get("priceChangePercent", 0.0) or 0.0),
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class UniverseScanner:
+    """
+    Sembol evreni tek bir 24h ticker anlık görüntüsünden sıralanır; fiyat `lastPrice`
+    alanından okunur, sembol başına fiyat isteği atılmaz. Anlık görüntü `ttl_seconds`
+    boyunca önbellekte tutulur (/autocoins, /selftest ve periyodik yenileme paylaşır).
+    """
+
+    def __init__(self, client: "BinanceClient", ttl_seconds: float = 300.0, score_fn: ScoreFn | None = None) -> None:
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.score_fn: ScoreFn = score_fn or volume_score
+        self._snapshot: List[SymbolStats] = []
+        self._snapshot_ts: float = 0.0
+
+    def _perpetuals(self) -> set[str] | None:
+        # exchangeInfo istemcide bir kez önbelleklenir; TRADING durumundaki USDT perpetual'lar
+        try:
+            info = self.client.get_exchange_info()
+        except Exception:
+            return None
+        out = {
+            s["symbol"] for s in info.get("symbols", [])
+            if s.get("contractType") == "PERPETUAL" and s.get("status") == "TRADING" and s.get("quoteAsset") == "USDT"
+        }
+        return out or None
+
+    def snapshot(self, force: bool = False) -> List[SymbolStats]:
+        now = time.monotonic()
+        if not force and self._snapshot and (now - self._snapshot_ts) < self.ttl_seconds:
+            return self._snapshot
+        tickers = self.client.get_24h_tickers()
+        perps = self._perpetuals()
+        stats: List[SymbolStats] = []
+        for t in tickers:
+            sym = t.get("symbol", "")
+            if not sym.endswith("USDT") or (perps is not None and sym not in perps):
+                continue
+            st = _stats_from_ticker(t)
+            if st is not None:
+                stats.append(st)
+        self._snapshot = stats
+        self._snapshot_ts = now
+        return stats
+
+    def top(
+        self,
+        top_n: int = 30,
+        exclude: Iterable[str] = tuple(),
+        price_max: float = 100.0,
+        prefer_low_price_max: float = 1.0,
+        min_price: float = 0.0,
+        min_quote_volume: float = 0.0,
+        score_fn: ScoreFn | None = None,
+    ) -> List[str]:
+        """Düşük fiyat bandı (<= prefer_low_price_max) önce, ardından orta band; her band skora göre."""
+        score = score_fn or self.score_fn
+        excluded = set(exclude)
+        rows = [st for st in self.snapshot() if st.symbol not in excluded and st.quote_volume >= min_quote_volume]
+        # Aday havuzu fiyat filtresinden önce en likit top_n*2 ile sınırlı (band ayrımı likit olmayan
+        # ucuz sembolleri öne almasın); skor yalnızca havuz içindeki sırayı belirler
+        rows.sort(key=lambda st: st.quote_volume, reverse=True)
+        rows = [st for st in rows[: top_n * 2] if min_price <= st.last_price <= price_max]
+        rows.sort(key=score, reverse=True)
+        low = [st.symbol for st in rows if st.last_price <= prefer_low_price_max]
+        mid = [st.symbol for st in rows if st.last_price > prefer_low_price_max]
+        return (low + mid)[:top_n]
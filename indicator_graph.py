@@ -0,0 +1,138 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicators import rsi, atr, faytterro_bands, ssl_channel, supertrend, taker_flow_direction
+from orderblocks import detect_order_blocks
+
+# Düğüm anahtarı: (ad, tf, *parametreler), ör. ("rsi", "1m", 14)
+Key = Tuple[Any, ...]
+
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    name: str
+    fn: Callable[..., Any]                     # fn(df, dep_values, *params)
+    deps: Callable[..., List[Key]]             # deps(tf, *params) -> bağımlı düğüm anahtarları
+
+
+REGISTRY: Dict[str, IndicatorSpec] = {}
+
+
+def register(name: str, deps: Callable[..., List[Key]] | None = None):
+    def deco(fn: Callable[..., Any]) -> Callable[..., Any]:
+        REGISTRY[name] = IndicatorSpec(name, fn, deps or (lambda tf, *p: []))
+        return fn
+    return deco
+
+
+class IndicatorGraph:
+    """
+    Bir bar kapanışı için gösterge DAG'ı. Stratejiler düğümleri ad + parametreyle ister;
+    her düğüm bağımlılıklarıyla birlikte ilk istendiğinde bir kez hesaplanır ve iki mod
+    (basit / gelişmiş) aynı grafı paylaşır. Girdi DataFrame'leri kopyalanmaz, değiştirilmez.
+    """
+
+    def __init__(self, frames: Dict[str, pd.DataFrame]) -> None:
+        self.frames = frames
+        self._memo: Dict[Key, Any] = {}
+        self.computed = 0
+        self.hits = 0
+
+    def frame(self, tf: str) -> pd.DataFrame:
+        return self.frames[tf]
+
+    def get(self, name: str, tf: str, *params: Any) -> Any:
+        key = (name, tf) + params
+        if key in self._memo:
+            self.hits += 1
+            return self._memo[key]
+        spec = REGISTRY[name]
+        deps = [self.get(*k) for k in spec.deps(tf, *params)]
+        val = spec.fn(self.frames[tf], deps, *params)
+        self._memo[key] = val
+        self.computed += 1
+        return val
+
+    def plan(self, keys: List[Key]) -> List[Key]:
+        """İstenen düğümlerin bağımlılık sırası (topolojik; tekrarsız)."""
+        order: List[Key] = []
+        seen: set = set()
+
+        def visit(k: Key, path: Tuple[Key, ...]) -> None:
+            if k in seen:
+                return
+            if k in path:
+                raise ValueError(f"indicator cycle: {k}")
+            for d in REGISTRY[k[0]].deps(k[1], *k[2:]):
+                visit(d, path + (k,))
+            seen.add(k)
+            order.append(k)
+
+        for k in keys:
+            visit(k, ())
+        return order
+
+
+# --- düğümler -----------------------------------------------------------
+
+@register("rsi")
+def _rsi(df: pd.DataFrame, _deps: list, period: int) -> pd.Series:
+    return rsi(df["close"], period)
+
+
+@register("atr")
+def _atr(df: pd.DataFrame, _deps: list, period: int) -> pd.Series:
+    return atr(df, period)
+
+
+@register("ema")
+def _ema(df: pd.DataFrame, _deps: list, span: int) -> pd.Series:
+    return df["close"].ewm(span=span, adjust=False).mean()
+
+
+@register("ema_bands", deps=lambda tf, length, mult, atr_period: [("ema", tf, length), ("atr", tf, atr_period)])
+def _ema_bands(_df: pd.DataFrame, deps: list, length: int, mult: float, atr_period: int) -> Tuple[pd.Series, pd.Series]:
+    ema, atr_series = deps
+    return ema + mult * atr_series, ema - mult * atr_series
+
+
+@register("ha_body_sum")
+def _ha_body_sum(df: pd.DataFrame, _deps: list, n: int) -> float:
+    # heikin_ashi ile aynı özyineleme, yalnızca ham float dizilerde
+    o, h, l, c = (df[k].to_numpy(dtype=float) for k in ("open", "high", "low", "close"))
+    ha_close = (o + h + l + c) / 4.0
+    ha_open = np.empty_like(ha_close)
+    ha_open[0] = o[0]
+    for j in range(1, len(ha_close)):
+        ha_open[j] = (ha_open[j-1] + ha_close[j-1]) / 2.0
+    return float(np.sign(ha_close[-n:] - ha_open[-n:]).sum())
+
+
+@register("flow")
+def _flow(df: pd.DataFrame, _deps: list, n: int) -> int:
+    return taker_flow_direction(df, n=n)
+
+
+@register("fb_bands")
+def _fb_bands(df: pd.DataFrame, _deps: list, length: int, mult: float) -> pd.DataFrame:
+    return faytterro_bands(df, length, mult)
+
+
+@register("ssl_dir")
+def _ssl_dir(df: pd.DataFrame, _deps: list, length: int) -> int:
+    return int(ssl_channel(df, length=length)["ssl_dir"].iloc[-1])
+
+
+@register("st_dir")
+def _st_dir(df: pd.DataFrame, _deps: list, period: int, mult: float) -> int:
+    return int(supertrend(df, period=period, multiplier=mult)["st_dir"].iloc[-1])
+
+
+@register("ob_zones")
+def _ob_zones(df: pd.DataFrame, _deps: list, lookback: int, atr_period: int, impulse_atr: float) -> Tuple[pd.DataFrame, list]:
+    look_df = df.tail(lookback).copy()
+    return look_df, detect_order_blocks(look_df, atr_period=atr_period, swing_lb=3, impulse_atr_mult=impulse_atr, max_age=lookback)
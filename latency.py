@@ -0,0 +1,146 @@
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+# Sinyal -> dolum yolu aşamaları (sırayla); tüm damgalar time.monotonic() saniyesi.
+# CLOCK_MONOTONIC aynı makinedeki süreçler arasında ortak: worker damgaları da karşılaştırılabilir.
+STAGES = ("close", "recv", "dequeue", "eval", "signal", "send", "ack", "fill")
+
+
+def mono_from_ms(exchange_ms: float, offset_ms: float = 0.0) -> float:
+    """Borsa zaman damgasını (ör. kline `T`) yerel monotonic saate çevir; `offset_ms` = sunucu - yerel."""
+    return time.monotonic() - (time.time() * 1000.0 + offset_ms - exchange_ms) / 1000.0
+
+
+def _pct(sorted_vals: List[float], q: float) -> float:
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+class Trace:
+    __slots__ = ("symbol", "stamps", "client_ids", "started")
+
+    def __init__(self, symbol: str, stamps: Dict[str, float] | None = None) -> None:
+        self.symbol = symbol
+        self.stamps: Dict[str, float] = dict(stamps or {})
+        self.client_ids: List[str] = []
+        self.started = time.monotonic()
+
+    def intervals(self) -> List[Tuple[str, float]]:
+        """Ardışık mevcut aşamalar arası süreler (ms) + uçtan uca `total`."""
+        present = [s for s in STAGES if s in self.stamps]
+        out = [(f"{a}>{b}", (self.stamps[b] - self.stamps[a]) * 1000.0) for a, b in zip(present, present[1:])]
+        if len(present) > 1:
+            out.append(("total", (self.stamps[present[-1]] - self.stamps[present[0]]) * 1000.0))
+        return out
+
+
+class LatencyTracker:
+    """
+    İşlem başına aşama damgaları; emir aşamaları (send/ack/fill) clientOrderId ile izlenir.
+    Tamamlanan izlerin aşama aralıkları genel ve sembol başına kayan pencerelerde tutulur.
+    """
+
+    def __init__(self, window: int = 500, max_open: int = 256, max_age_s: float = 120.0) -> None:
+        self._lock = threading.Lock()
+        self.window = window
+        self.max_open = max_open
+        self.max_age_s = max_age_s
+        self._open: "OrderedDict[int, Trace]" = OrderedDict()
+        self._by_cid: Dict[str, Trace] = {}
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self.completed = 0
+        self.dropped = 0
+
+    def start(self, symbol: str, stamps: Dict[str, float] | None = None) -> Trace:
+        tr = Trace(symbol, stamps)
+        tr.stamps.setdefault("signal", time.monotonic())
+        with self._lock:
+            self._open[id(tr)] = tr
+            self._evict()
+        return tr
+
+    def link(self, trace: Trace | None, client_id: str) -> str:
+        if trace is not None:
+            with self._lock:
+                # Tamamlanmış / düşürülmüş ize yeni id bağlanmaz
+                if id(trace) in self._open:
+                    trace.client_ids.append(client_id)
+                    self._by_cid[client_id] = trace
+        return client_id
+
+    def cid_fn(self, trace: Trace | None, fn: Callable[[str, str], str]) -> Callable[[str, str], str]:
+        """`cid()` sarmalayıcı: üretilen her giriş id'si ize bağlanır."""
+        return lambda tag, symbol: self.link(trace, fn(tag, symbol))
+
+    def mark(self, client_id: str, stage: str, t: float | None = None) -> None:
+        # İlk damga geçerli: yeniden fiyatlama / market tamamlama ilk gönderimi ezmez
+        with self._lock:
+            tr = self._by_cid.get(client_id)
+            if tr is not None:
+                tr.stamps.setdefault(stage, time.monotonic() if t is None else t)
+
+    def on_event(self, evt: Dict[str, Any]) -> None:
+        """consume_user_events'ten: izlenen giriş emrinin ilk dolumu izi tamamlar."""
+        if evt.get("e") != "ORDER_TRADE_UPDATE":
+            return
+        o = evt.get("o", {}) or {}
+        if o.get("X") not in ("PARTIALLY_FILLED", "FILLED"):
+            return
+        with self._lock:
+            tr = self._by_cid.get(str(o.get("c")))
+            if tr is None:
+                return
+            tr.stamps.setdefault("fill", time.monotonic())
+            self._finish(tr)
+
+    def release(self, trace: Trace | None) -> None:
+        """Emir gönderilmeden biten giriş (limit, min notional, hata): iz kaydedilmeden bırakılır."""
+        if trace is None:
+            return
+        with self._lock:
+            if "send" not in trace.stamps and id(trace) in self._open:
+                self._drop(trace)
+
+    def _drop(self, tr: Trace) -> None:
+        self._open.pop(id(tr), None)
+        for c in tr.client_ids:
+            self._by_cid.pop(c, None)
+
+    def _finish(self, tr: Trace) -> None:
+        self._drop(tr)
+        for name, ms in tr.intervals():
+            for key in (("*", name), (tr.symbol, name)):
+                q = self._samples.get(key)
+                if q is None:
+                    q = self._samples[key] = deque(maxlen=self.window)
+                q.append(ms)
+        self.completed += 1
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._open:
+            tr = next(iter(self._open.values()))
+            if len(self._open) <= self.max_open and now - tr.started < self.max_age_s:
+                break
+            self._drop(tr)
+            self.dropped += 1
+
+    # --- okumalar --------------------------------------------------------
+    def percentiles(self, symbol: str = "*") -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            rows = {name: sorted(q) for (s, name), q in self._samples.items() if s == symbol and q}
+        order = [f"{a}>{b}" for a, b in zip(STAGES, STAGES[1:])]
+        out: Dict[str, Dict[str, float]] = {}
+        for name in sorted(rows, key=lambda n: order.index(n) if n in order else len(order)):
+            v = rows[name]
+            out[name] = {"n": len(v), "p50": _pct(v, 0.50), "p90": _pct(v, 0.90), "p99": _pct(v, 0.99), "max": v[-1]}
+        return out
+
+    def lines(self, symbol: str = "*") -> List[str]:
+        return [f"{name}: n={r['n']} p50={r['p50']:.1f} p90={r['p90']:.1f} p99={r['p99']:.1f} max={r['max']:.1f} ms"
+                for name, r in self.percentiles(symbol).items()]
+
+
+LATENCY = LatencyTracker()
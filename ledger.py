@@ -0,0 +1,174 @@
+from __future__ import annotations
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from exchange.binance_client import BinanceClient
+
+# Günlük PnL'e giren gelir türleri (TRANSFER vb. bakiye hareketleri hariç)
+PNL_KINDS = ("REALIZED_PNL", "COMMISSION", "FUNDING_FEE")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fills(
+    symbol TEXT NOT NULL, trade_id INTEGER NOT NULL, order_id INTEGER, client_id TEXT, side TEXT,
+    qty REAL, price REAL, commission REAL, commission_asset TEXT, realized REAL, maker INTEGER, time_ms INTEGER,
+    PRIMARY KEY(symbol, trade_id)
+);
+CREATE INDEX IF NOT EXISTS fills_time ON fills(time_ms);
+CREATE TABLE IF NOT EXISTS pnl(
+    key TEXT PRIMARY KEY, symbol TEXT, kind TEXT NOT NULL, amount REAL NOT NULL, asset TEXT, time_ms INTEGER NOT NULL, source TEXT
+);
+CREATE INDEX IF NOT EXISTS pnl_time ON pnl(time_ms);
+CREATE INDEX IF NOT EXISTS pnl_kind_time ON pnl(kind, time_ms);
+CREATE TABLE IF NOT EXISTS meta(k TEXT PRIMARY KEY, v TEXT);
+"""
+
+
+def _f(x: Any) -> float:
+    try:
+        return float(x or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _utc_midnight_ms() -> int:
+    return int(datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).timestamp() * 1000)
+
+
+def _pnl_key(kind: str, symbol: str, trade_id: Any, tran_id: Any = None) -> str:
+    # REALIZED_PNL / COMMISSION: user-data olayı ile REST gelir satırı aynı (sembol, tradeId) anahtarında birleşir
+    if trade_id not in (None, "", 0, "0"):
+        return f"{kind}:{symbol}:{trade_id}"
+    return f"{kind}:tran:{tran_id}"
+
+
+class Ledger:
+    """
+    Yerel SQLite işlem defteri: dolumlar (user-data TRADE olayları) ve gerçekleşen PnL /
+    komisyon / funding satırları. REST gelir geçmişi yalnızca son senkrondan bu yana
+    artımlı çekilir; olaylarla gelen satırlar aynı anahtarda tekilleşir. Günlük PnL ve kayıp
+    serisi indeksli yerel sorgulardır. Bağlantı ilk kullanımda açılır (WS thread'i dahil
+    her thread'den kilit altında kullanılır).
+    """
+
+    def __init__(self, path: str = "ledger.db", sync_interval_s: float = 300.0, bootstrap_days: int = 7) -> None:
+        self.path = path
+        self.sync_interval_s = sync_interval_s
+        self.bootstrap_days = bootstrap_days
+        self._lock = threading.RLock()
+        self._db: sqlite3.Connection | None = None
+        self._last_sync = 0.0
+        self.stats = {"synced_rows": 0, "syncs": 0, "event_rows": 0}
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    def _meta(self, k: str, default: str | None = None) -> str | None:
+        row = self._conn().execute("SELECT v FROM meta WHERE k=?", (k,)).fetchone()
+        return row[0] if row else default
+
+    # --- yazımlar ----------------------------------------------------------
+    def apply(self, evt: Dict[str, Any]) -> None:
+        """User-data listener: TRADE yürütmelerini dolum + PnL/komisyon satırı olarak yazar."""
+        if evt.get("e") != "ORDER_TRADE_UPDATE":
+            return
+        o = evt.get("o", {}) or {}
+        if o.get("x") != "TRADE":
+            return
+        symbol, tid = o.get("s"), o.get("t")
+        t_ms = int(o.get("T") or evt.get("T") or evt.get("E") or time.time() * 1000)
+        rp, fee = _f(o.get("rp")), _f(o.get("n"))
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.execute("BEGIN")
+                db.execute(
+                    "INSERT OR IGNORE INTO fills VALUES(?,?,?,?,?,?,?,?,?,?,?,?)",
+                    (symbol, int(tid or 0), int(o.get("i") or 0), o.get("c"), o.get("S"), _f(o.get("l")), _f(o.get("L")), fee, o.get("N"), rp, int(bool(o.get("m"))), t_ms),
+                )
+                if abs(rp) > 1e-12:
+                    db.execute("INSERT OR IGNORE INTO pnl VALUES(?,?,?,?,?,?,?)", (_pnl_key("REALIZED_PNL", symbol, tid), symbol, "REALIZED_PNL", rp, "USDT", t_ms, "ws"))
+                if fee:
+                    db.execute("INSERT OR IGNORE INTO pnl VALUES(?,?,?,?,?,?,?)", (_pnl_key("COMMISSION", symbol, tid), symbol, "COMMISSION", -fee, o.get("N"), t_ms, "ws"))
+            self.stats["event_rows"] += 1
+
+    def sync(self, client: BinanceClient, force: bool = False) -> int:
+        """Son senkron zamanından (dahil) itibaren gelir geçmişini sayfa sayfa çek; yeni satır sayısını döndürür."""
+        now = time.monotonic()
+        if not force and self._last_sync and now - self._last_sync < self.sync_interval_s:
+            return 0
+        with self._lock:
+            start = int(self._meta("income_ms") or (_utc_midnight_ms() - self.bootstrap_days * 86_400_000))
+        added = 0
+        while True:
+            rows = client.income_history(start_time_ms=start, limit=1000) or []
+            new = [r for r in rows if r.get("incomeType") in PNL_KINDS]
+            with self._lock:
+                db = self._conn()
+                last = max((int(r.get("time") or 0) for r in rows), default=start)
+                with db:
+                    db.execute("BEGIN")
+                    before = db.total_changes
+                    db.executemany(
+                        "INSERT OR IGNORE INTO pnl VALUES(?,?,?,?,?,?,?)",
+                        [(_pnl_key(r["incomeType"], r.get("symbol", ""), r.get("tradeId"), r.get("tranId")), r.get("symbol", ""), r["incomeType"], _f(r.get("income")), r.get("asset"), int(r.get("time") or 0), "rest") for r in new],
+                    )
+                    added += db.total_changes - before
+                    db.execute("INSERT OR REPLACE INTO meta VALUES('income_ms', ?)", (str(max(last, start)),))
+            # Sayfa doluysa devam; aynı ms'de 1000+ satır (ilerleme yok) durumunda kes
+            if len(rows) < 1000 or last <= start:
+                break
+            start = last
+        self._last_sync = now
+        self.stats["syncs"] += 1
+        self.stats["synced_rows"] += added
+        return added
+
+    # --- sorgular -----------------------------------------------------------
+    def pnl_between(self, start_ms: int, end_ms: int | None = None) -> Dict[str, float]:
+        end_ms = end_ms if end_ms is not None else 2 ** 62
+        with self._lock:
+            rows = self._conn().execute("SELECT kind, SUM(amount) FROM pnl WHERE time_ms >= ? AND time_ms < ? GROUP BY kind", (start_ms, end_ms)).fetchall()
+        out = {k: 0.0 for k in PNL_KINDS}
+        out.update({k: float(v or 0.0) for k, v in rows})
+        out["net"] = sum(out[k] for k in PNL_KINDS)
+        return out
+
+    def realized_pnl_today(self) -> float:
+        return self.pnl_between(_utc_midnight_ms())["net"]
+
+    def recent_realized(self, n: int = 5) -> List[float]:
+        with self._lock:
+            rows = self._conn().execute("SELECT amount FROM pnl WHERE kind='REALIZED_PNL' AND amount != 0 ORDER BY time_ms DESC, key DESC LIMIT ?", (n,)).fetchall()
+        return [float(r[0]) for r in reversed(rows)]
+
+    def losing_streak(self, window: int = 5) -> int:
+        streak = 0
+        for v in reversed(self.recent_realized(window)):
+            if v < 0:
+                streak += 1
+            else:
+                break
+        return streak
+
+    def day_summary(self, start_ms: int, end_ms: int) -> Dict[str, float]:
+        out = self.pnl_between(start_ms, end_ms)
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT COUNT(*), SUM(realized > 0), SUM(realized < 0) FROM fills WHERE time_ms >= ? AND time_ms < ?", (start_ms, end_ms)
+            ).fetchone()
+        out["fills"], out["wins"], out["losses"] = int(row[0] or 0), int(row[1] or 0), int(row[2] or 0)
+        return out
+
+
+def summary_text(s: Dict[str, float]) -> str:
+    return (f"📊 Günlük PnL: {s['net']:.2f} USDT (gerçekleşen {s['REALIZED_PNL']:.2f}, komisyon {s['COMMISSION']:.2f}, "
+            f"funding {s['FUNDING_FEE']:.2f}) | {s['fills']} dolum, {s['wins']} kârlı / {s['losses']} zararlı kapanış")
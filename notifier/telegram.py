@@ -1,24 +1,183 @@
 from __future__ import annotations
-import asyncio
+import atexit
+import html as _html
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Tuple
+
 import requests
 
+
 class TelegramNotifier:
-    def __init__(self, bot_token: str, chat_id: str) -> None:
+    """
+    Kuyruklu Telegram gönderici. `send` hiç beklemez (olay döngüsü ve WS thread'lerinden
+    güvenle çağrılır): mesaj sınırlı kuyruğa girer, tek arka plan thread'i tek keep-alive
+    oturumla gönderir. Sohbet hız sınırı (token kovası, 429'da `retry_after`) beklenirken
+    biriken mesajlar tek özet mesajda birleşir; aynı `key` ile bekleyen mesaj yenisiyle
+    değişir (ör. ardışık SL trail). Kuyruk dolarsa en eski mesaj atılır, sayısı bir sonraki
+    gönderimde bildirilir. Mesajlar düz metindir ve özete kaçışlanarak girer (ham hata metni
+    tüm özeti bozmasın); biçimli mesaj `html=True` ile gönderilir. Telegram yine de HTML'i
+    reddederse parça düz metin olarak yeniden gönderilir.
+    """
+
+    MAX_LEN = 4096
+
+    def __init__(self, bot_token: str, chat_id: str, rate_per_s: float = 1.0, burst: int = 3, max_queue: int = 200, digest_ms: float = 500.0) -> None:
         self.base = f"https://api.telegram.org/bot{bot_token}"
         self.chat_id = chat_id
+        self.rate_per_s = max(rate_per_s, 0.01)
+        self.burst = max(1, burst)
+        self.max_queue = max(1, max_queue)
+        self.digest_s = digest_ms / 1000.0
+        self._session = requests.Session()
+        self._cond = threading.Condition()
+        self._pending: "OrderedDict[Any, List[Any]]" = OrderedDict()   # key -> [text, tekrar sayısı, html]
+        self._seq = itertools.count()
+        self._dropped = 0
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._blocked_until = 0.0
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        self.stats = {"queued": 0, "posts": 0, "merged": 0, "coalesced": 0, "dropped": 0, "errors": 0, "rate_limited": 0}
+
+    def send(self, text: str, disable_web_page_preview: bool = True, key: str | None = None, html: bool = False) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self.stats["queued"] += 1
+            if key is not None and key in self._pending:
+                # Sıradaki yerini korur, en güncel metinle değişir
+                self._pending[key][0] = text
+                self._pending[key][1] += 1
+                self._pending[key][2] = html
+                self.stats["coalesced"] += 1
+            else:
+                if len(self._pending) >= self.max_queue:
+                    self._pending.popitem(last=False)
+                    self._dropped += 1
+                    self.stats["dropped"] += 1
+                self._pending[key if key is not None else next(self._seq)] = [text, 1, html]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="telegram-sender", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+            self._cond.notify()
+
+    async def send_async(self, text: str, disable_web_page_preview: bool = True, key: str | None = None, html: bool = False) -> None:
+        # Yalnızca kuyruğa ekler; eski imza korunur
+        self.send(text, disable_web_page_preview, key, html)
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
 
-    def send(self, text: str, disable_web_page_preview: bool = True) -> None:
-        url = f"{self.base}/sendMessage"
+    def close(self, timeout: float = 5.0) -> None:
+        """Bekleyenleri göndermeye çalış ve gönderici thread'i durdur."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    # --- gönderici thread ------------------------------------------------
+    def _rate_wait(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._stamp) * self.rate_per_s)
+        self._stamp = now
+        return max(self._blocked_until - now, (1.0 - self._tokens) / self.rate_per_s, 0.0)
+
+    @staticmethod
+    def _render(items: List[Tuple[str, bool]], html: bool) -> str:
+        return "\n".join(t if h or not html else _html.escape(t, quote=False) for t, h in items)
+
+    def _digest(self, batch: List[List[Any]], dropped: int) -> List[List[Tuple[str, bool]]]:
+        """Satırları 4096 sınırına göre parçalara böl; uzunluk HTML (kaçışlı) hâline göre ölçülür."""
+        items: List[Tuple[str, bool]] = [(f"⚠️ Telegram kuyruğu doldu, {dropped} mesaj atlandı", False)] if dropped else []
+        items += [(f"{text} (×{n})" if n > 1 else text, h) for text, n, h in batch]
+        chunks: List[List[Tuple[str, bool]]] = []
+        cur: List[Tuple[str, bool]] = []
+        size = 0
+        for text, h in items:
+            while len(self._render([(text, h)], True)) > self.MAX_LEN:
+                text = text[: len(text) - max(1, len(self._render([(text, h)], True)) - self.MAX_LEN)]
+            n = len(self._render([(text, h)], True))
+            if cur and size + 1 + n > self.MAX_LEN:
+                chunks.append(cur)
+                cur, size = [], 0
+            size += n + (1 if cur else 0)
+            cur.append((text, h))
+        if cur:
+            chunks.append(cur)
+        return chunks
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                closing = self._closed
+            if not closing:
+                # Kısa pencere + hız sınırı beklemesi: bu sürede gelenler aynı özete girer
+                time.sleep(max(self.digest_s, self._rate_wait()))
+            with self._cond:
+                batch = list(self._pending.values())
+                self._pending.clear()
+                dropped, self._dropped = self._dropped, 0
+            if len(batch) > 1:
+                self.stats["merged"] += len(batch) - 1
+            chunks = self._digest(batch, dropped)
+            for i, chunk in enumerate(chunks):
+                if not closing:
+                    time.sleep(self._rate_wait())
+                res = self._post(self._render(chunk, True), html=True)
+                if res == "parse":
+                    # HTML reddedildi (ör. biçimli mesajda bozuk etiket): özetin geri kalanı kaybolmasın
+                    self.stats["errors"] += 1
+                    if not closing:
+                        time.sleep(self._rate_wait())
+                    res = self._post(self._render(chunk, False), html=False)
+                if res == "retry":
+                    # 429: kalan satırlar öne geri konur, bekleme `_blocked_until` ile uygulanır
+                    with self._cond:
+                        for text, h in reversed([it for rest in chunks[i:] for it in rest]):
+                            k = next(self._seq)
+                            self._pending[k] = [text, 1, h]
+                            self._pending.move_to_end(k, last=False)
+                    break
+
+    def _post(self, text: str, html: bool = True) -> str:
+        """"ok" | "retry" (429) | "parse" (HTML reddi, düz metinle tekrar) | "error"."""
+        self._tokens -= 1.0
+        body: dict = {"chat_id": self.chat_id, "text": text, "disable_web_page_preview": True}
+        if html:
+            body["parse_mode"] = "HTML"
         try:
-            requests.post(url, json={
-                "chat_id": self.chat_id,
-                "text": text,
-                "parse_mode": "HTML",
-                "disable_web_page_preview": disable_web_page_preview,
-            }, timeout=10)
+            r = self._session.post(f"{self.base}/sendMessage", json=body, timeout=10)
+            self.stats["posts"] += 1
+            if r.status_code == 429:
+                self.stats["rate_limited"] += 1
+                try:
+                    retry = float(r.json().get("parameters", {}).get("retry_after", 1))
+                except Exception:
+                    retry = 1.0
+                self._blocked_until = time.monotonic() + retry
+                return "error" if self._closed else "retry"   # kapanışta tekrar denenmez
+            if r.status_code == 400 and html:
+                try:
+                    desc = str(r.json().get("description", ""))
+                except Exception:
+                    desc = ""
+                if "parse" in desc.lower() or "entit" in desc.lower():
+                    return "parse"
+            if r.status_code >= 400:
+                self.stats["errors"] += 1
+                return "error"
         except Exception:
-            pass
-
-    async def send_async(self, text: str, disable_web_page_preview: bool = True) -> None:
-        # Offload blocking HTTP call to a background thread to avoid blocking the event loop
-        await asyncio.to_thread(self.send, text, disable_web_page_preview)
+            self.stats["errors"] += 1
+            return "error"
+        return "ok"
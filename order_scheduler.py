@@ -0,0 +1,146 @@
+from __future__ import annotations
+import asyncio
+import itertools
+from typing import Any, Callable, Dict, List
+
+from exchange.rate_limit import RateLimiter
+
+# Öncelik sınıfları (küçük olan önce): acil kapatma > stop yerleştirme/taşıma > TP > yeni giriş
+FLATTEN, STOP, TP, ENTRY = 0, 1, 2, 3
+PRIORITY_NAMES = {FLATTEN: "flatten", STOP: "stop", TP: "tp", ENTRY: "entry"}
+
+
+class _Job:
+    __slots__ = ("prio", "seq", "symbol", "fn", "args", "kwargs", "key", "weight", "orders", "future")
+
+    def __init__(self, prio: int, seq: int, symbol: str, fn: Callable[..., Any], args: tuple, kwargs: dict, key: str | None, weight: float, orders: float, future: asyncio.Future) -> None:
+        self.prio = prio
+        self.seq = seq
+        self.symbol = symbol
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.weight = weight
+        self.orders = orders
+        self.future = future
+
+
+def _consume(fut: asyncio.Future) -> None:
+    # Beklenmeyen (fire-and-forget) işlerin hatası "never retrieved" uyarısı üretmesin
+    if not fut.cancelled():
+        fut.exception()
+
+
+class OrderScheduler:
+    """
+    Giden emir kuyruğu. Her iş bloklayan bir istemci çağrısıdır ve thread'de çalışır.
+    - Öncelik: FLATTEN > STOP > TP > ENTRY; aynı öncelikte gönderim sırası.
+    - Sembol sırası: bir sembolün aynı anda tek işi uçuşta olur (iptal + yeni SL yarışmaz).
+    - Birleştirme: aynı `coalesce` anahtarlı, henüz başlamamış iş yenisiyle değiştirilir;
+      eskisinin future'ı iptal edilir (ör. ardışık SL taşımalarında yalnızca sonuncusu gider).
+    - Hız: RateLimiter kovasına göre beklenir; yeni emir açan ENTRY işleri kovanın
+      `entry_reserve` oranını koruma emirlerine bırakır.
+    """
+
+    def __init__(self, limiter: RateLimiter | None = None, workers: int = 4, entry_reserve: float = 0.25) -> None:
+        self.limiter = limiter
+        self.workers = max(1, workers)
+        self.entry_reserve = entry_reserve
+        self._jobs: List[_Job] = []
+        self._by_key: Dict[str, _Job] = {}
+        self._busy: set[str] = set()
+        self._seq = itertools.count()
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.stats = {"submitted": 0, "done": 0, "failed": 0, "coalesced": 0, "paced": 0, "dropped": 0}
+
+    def _ensure(self) -> None:
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+
+    def submit(self, prio: int, symbol: str, fn: Callable[..., Any], *args: Any, coalesce: str | None = None, weight: float = 1.0, orders: float = 1.0, **kwargs: Any) -> asyncio.Future:
+        """Olay döngüsünden çağrılır; sonucu (veya hatayı) taşıyan future döner."""
+        self._ensure()
+        fut = asyncio.get_running_loop().create_future()
+        fut.add_done_callback(_consume)
+        self.stats["submitted"] += 1
+        old = self._by_key.get(coalesce) if coalesce else None
+        if old is not None:
+            # Sıradaki yerini korur, içeriği en güncel istekle değişir
+            old.future.cancel()
+            old.fn, old.args, old.kwargs, old.future = fn, args, kwargs, fut
+            old.weight, old.orders = weight, orders
+            old.prio = min(old.prio, prio)
+            self.stats["coalesced"] += 1
+        else:
+            job = _Job(prio, next(self._seq), symbol, fn, args, kwargs, coalesce, weight, orders, fut)
+            self._jobs.append(job)
+            if coalesce:
+                self._by_key[coalesce] = job
+        self._wake.set()
+        return fut
+
+    async def run(self, prio: int, symbol: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await self.submit(prio, symbol, fn, *args, **kwargs)
+
+    def _next(self) -> _Job | None:
+        ready = [j for j in self._jobs if j.symbol not in self._busy]
+        return min(ready, key=lambda j: (j.prio, j.seq)) if ready else None
+
+    async def _dispatch(self) -> None:
+        while True:
+            job = self._next() if len(self._busy) < self.workers else None
+            if job is None:
+                await self._wake.wait()
+                self._wake.clear()
+                continue
+            if self.limiter is not None:
+                reserve = self.entry_reserve if job.prio == ENTRY and job.orders else 0.0
+                wait = self.limiter.delay(job.weight, job.orders, reserve)
+                if wait > 0:
+                    # Beklerken daha yüksek öncelikli iş gelirse onu seç
+                    self.stats["paced"] += 1
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=min(wait, 1.0))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                self.limiter.take(job.weight, job.orders)
+            self._jobs.remove(job)
+            if job.key:
+                self._by_key.pop(job.key, None)
+            self._busy.add(job.symbol)
+            asyncio.get_running_loop().create_task(self._exec(job))
+
+    async def _exec(self, job: _Job) -> None:
+        try:
+            res = await asyncio.to_thread(job.fn, *job.args, **job.kwargs)
+            if not job.future.done():
+                job.future.set_result(res)
+            self.stats["done"] += 1
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+            self.stats["failed"] += 1
+        finally:
+            self._busy.discard(job.symbol)
+            self._wake.set()
+
+    def cancel(self, key: str) -> bool:
+        """Henüz başlamamış `coalesce` anahtarlı işi kuyruktan çıkar (ör. pozisyon kapandı)."""
+        job = self._by_key.pop(key, None)
+        if job is None:
+            return False
+        self._jobs.remove(job)
+        job.future.cancel()
+        self.stats["dropped"] += 1
+        return True
+
+    def depth(self) -> Dict[str, int]:
+        out = {name: 0 for name in PRIORITY_NAMES.values()}
+        for j in self._jobs:
+            out[PRIORITY_NAMES.get(j.prio, str(j.prio))] += 1
+        return out
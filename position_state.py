@@ -0,0 +1,231 @@
+from __future__ import annotations
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+# cid(): f"{symbol}-{tag}-{ms}"
+ENTRY_TAGS = ("MKT", "MAKER")
+STOP_TAGS = ("SL", "SLBE", "SLTR")
+EXIT_TAGS = STOP_TAGS + ("TP1", "TP2", "TRAIL", "FLAT")
+OPEN_STATUSES = ("NEW", "PARTIALLY_FILLED")
+EPS = 1e-12
+
+
+def parse_cid(client_id: str | None) -> Tuple[str, str] | None:
+    """`cid()` ile üretilmiş clientOrderId'den (symbol, tag); tanınmayan id için None."""
+    if not client_id:
+        return None
+    parts = client_id.rsplit("-", 2)
+    if len(parts) != 3 or not parts[2].isdigit():
+        return None
+    return parts[0], parts[1].upper()
+
+
+def _f(x: Any) -> float:
+    try:
+        return float(x or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+@dataclass
+class Leg:
+    tag: str
+    client_id: str
+    side: str
+    type: str
+    order_id: int | None = None
+    orig_qty: float = 0.0
+    filled_qty: float = 0.0
+    avg_price: float = 0.0
+    stop_price: float = 0.0
+    status: str = "NEW"
+    updated_ms: int = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.status in OPEN_STATUSES
+
+    @property
+    def remaining(self) -> float:
+        return max(self.orig_qty - self.filled_qty, 0.0)
+
+
+@dataclass
+class Position:
+    symbol: str
+    side: str                      # giriş yönü: BUY (long) | SELL (short)
+    size: float = 0.0              # açık miktar (mutlak)
+    entry_price: float = 0.0
+    realized: float = 0.0
+    phase: str = "PENDING"         # PENDING -> OPEN -> TP1 -> CLOSED
+    sized: bool = True             # giriş miktarı görüldü (dolum olayı veya REST tohumu)
+    legs: Dict[str, Leg] = field(default_factory=dict)   # clientOrderId -> Leg
+
+    def legs_by_tag(self, tag: str) -> List[Leg]:
+        return [lg for lg in self.legs.values() if lg.tag == tag]
+
+    def open_legs(self) -> List[Leg]:
+        return [lg for lg in self.legs.values() if lg.is_open]
+
+    def stop_leg(self) -> Leg | None:
+        """Açık koruyucu stop (SL / SLBE / SLTR), en son güncellenen."""
+        stops = [lg for lg in self.open_legs() if lg.tag in STOP_TAGS]
+        return max(stops, key=lambda lg: lg.updated_ms) if stops else None
+
+
+class Transition(NamedTuple):
+    symbol: str
+    tag: str
+    event: str          # FILLED | PARTIAL | CANCELED | EXPIRED | CLOSED
+    qty: float
+    price: float
+
+
+class PositionBook:
+    """
+    Pozisyon başına emir bacakları, `cid()` etiketine göre (MKT/MAKER/SL/TP1/TP2/SLBE/SLTR/
+    TRAIL/FLAT) ORDER_TRADE_UPDATE olaylarından artımlı güncellenir; kısmi dolumlar `z`
+    (kümülatif) farkıyla uygulanır. "Ne açık, hangi miktarda" sorusu REST'siz yanıtlanır.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.positions: Dict[str, Position] = {}
+
+    def apply(self, evt: Dict[str, Any]) -> List[Transition]:
+        if evt.get("e") != "ORDER_TRADE_UPDATE":
+            return []
+        o = evt.get("o", {}) or {}
+        parsed = parse_cid(o.get("c"))
+        if parsed is None:
+            return []
+        symbol = o.get("s") or parsed[0]
+        tag = parsed[1]
+        status = o.get("X", "")
+        out: List[Transition] = []
+        with self._lock:
+            pos = self.positions.get(symbol)
+            if pos is None:
+                # Kapanmış pozisyonun artık bacak olayları (CANCELED/EXPIRED) yeni pozisyon açmaz
+                if tag in ENTRY_TAGS:
+                    pos = Position(symbol, o.get("S", "BUY"))
+                elif status == "NEW" and tag in EXIT_TAGS:
+                    # Giriş dolumu kaçırılmış (ör. user stream kesintisi): miktar bilinmiyor, kapanış çıkarılmaz
+                    pos = Position(symbol, "SELL" if o.get("S") == "BUY" else "BUY", phase="OPEN", sized=False)
+                else:
+                    return []
+                self.positions[symbol] = pos
+            cid_ = str(o.get("c"))
+            leg = pos.legs.get(cid_)
+            if leg is None:
+                leg = Leg(tag=tag, client_id=cid_, side=o.get("S", ""), type=o.get("ot") or o.get("o", ""))
+                pos.legs[cid_] = leg
+            leg.order_id = int(o["i"]) if o.get("i") is not None else leg.order_id
+            leg.orig_qty = _f(o.get("q")) or leg.orig_qty
+            leg.stop_price = _f(o.get("sp")) or leg.stop_price
+            leg.updated_ms = int(o.get("T") or evt.get("E") or time.time() * 1000)
+            filled = _f(o.get("z"))
+            delta = filled - leg.filled_qty
+            if delta > EPS:
+                px = _f(o.get("L")) or _f(o.get("ap"))
+                leg.avg_price = _f(o.get("ap")) or px
+                leg.filled_qty = filled
+                if tag in ENTRY_TAGS:
+                    new_size = pos.size + delta
+                    pos.entry_price = (pos.entry_price * pos.size + px * delta) / new_size
+                    pos.size = new_size
+                    pos.sized = True
+                    if pos.phase == "PENDING":
+                        pos.phase = "OPEN"
+                else:
+                    pos.size = max(pos.size - delta, 0.0)
+                    pos.realized += _f(o.get("rp"))
+                    if tag == "TP1" and status == "FILLED" and pos.phase == "OPEN":
+                        pos.phase = "TP1"
+                out.append(Transition(symbol, tag, "FILLED" if status == "FILLED" else "PARTIAL", delta, px))
+            elif status in ("CANCELED", "EXPIRED") and leg.status in OPEN_STATUSES:
+                out.append(Transition(symbol, tag, status, 0.0, 0.0))
+            leg.status = status or leg.status
+            if tag in ENTRY_TAGS and pos.phase == "PENDING" and not any(lg.is_open for lg in pos.legs.values() if lg.tag in ENTRY_TAGS):
+                # Hiç dolmadan düşen giriş (ör. GTX reddi): pozisyon oluşmadı
+                self.positions.pop(symbol, None)
+            elif tag not in ENTRY_TAGS and pos.sized and pos.size <= EPS and pos.phase != "PENDING" and delta > EPS:
+                pos.phase = "CLOSED"
+                self.positions.pop(symbol, None)
+                out.append(Transition(symbol, tag, "CLOSED", 0.0, 0.0))
+        return out
+
+    def seed(self, symbol: str, side: str, size: float, entry_price: float, open_orders: List[Dict[str, Any]] | None = None) -> Position:
+        """REST görüntüsünden (ör. açılış mutabakatı) pozisyon ve açık bacakları yükle."""
+        pos = Position(symbol, side, size=abs(size), entry_price=entry_price, phase="OPEN" if abs(size) > EPS else "PENDING")
+        for o in open_orders or []:
+            parsed = parse_cid(o.get("clientOrderId"))
+            if parsed is None:
+                continue
+            cid_ = str(o["clientOrderId"])
+            pos.legs[cid_] = Leg(
+                tag=parsed[1], client_id=cid_, side=o.get("side", ""), type=o.get("type") or o.get("origType", ""),
+                order_id=int(o["orderId"]) if o.get("orderId") is not None else None,
+                orig_qty=_f(o.get("origQty")), filled_qty=_f(o.get("executedQty")), stop_price=_f(o.get("stopPrice")),
+                status=o.get("status", "NEW"), updated_ms=int(o.get("updateTime") or 0),
+            )
+        if pos.legs and not pos.legs_by_tag("TP1") and pos.legs_by_tag("TP2"):
+            # TP1 bacağı yok ama TP2 açık: TP1 daha önce dolmuş
+            pos.phase = "TP1"
+        with self._lock:
+            self.positions[symbol] = pos
+        return pos
+
+    def reseed(self, risks: List[Dict[str, Any]], orders: List[Dict[str, Any]]) -> None:
+        """Kesinti sonrası tüm defteri REST görüntüsüyle yenile; sürmekte olan girişler (PENDING) korunur."""
+        by_symbol: Dict[str, List[Dict[str, Any]]] = {}
+        for o in orders:
+            by_symbol.setdefault(o.get("symbol", ""), []).append(o)
+        live = set()
+        for p in risks:
+            amt = _f(p.get("positionAmt"))
+            if abs(amt) <= EPS:
+                continue
+            live.add(p["symbol"])
+            self.seed(p["symbol"], "BUY" if amt > 0 else "SELL", amt, _f(p.get("entryPrice")), by_symbol.get(p["symbol"]))
+        with self._lock:
+            for symbol in [s for s, pos in self.positions.items() if s not in live and pos.phase != "PENDING"]:
+                self.positions.pop(symbol, None)
+
+    def drop(self, symbol: str) -> None:
+        """Borsa pozisyonu düz bildirdi (ACCOUNT_UPDATE): sürmekte olan giriş dışında kaydı sil."""
+        with self._lock:
+            pos = self.positions.get(symbol)
+            if pos is not None and pos.phase != "PENDING":
+                self.positions.pop(symbol, None)
+
+    # --- okumalar --------------------------------------------------------
+    def get(self, symbol: str) -> Position | None:
+        with self._lock:
+            return self.positions.get(symbol)
+
+    def open_size(self, symbol: str) -> float:
+        with self._lock:
+            pos = self.positions.get(symbol)
+            return pos.size if pos else 0.0
+
+    def is_flat(self, symbol: str) -> bool:
+        # Miktarı bilinmeyen (girişi görülmemiş) pozisyon düz sayılmaz
+        with self._lock:
+            pos = self.positions.get(symbol)
+            return pos is None or (pos.sized and pos.size <= EPS)
+
+    def open_legs(self, symbol: str) -> List[Leg]:
+        with self._lock:
+            pos = self.positions.get(symbol)
+            return list(pos.open_legs()) if pos else []
+
+    def summary(self) -> List[str]:
+        with self._lock:
+            rows = []
+            for s, p in sorted(self.positions.items()):
+                legs = ",".join(f"{lg.tag}:{lg.remaining:g}" if lg.orig_qty else lg.tag for lg in p.open_legs())
+                rows.append(f"{s} {p.side} {p.size:g}@{p.entry_price:g} [{p.phase}] {legs}")
+            return rows
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import itertools, threading, time
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+from binance.websocket.um_futures.websocket_client import UMFuturesWebsocketClient
+
+from ws_manager import backoff_delay, close_ws, json_loads
+
+PriceListener = Callable[[str, float], None]
+
+
+class MarkPriceFeed:
+    """
+    Yalnızca açık pozisyon sembolleri için gerçek zamanlı fiyat akışı
+    (`<sym>@markPrice@1s` veya `<sym>@bookTicker` orta fiyatı). Sembol kümesi
+    değiştikçe tek combined-stream bağlantısında SUBSCRIBE/UNSUBSCRIBE gönderilir.
+    Listener'lar WS thread'inde, sembol başına en fazla `debounce_ms` aralıkla çağrılır.
+    """
+
+    def __init__(self, stream_url: str = "wss://fstream.binance.com", source: str = "markPrice", debounce_ms: float = 250.0, listeners: List[PriceListener] | None = None) -> None:
+        self.stream_url = stream_url
+        self.source = source
+        self.debounce_s = debounce_ms / 1000.0
+        self.listeners: List[PriceListener] = list(listeners or [])
+        self.ws: UMFuturesWebsocketClient | None = None
+        self.symbols: Set[str] = set()
+        self.prices: Dict[str, Tuple[float, float]] = {}
+        self._last_fire: Dict[str, float] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.ticks = 0
+        self.last_msg = time.monotonic()
+        self.dead = False
+        self._attempts = 0
+        self._next_retry = 0.0
+        self.reconnects = 0
+
+    def _stream(self, symbol: str) -> str:
+        suffix = "bookTicker" if self.source == "bookTicker" else "markPrice@1s"
+        return f"{symbol.lower()}@{suffix}"
+
+    def _on_msg(self, _, msg: str) -> None:
+        self.last_msg = time.monotonic()
+        try:
+            data = json_loads(msg)
+            data = data.get("data", data)
+            symbol = data.get("s")
+            if not symbol:
+                return
+            if data.get("e") == "markPriceUpdate":
+                px = float(data["p"])
+            elif "b" in data and "a" in data:
+                px = (float(data["b"]) + float(data["a"])) / 2.0
+            else:
+                return
+        except Exception:
+            return
+        now = time.monotonic()
+        self.prices[symbol] = (px, now)
+        self.ticks += 1
+        if symbol not in self.symbols or now - self._last_fire.get(symbol, 0.0) < self.debounce_s:
+            return
+        self._last_fire[symbol] = now
+        for fn in self.listeners:
+            try:
+                fn(symbol, px)
+            except Exception:
+                pass
+
+    def set_symbols(self, symbols: Iterable[str]) -> None:
+        """Abonelikleri verilen sembol kümesine eşitle (engelleyici; ilk çağrıda bağlanır)."""
+        wanted = {s.upper() for s in symbols}
+        with self._lock:
+            current = self.symbols if self.ws is not None else set()
+            add = sorted(wanted - current)
+            drop = sorted(current - wanted)
+            if not add and not drop:
+                self.symbols = wanted
+                return
+            if self.ws is None:
+                self.ws = UMFuturesWebsocketClient(stream_url=self.stream_url, on_message=self._on_msg, on_close=self._on_dead, on_error=self._on_dead, is_combined=True)
+                self.dead = False
+                self.last_msg = time.monotonic()
+            if drop:
+                self.ws.unsubscribe([self._stream(s) for s in drop], id=next(self._ids))
+                for s in drop:
+                    self.prices.pop(s, None)
+                    self._last_fire.pop(s, None)
+            if add:
+                self.ws.subscribe([self._stream(s) for s in add], id=next(self._ids))
+            self.symbols = wanted
+
+    def _on_dead(self, *_) -> None:
+        self.dead = True
+
+    def check(self, stale_s: float = 5.0) -> bool:
+        """Watchdog: abonelik varken ölü/sessiz bağlantıyı jitter'lı geri çekilmeyle yeniden kur."""
+        now = time.monotonic()
+        if not self.symbols or now < self._next_retry:
+            return False
+        if not self.dead and now - self.last_msg < stale_s:
+            return False
+        wanted = set(self.symbols)
+        self.close()
+        try:
+            self.set_symbols(wanted)
+        except Exception:
+            self.symbols = wanted
+            self.ws = None
+            self._next_retry = now + backoff_delay(self._attempts)
+            self._attempts += 1
+            return False
+        self._attempts = 0
+        self.reconnects += 1
+        return True
+
+    def price(self, symbol: str, max_age_s: float = 5.0) -> float | None:
+        """Son fiyat; akış bayatsa None (çağıran REST'e düşebilir)."""
+        row = self.prices.get(symbol.upper())
+        if row is None or time.monotonic() - row[1] > max_age_s:
+            return None
+        return row[0]
+
+    def close(self) -> None:
+        try:
+            if self.ws is not None:
+                close_ws(self.ws)
+        except Exception:
+            pass
+        self.ws = None
+        self.symbols = set()
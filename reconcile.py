@@ -0,0 +1,226 @@
+from __future__ import annotations
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+from exchange.binance_client import BinanceClient
+from order_scheduler import FLATTEN, STOP, TP, OrderScheduler
+from position_state import ENTRY_TAGS, EPS, STOP_TAGS, PositionBook, parse_cid
+from state_store import StateJournal
+
+
+def _f(x: Any) -> float:
+    try:
+        return float(x or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Repair(NamedTuple):
+    prio: int
+    symbol: str
+    note: str
+    fn: Callable[..., Any]
+    kwargs: Dict[str, Any]
+    orders: float = 1.0
+    on_done: Callable[[Any], None] | None = None
+
+
+@dataclass
+class ReconcileReport:
+    positions: int = 0
+    orders: int = 0
+    matched: List[str] = field(default_factory=list)
+    adopted: List[str] = field(default_factory=list)     # borsada açık, yerelde kaydı yok
+    dropped: List[str] = field(default_factory=list)     # yerelde kayıtlı, borsada pozisyon yok
+    fixed: List[str] = field(default_factory=list)       # emir id'leri / faz borsaya göre düzeltildi
+    foreign: List[str] = field(default_factory=list)     # cid etiketi tanınmayan emirler (dokunulmaz)
+    skipped: List[str] = field(default_factory=list)
+    repairs: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    elapsed_s: float = 0.0
+
+    @property
+    def touched(self) -> List[str]:
+        return sorted(set(self.adopted) | set(self.fixed) | {r.split(" ", 1)[0] for r in self.repairs})
+
+    def text(self) -> str:
+        lines = [f"🧮 Mutabakat ({self.elapsed_s:.1f}s): {self.positions} pozisyon, {self.orders} açık emir; {len(self.matched)} eşleşti"]
+        for title, rows in (("Yerelde yok, devralındı", self.adopted), ("Borsada kapanmış, silindi", self.dropped), ("Emir id/faz düzeltildi", self.fixed),
+                            ("Onarıldı", self.repairs), ("Onarılamadı", self.failed), ("Atlandı", self.skipped), ("Tanınmayan emir", self.foreign)):
+            if rows:
+                lines.append(f"{title}: " + ", ".join(rows))
+        return "\n".join(lines)
+
+
+def fetch_snapshot(client: BinanceClient) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Tüm pozisyonlar ve tüm açık emirler: sembol başına değil, ikişer tek istek (paralel)."""
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        risks = ex.submit(client.get_position_risk)
+        orders = ex.submit(client.get_open_orders)
+        return risks.result() or [], orders.result() or []
+
+
+def plan(client: BinanceClient, risks: List[Dict[str, Any]], orders: List[Dict[str, Any]], active: Dict[str, dict], cid: Callable[[str, str], str],
+         book: PositionBook | None = None, sl_atr_mult: float = 1.5, tp1_atr_mult: float = 1.0, tp2_atr_mult: float = 2.0,
+         atr_for: Callable[[str], float] | None = None) -> Tuple[ReconcileReport, List[Repair]]:
+    """
+    Borsa görüntüsünü yerel duruma uygula. `active` yerinde düzeltilir (id'ler, faz, devralma,
+    silme); `book` açık bacaklarla tohumlanır. Eksik SL/TP ve artık emirler için yapılacak
+    işler döner, çalıştırmak çağıranın işidir (`run_repairs` / `run_repairs_sync`).
+    """
+    book = book if book is not None else PositionBook()
+    rep = ReconcileReport()
+    repairs: List[Repair] = []
+    positions = {p["symbol"]: p for p in risks if abs(_f(p.get("positionAmt"))) > EPS}
+    by_symbol: Dict[str, List[Dict[str, Any]]] = {}
+    for o in orders:
+        by_symbol.setdefault(o.get("symbol", ""), []).append(o)
+    rep.positions, rep.orders = len(positions), len(orders)
+
+    for symbol in list(active):
+        if symbol not in positions:
+            active.pop(symbol, None)
+            rep.dropped.append(symbol)
+
+    def cancel(symbol: str, o: Dict[str, Any], tag: str, why: str) -> None:
+        repairs.append(Repair(STOP if tag in ENTRY_TAGS else TP, symbol, f"{symbol} {tag} iptal ({why})", client.cancel_order, {"symbol": symbol, "order_id": int(o["orderId"])}, orders=0))
+
+    exits: Dict[str, List[Dict[str, Any]]] = {}
+    for symbol, rows in by_symbol.items():
+        for o in rows:
+            parsed = parse_cid(o.get("clientOrderId"))
+            if parsed is None:
+                rep.foreign.append(f"{symbol}#{o.get('orderId')}")
+            elif parsed[1] in ENTRY_TAGS:
+                # Yeniden başlatmadan kalan giriş emri: izleyen yürütücü yok
+                cancel(symbol, o, parsed[1], "sahipsiz giriş")
+            elif symbol not in positions:
+                # Kapanmış pozisyonun artık bacağı: sonraki pozisyonu yanlışlıkla kapatmasın
+                cancel(symbol, o, parsed[1], "pozisyon yok")
+            else:
+                exits.setdefault(symbol, []).append(o)
+
+    for symbol, p in positions.items():
+        amt = _f(p.get("positionAmt"))
+        side = "BUY" if amt > 0 else "SELL"
+        close_side = "SELL" if side == "BUY" else "BUY"
+        entry, mark = _f(p.get("entryPrice")), _f(p.get("markPrice"))
+        pos = book.seed(symbol, side, amt, entry, exits.get(symbol))
+        legs = pos.open_legs()
+        stops = sorted((lg for lg in legs if lg.tag in STOP_TAGS), key=lambda lg: lg.updated_ms)
+        stop = stops[-1] if stops else None
+        for lg in stops[:-1]:
+            repairs.append(Repair(TP, symbol, f"{symbol} {lg.tag} iptal (fazla stop)", client.cancel_order, {"symbol": symbol, "order_id": lg.order_id}, orders=0))
+        first = {tag: next((lg for lg in legs if lg.tag == tag), None) for tag in ("TP1", "TP2", "TRAIL")}
+
+        st = active.get(symbol)
+        if st is None or st.get("side") != side:
+            if stop is not None and stop.stop_price > 0:
+                atr_val = abs(entry - stop.stop_price) / max(sl_atr_mult, EPS)
+            else:
+                atr_val = atr_for(symbol) if atr_for is not None else 0.0
+            st = {"side": side, "entry": entry, "atr": atr_val, "sl_order_id": None, "trail_order_id": None, "tp1_order_id": None,
+                  "tp2_order_id": None, "sl_price": 0.0, "be_done": False, "tp1_hit": False}
+            active[symbol] = st
+            rep.adopted.append(symbol)
+        else:
+            rep.matched.append(symbol)
+
+        before = {k: st.get(k) for k in ("sl_order_id", "sl_price", "tp1_order_id", "tp2_order_id", "trail_order_id", "tp1_hit", "be_done")}
+        st["sl_order_id"] = stop.order_id if stop else None
+        if stop is not None:
+            st["sl_price"] = stop.stop_price
+            st["be_done"] = bool(st.get("be_done")) or stop.tag in ("SLBE", "SLTR")
+        st["tp1_order_id"] = first["TP1"].order_id if first["TP1"] else None
+        st["tp2_order_id"] = first["TP2"].order_id if first["TP2"] else None
+        st["trail_order_id"] = first["TRAIL"].order_id if first["TRAIL"] else None
+        if pos.phase == "TP1":
+            st["tp1_hit"] = True
+        if symbol not in rep.adopted and any(st.get(k) != v for k, v in before.items()):
+            rep.fixed.append(symbol)
+
+        atr_val = _f(st.get("atr"))
+        buy = side == "BUY"
+        if stop is None:
+            if not st.get("sl_price") and atr_val <= 0:
+                rep.skipped.append(f"{symbol} SL (ATR yok)")
+            else:
+                target = client.format_price(symbol, float(st.get("sl_price") or (entry - sl_atr_mult * atr_val if buy else entry + sl_atr_mult * atr_val)))
+                if mark > 0 and (mark <= target if buy else mark >= target):
+                    # Stop seviyesi zaten geçilmiş: korumasız beklemek yerine kapat
+                    repairs.append(Repair(FLATTEN, symbol, f"{symbol} kapatıldı (SL {target:g} geçilmiş)", client.place_market_order,
+                                          {"symbol": symbol, "side": close_side, "quantity": abs(amt), "reduce_only": True, "client_id": cid("FLAT", symbol)}))
+                else:
+                    def on_sl(res: Any, st: dict = st, target: float = target) -> None:
+                        st["sl_order_id"] = (res or {}).get("orderId")
+                        st["sl_price"] = float(target)
+                    repairs.append(Repair(STOP, symbol, f"{symbol} SL {target:g}", client.place_stop_market,
+                                          {"symbol": symbol, "side": close_side, "stop_price": target, "client_id": cid("SL", symbol)}, on_done=on_sl))
+
+        if atr_val <= 0:
+            continue
+        half = client.format_qty(symbol, abs(amt) / 2.0)
+        for tag, mult, qty, missing in (("TP1", tp1_atr_mult, half, not st.get("tp1_hit") and first["TP1"] is None),
+                                        ("TP2", tp2_atr_mult, abs(amt) if st.get("tp1_hit") else half, first["TP2"] is None)):
+            if not missing:
+                continue
+            px = client.format_price(symbol, entry + mult * atr_val if buy else entry - mult * atr_val)
+            if qty <= 0 or (mark > 0 and (mark >= px if buy else mark <= px)):
+                rep.skipped.append(f"{symbol} {tag} (seviye geçilmiş)")
+                continue
+
+            def on_tp(res: Any, st: dict = st, key: str = f"{tag.lower()}_order_id") -> None:
+                st[key] = (res or {}).get("orderId")
+            repairs.append(Repair(TP, symbol, f"{symbol} {tag} {px:g}", client.place_take_profit_market,
+                                  {"symbol": symbol, "side": close_side, "stop_price": px, "quantity": qty, "client_id": cid(tag, symbol)}, on_done=on_tp))
+    return rep, repairs
+
+
+def _done(rep: ReconcileReport, r: Repair, res: Any = None, err: BaseException | None = None) -> None:
+    if err is not None:
+        rep.failed.append(f"{r.note}: {err}")
+        return
+    if r.on_done is not None:
+        r.on_done(res)
+    rep.repairs.append(r.note)
+
+
+async def run_repairs(repairs: List[Repair], sched: OrderScheduler, rep: ReconcileReport) -> None:
+    """Onarımları emir kuyruğuna öncelikleriyle gönder; semboller paralel, sembol içi sıralı."""
+    futs = [sched.submit(r.prio, r.symbol, partial(r.fn, **r.kwargs), orders=r.orders) for r in repairs]
+    for r, res in zip(repairs, await asyncio.gather(*futs, return_exceptions=True)):
+        _done(rep, r, None if isinstance(res, BaseException) else res, res if isinstance(res, BaseException) else None)
+
+
+def run_repairs_sync(repairs: List[Repair], rep: ReconcileReport, workers: int = 4) -> None:
+    """Kuyruksuz (senkron trader) sürüm: sembol başına sıralı, semboller thread havuzunda paralel."""
+    groups: Dict[str, List[Repair]] = {}
+    for r in sorted(repairs, key=lambda r: r.prio):
+        groups.setdefault(r.symbol, []).append(r)
+
+    def run(rows: List[Repair]) -> List[Tuple[Repair, Any, BaseException | None]]:
+        out = []
+        for r in rows:
+            try:
+                out.append((r, r.fn(**r.kwargs), None))
+            except Exception as e:
+                out.append((r, None, e))
+        return out
+
+    if not groups:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(groups)))) as ex:
+        for rows in ex.map(run, groups.values()):
+            for r, res, err in rows:
+                _done(rep, r, res, err)
+
+
+def commit(rep: ReconcileReport, active: Dict[str, dict], journal: StateJournal) -> None:
+    for symbol in rep.dropped:
+        journal.close(symbol)
+    for symbol in rep.touched:
+        if symbol in active:
+            journal.open(symbol, active[symbol])
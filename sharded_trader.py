@@ -0,0 +1,282 @@
+from __future__ import annotations
+import asyncio, os, queue, time
+import multiprocessing as mp
+from typing import Any, Dict, List
+
+from config import CFG
+from exchange.binance_client import BinanceClient
+from ws_manager import WSManager
+from price_feed import MarkPriceFeed
+from user_stream import UserStream
+from signal_pool import SignalPool
+from strategy import GATE_STATS
+from notifier.telegram import TelegramNotifier
+from telegram_commands import CommandListener
+import async_trader as at
+
+# Sembol evreni N worker sürecine bölünür; her worker kendi WS shard'ını, bar önbelleğini ve
+# gösterge hesaplarını taşır. Günlük işlem sayacı, açık pozisyon limiti, duraklatma ve emir
+# gönderimi yalnızca koordinatörde (bu süreçte) tutulur; worker'lar sadece sinyal üretir.
+
+TFS = [CFG.entry_tf, CFG.mtf_fast, CFG.mtf_slow1, CFG.mtf_slow2]
+
+
+def shard_symbols(symbols: List[str], n: int) -> List[List[str]]:
+    """Round-robin: hacim sıralı listede yük shard'lara eşit dağılır."""
+    n = max(1, n)
+    return [symbols[i::n] for i in range(n)]
+
+
+# --- worker -------------------------------------------------------------
+
+async def _worker(idx: int, symbols: List[str], out_q: Any, ctl_q: Any) -> None:
+    # Yalnızca public kline backfill için; anahtarsız istemci
+    client = BinanceClient("", "", base_url=CFG.binance_base_url)
+    wsm = WSManager(symbols, TFS, stream_url=CFG.binance_ws_url, bridge_maxsize=CFG.ws_bridge_max)
+    pool = SignalPool(at.strategy_params(), 0, simple_mode=CFG.simple_mode, mtf_ema_filter=CFG.mtf_ema_filter, shadow=CFG.shadow_mode)
+    # Koordinatörün yayınladığı risk kapısı: giriş kapalıyken yalnızca açık pozisyon sembolleri değerlendirilir
+    gate: Dict[str, Any] = {"entries": True, "active": set()}
+
+    async def on_gap(streams: List[str], since_ms: int) -> None:
+        n = await at.backfill_gap(client, wsm, streams, since_ms)
+        out_q.put(("log", idx, f"🔌 shard {idx}: WS yeniden bağlandı ({len(streams)} stream), {n} bar REST ile tamamlandı"))
+
+    async def control() -> None:
+        while True:
+            try:
+                msg = await asyncio.to_thread(ctl_q.get, True, 1.0)
+            except queue.Empty:
+                continue
+            kind = msg[0]
+            if kind == "gate":
+                gate["entries"], gate["active"], pool.simple_mode = msg[1], set(msg[2]), msg[3]
+            elif kind == "symbols":
+                diff = await wsm.update(msg[1], TFS)
+                out_q.put(("log", idx, f"🔁 shard {idx}: +{diff['added']} / -{diff['removed']} stream"))
+            elif kind == "stop":
+                await wsm.stop()
+                return
+
+    async def evaluate() -> None:
+        try:
+            # Kline kapanış damgasını monotonic saate çevirmek için sunucu saat farkı
+            await asyncio.to_thread(client.clock.sync)
+        except Exception:
+            pass
+        while True:
+            batch = await wsm.get_closed_batch(CFG.eval_batch_ms / 1000.0)
+            dequeued = time.monotonic()
+            closed: Dict[str, int] = {}
+            stamps: Dict[str, Dict[str, float]] = {}
+            closes = []
+            for bar in batch:
+                at.upsert_bar_cache(bar)
+                closes.append((bar.symbol, bar.row[4]))
+                if int(bar.row[6]) > closed.get(bar.symbol, 0):
+                    closed[bar.symbol] = int(bar.row[6])
+                    stamps[bar.symbol] = at.bar_stamps(bar, dequeued, client.clock.offset_ms)
+            # Kilit kâr / trailing koordinatörde: kapanış fiyatlarını ilet
+            out_q.put(("bars", idx, closes))
+            jobs = []
+            for symbol, close_ms in closed.items():
+                if not gate["entries"] and symbol not in gate["active"]:
+                    continue
+                frames = [at.BAR_CACHE.get((symbol, tf), []) for tf in TFS]
+                if min(len(f) for f in frames) < 50:
+                    continue
+                jobs.append((symbol, close_ms, frames))
+            async for res in pool.evaluate_batch(jobs):
+                if res.side != "NONE" or res.shadow not in (None, "NONE"):
+                    out_q.put(("signal", idx, res._replace(stamps={**stamps.get(res.symbol, {}), "eval": time.monotonic()})))
+            gates = GATE_STATS.drain()
+            if gates:
+                out_q.put(("gates", idx, gates))
+
+    task = asyncio.ensure_future(asyncio.gather(wsm.start(), wsm.supervise(on_gap, stale_s=CFG.ws_stale_seconds), evaluate()))
+    try:
+        await control()
+    finally:
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+def worker_main(idx: int, symbols: List[str], out_q: Any, ctl_q: Any) -> None:
+    try:
+        asyncio.run(_worker(idx, symbols, out_q, ctl_q))
+    except KeyboardInterrupt:
+        pass
+
+
+# --- koordinatör --------------------------------------------------------
+
+class ShardSet:
+    def __init__(self, ctx: Any, n: int) -> None:
+        self.ctx = ctx
+        self.n = max(1, n)
+        self.out_q = ctx.Queue()
+        self.ctl: List[Any] = [ctx.Queue() for _ in range(self.n)]
+        self.procs: List[Any] = [None] * self.n
+        self.shards: List[List[str]] = [[] for _ in range(self.n)]
+        self.restarts = 0
+        self.signals = 0
+
+    def _spawn(self, i: int) -> None:
+        p = self.ctx.Process(target=worker_main, args=(i, self.shards[i], self.out_q, self.ctl[i]), name=f"shard-{i}", daemon=True)
+        p.start()
+        self.procs[i] = p
+
+    def start(self, symbols: List[str]) -> None:
+        self.shards = shard_symbols(symbols, self.n)
+        for i in range(self.n):
+            self._spawn(i)
+
+    def update(self, symbols: List[str]) -> None:
+        self.shards = shard_symbols(symbols, self.n)
+        for i, q in enumerate(self.ctl):
+            q.put(("symbols", self.shards[i]))
+
+    def broadcast(self, msg: tuple) -> None:
+        for q in self.ctl:
+            q.put(msg)
+
+    def revive(self) -> List[int]:
+        """Ölen worker'ları aynı shard ile yeniden başlat."""
+        dead = [i for i, p in enumerate(self.procs) if p is not None and not p.is_alive()]
+        for i in dead:
+            self._spawn(i)
+            self.restarts += 1
+        return dead
+
+    def stop(self) -> None:
+        self.broadcast(("stop",))
+        for p in self.procs:
+            if p is not None:
+                p.join(timeout=3)
+                if p.is_alive():
+                    p.terminate()
+                    p.join(timeout=1)
+
+
+def risk_guards(tg: TelegramNotifier, paused_state: dict) -> None:
+    """Günlük zarar ve kayıp serisi korumaları (trader.py ile aynı eşikler) yalnızca burada uygulanır."""
+    if paused_state.get("paused"):
+        return
+    daily_pnl = at.ACCOUNT.realized_pnl_today()
+    if daily_pnl <= -abs(CFG.daily_dd_limit_usdt):
+        paused_state["paused"] = True
+        tg.send(f"⛔ Günlük zarar limiti aşıldı ({daily_pnl:.2f} USDT). Sistem pause.")
+        return
+    streak = at.ACCOUNT.losing_streak(5)
+    if streak >= CFG.max_losing_streak:
+        paused_state["paused"] = True
+        tg.send(f"⛔ Losing streak {streak}! Sistem pause.")
+
+
+def entries_allowed(paused_state: dict) -> bool:
+    return not paused_state.get("paused") and at.DAILY_TRADES < CFG.max_daily_trades and at.ACCOUNT.open_positions_count() < CFG.max_open_positions
+
+
+async def coordinator_loop(client: BinanceClient, tg: TelegramNotifier, shards: ShardSet, paused_state: dict) -> None:
+    """Tek yürütücü: tüm shard sinyalleri sırayla global limitlere (bekleyen girişler dahil) karşı kontrol edilir."""
+    gate = None
+    next_health = 0.0
+    while True:
+        if time.monotonic() >= next_health:
+            next_health = time.monotonic() + 5.0
+            for i in shards.revive():
+                gate = None  # yeni worker kapı durumunu da alsın
+                tg.send(f"⚠️ shard {i} süreci durdu, yeniden başlatıldı")
+        risk_guards(tg, paused_state)
+        now_gate = (entries_allowed(paused_state), sorted(at.ACTIVE), paused_state.get("simple_mode", CFG.simple_mode))
+        if now_gate != gate:
+            gate = now_gate
+            shards.broadcast(("gate", *gate))
+        try:
+            kind, idx, payload = await asyncio.to_thread(shards.out_q.get, True, 1.0)
+        except queue.Empty:
+            continue
+        if kind == "signal":
+            at.record_shadow(payload)
+            if payload.side == "NONE" or paused_state.get("paused"):
+                continue
+            shards.signals += 1
+            at.submit_signal(client, tg, payload)
+        elif kind == "bars":
+            if CFG.trailing_enabled:
+                for symbol, close_price in payload:
+                    if symbol in at.ACTIVE and close_price is not None:
+                        at.maybe_move_to_lock_profit(symbol, close_price, client, tg)
+                        at.TRAILER.on_price(symbol, close_price)
+        elif kind == "gates":
+            GATE_STATS.merge(payload)
+        elif kind == "log":
+            tg.send(payload)
+
+
+async def refresh_loop(client: BinanceClient, tg: TelegramNotifier, shards: ShardSet) -> None:
+    while True:
+        await asyncio.sleep(CFG.symbol_refresh_hours * 3600)
+        try:
+            symbols = await asyncio.to_thread(at.pick_symbols, client)
+            shards.update(symbols)
+            tg.send(f"🔁 Symbols refreshed across {shards.n} shards: " + ", ".join(symbols))
+        except Exception as e:
+            tg.send(f"⚠️ symbol refresh error: {e}")
+
+
+async def main() -> None:
+    client = BinanceClient(CFG.binance_api_key, CFG.binance_api_secret, CFG.universe_ttl_seconds, CFG.universe_score, CFG.clock_sync_seconds, CFG.recv_window_ms, base_url=CFG.binance_base_url,
+                           weight_per_min=CFG.rate_weight_per_min, orders_per_10s=CFG.rate_orders_per_10s, rate_headroom=CFG.rate_headroom)
+    tg = TelegramNotifier(CFG.telegram_bot_token, CFG.telegram_chat_id, CFG.tg_rate_per_s, CFG.tg_burst, CFG.tg_queue_max, CFG.tg_digest_ms)
+    listener = CommandListener(CFG.telegram_bot_token, CFG.telegram_chat_id, CFG.admin_user_id, on_error=lambda name, e: tg.send(f"⚠️ {name} error: {e}"))
+
+    await asyncio.to_thread(client.clock.sync)
+    client.clock.start()
+    at.ORDERS.limiter = client.limiter
+
+    symbols = at.pick_symbols(client)
+    n = CFG.shard_workers or max(1, (os.cpu_count() or 2) - 1)
+    # spawn: koordinatörde WS/saat thread'leri çalışırken fork güvenli değil
+    shards = ShardSet(mp.get_context("spawn"), n)
+    shards.start(symbols)
+
+    us = UserStream(CFG.binance_api_key, CFG.binance_api_secret, base_url=CFG.binance_base_url, stream_url=CFG.binance_ws_url, listeners=[at.ACCOUNT.apply])
+    await us.start()
+    try:
+        await at.reconcile_startup(client, tg)
+    except Exception as e:
+        tg.send(f"⚠️ Hesap önbelleği doldurulamadı: {e}")
+
+    async def on_user_reconnect() -> None:
+        await at.reseed_after_user_gap(client)
+        await tg.send_async("🔌 User stream yeniden bağlandı, hesap önbelleği ve pozisyon defteri tazelendi")
+
+    price_bridge = at.CoalescingBridge(maxsize=256)
+    feed = MarkPriceFeed(CFG.binance_ws_url, source=CFG.price_stream, debounce_ms=CFG.price_debounce_ms,
+                         listeners=[lambda s, px: price_bridge.put(s, (s, px))])
+
+    tg.send(f"🔌 Sharded trader started: {len(symbols)} symbols / {shards.n} shards")
+    paused_state = {"paused": False, "simple_mode": CFG.simple_mode}
+    at.register_commands(listener, client, tg, paused_state)
+    try:
+        await asyncio.gather(
+            coordinator_loop(client, tg, shards, paused_state),
+            at.consume_user_events(us, client, tg),
+            refresh_loop(client, tg, shards),
+            listener.run(),
+            us.supervise(on_user_reconnect),
+            at.journal_loop(),
+            at.ledger_loop(client),
+            *([at.TRAILER.run(client, tg)] if CFG.trail_mode != "native" else []),
+            *([at.price_loop(client, tg, feed, price_bridge)] if CFG.price_stream != "off" else []),
+        )
+    finally:
+        shards.stop()
+        at.JOURNAL.close_file()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
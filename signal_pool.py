@@ -0,0 +1,179 @@
+from __future__ import annotations
+import asyncio
+import multiprocessing as mp
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicator_graph import IndicatorGraph
+from strategy import GATE_STATS, GateStats, Signal, StrategyParams, evaluate
+from simple_strategy import evaluate_simple
+
+# Bar önbelleği satırının sayısal kısmı (son "ignore" alanı hariç)
+COLS = ["open_time", "open", "high", "low", "close", "volume", "close_time", "quote_volume", "num_trades", "taker_base", "taker_quote"]
+
+
+class EvalResult(NamedTuple):
+    symbol: str
+    close_ms: int
+    side: str
+    entry: float | None = None
+    sl: float | None = None
+    tp1: float | None = None
+    tp2: float | None = None
+    price: float = 0.0
+    atr: float = 0.0
+    rsi: float = 0.0
+    error: str | None = None
+    gates: Dict[str, List[float]] | None = None   # worker sürecinin kapı sayaçları (ana süreçte birleştirilir)
+    shadow: str | None = None                     # gölge modun (diğer strateji) kararı
+    stamps: Dict[str, float] | None = None        # gecikme damgaları (latency.STAGES), monotonic
+
+
+def rows_to_array(rows: List[list]) -> np.ndarray:
+    return np.asarray([r[:11] for r in rows], dtype=np.float64).reshape(-1, len(COLS))
+
+
+def frame_from_array(arr: np.ndarray) -> pd.DataFrame:
+    """`indicators.to_dataframe` ile aynı şekilli DataFrame (float64 diziden, kopyalı)."""
+    df = pd.DataFrame(arr, columns=COLS)
+    df["ignore"] = ""
+    df["open_time"] = pd.to_datetime(df["open_time"].astype("int64"), unit="ms")
+    df["close_time"] = pd.to_datetime(df["close_time"].astype("int64"), unit="ms")
+    return df
+
+
+def evaluate_arrays(symbol: str, close_ms: int, arrays: Sequence[np.ndarray], params: StrategyParams, simple_mode: bool, mtf_ema_filter: bool, shadow: bool = False) -> EvalResult:
+    """
+    (1m, 5m, 15m, 1h) bar dizilerinden sinyal + MTF EMA kapısı; yürütme için gerekli sayıları döndürür.
+    `shadow` açıksa diğer mod aynı gösterge grafı üzerinde değerlendirilir (ortak düğümler tekrar hesaplanmaz).
+    """
+    try:
+        df1, df5, df15, df1h = (frame_from_array(a) for a in arrays)
+        g = IndicatorGraph({"1m": df1, "5m": df5, "15m": df15, "1h": df1h})
+
+        def run(simple: bool, stats: GateStats | None) -> Signal:
+            sig = evaluate_simple(df1, params, g) if simple else evaluate(df1, df5, df15, df1h, params, stats=stats, graph=g)
+            # MTF EMA20/50 gate (5m): trendle aynı yönde değilse sinyali atla
+            if mtf_ema_filter and sig.side != "NONE":
+                ema20 = g.get("ema", "5m", 20).iloc[-1]
+                ema50 = g.get("ema", "5m", 50).iloc[-1]
+                if sig.side == "LONG" and not (ema20 > ema50):
+                    sig.side = "NONE"
+                if sig.side == "SHORT" and not (ema20 < ema50):
+                    sig.side = "NONE"
+            if None in (sig.entry, sig.sl, sig.tp1, sig.tp2):
+                sig.side = "NONE"
+            return sig
+
+        sig = run(simple_mode, GATE_STATS)
+        shadow_side = run(not simple_mode, None).side if shadow else None
+        if sig.side == "NONE":
+            return EvalResult(symbol, close_ms, "NONE", shadow=shadow_side)
+        try:
+            rsi_now = float(g.get("rsi", "1m", params.rsi_period).iloc[-1])
+        except Exception:
+            rsi_now = 0.0
+        return EvalResult(
+            symbol, close_ms, sig.side, float(sig.entry), float(sig.sl), float(sig.tp1), float(sig.tp2),
+            price=float(df1["close"].iloc[-1]), atr=float(g.get("atr", "1m", params.atr_period).iloc[-1]), rsi=rsi_now,
+            shadow=shadow_side,
+        )
+    except Exception as e:
+        return EvalResult(symbol, close_ms, "NONE", error=str(e))
+
+
+def _evaluate_shm(shm_name: str, shapes: List[Tuple[int, int]], symbol: str, close_ms: int, params: StrategyParams, simple_mode: bool, mtf_ema_filter: bool, shadow: bool) -> EvalResult:
+    # Worker süreci: bar dizileri pickle'lanmaz, paylaşılan bellekten görünüm olarak okunur
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        buf = np.ndarray((sum(r for r, _ in shapes), len(COLS)), dtype=np.float64, buffer=shm.buf)
+        arrays, off = [], 0
+        for rows, _ in shapes:
+            arrays.append(buf[off:off + rows])
+            off += rows
+        # frame_from_array kopyalar; blok kapanmadan önce görünümler bırakılmalı
+        res = evaluate_arrays(symbol, close_ms, arrays, params, simple_mode, mtf_ema_filter, shadow)
+        del buf, arrays
+        return res._replace(gates=GATE_STATS.drain())
+    finally:
+        shm.close()
+
+
+class SignalPool:
+    """
+    Aynı anda kapanan barların sinyal değerlendirmesini süreç (veya thread) havuzuna dağıtır.
+    Süreç modunda her sembolün bar dizileri tek bir SharedMemory bloğuna yazılır; worker
+    yalnızca blok adını ve satır sayılarını alır. `workers=0` döngü içinde sırayla hesaplar.
+    """
+
+    def __init__(self, params: StrategyParams, workers: int = 0, mode: str = "process", simple_mode: bool = True, mtf_ema_filter: bool = False, shadow: bool = False) -> None:
+        self.params = params
+        self.workers = max(0, workers)
+        self.mode = mode
+        # /mode ile çalışırken değişebilir; her gönderimde okunur
+        self.simple_mode = simple_mode
+        self.shadow = shadow
+        self.mtf_ema_filter = mtf_ema_filter
+        self.executor: Executor | None = None
+        if self.workers:
+            # spawn: WS thread'leri çalışırken fork güvenli değil
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=mp.get_context("spawn")) if mode == "process" else ThreadPoolExecutor(self.workers, thread_name_prefix="eval")
+
+    def _submit(self, symbol: str, close_ms: int, frames: Sequence[List[list]]) -> Tuple[Future, shared_memory.SharedMemory | None]:
+        arrays = [rows_to_array(rows) for rows in frames]
+        if self.mode != "process":
+            return self.executor.submit(evaluate_arrays, symbol, close_ms, arrays, self.params, self.simple_mode, self.mtf_ema_filter, self.shadow), None
+        total = sum(a.shape[0] for a in arrays)
+        shm = shared_memory.SharedMemory(create=True, size=max(total * len(COLS) * 8, 1))
+        buf = np.ndarray((total, len(COLS)), dtype=np.float64, buffer=shm.buf)
+        off = 0
+        for a in arrays:
+            buf[off:off + a.shape[0]] = a
+            off += a.shape[0]
+        del buf
+        shapes = [a.shape for a in arrays]
+        return self.executor.submit(_evaluate_shm, shm.name, shapes, symbol, close_ms, self.params, self.simple_mode, self.mtf_ema_filter, self.shadow), shm
+
+    async def evaluate_batch(self, jobs: List[Tuple[str, int, Sequence[List[list]]]]):
+        """
+        jobs: (symbol, close_ms, (1m, 5m, 15m, 1h) satırları). Hepsi aynı anda gönderilir;
+        sonuçlar kapanış zamanı sırasıyla, her biri (ve öncekiler) hazır olur olmaz verilir.
+        """
+        jobs = sorted(jobs, key=lambda j: j[1])
+        if self.executor is None:
+            for symbol, close_ms, frames in jobs:
+                yield evaluate_arrays(symbol, close_ms, [rows_to_array(r) for r in frames], self.params, self.simple_mode, self.mtf_ema_filter, self.shadow)
+            return
+        pending = [self._submit(*job) for job in jobs]
+        try:
+            for fut, _ in pending:
+                res = await asyncio.wrap_future(fut)
+                if res.gates:
+                    GATE_STATS.merge(res.gates)
+                yield res
+        finally:
+            for fut, shm in pending:
+                if shm is None:
+                    continue
+                if not fut.done():
+                    # Erken çıkışta worker bloğu okurken unlink edilmesin
+                    try:
+                        await asyncio.wrap_future(fut)
+                    except Exception:
+                        pass
+                shm.close()
+                shm.unlink()
+
+    def warm_up(self) -> None:
+        """Worker'ları önceden başlat (spawn + pandas importu ilk batch'e yansımasın)."""
+        if self.executor is not None:
+            for f in [self.executor.submit(int, 0) for _ in range(self.workers)]:
+                f.result()
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
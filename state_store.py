@@ -1,5 +1,8 @@
 from __future__ import annotations
 import json
+import os
+import threading
+import time
 from pathlib import Path
 from typing import Any, Dict
 
@@ -14,9 +17,151 @@ def load_state(path: str) -> Dict[str, Any]:
         return {}
 
 
+def _write_atomic(p: Path, text: str) -> None:
+    # Geçici dosya + fsync + rename: yarıda kalan yazım eski dosyayı bozmaz
+    tmp = p.with_name(p.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, p)
+    try:
+        fd = os.open(str(p.parent), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
 def save_state(state: Dict[str, Any], path: str) -> None:
-    p = Path(path)
     try:
-        p.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+        _write_atomic(Path(path), json.dumps(state, ensure_ascii=False, separators=(",", ":")))
     except Exception:
         pass
+
+
+class StateJournal:
+    """
+    Açık pozisyon durumu (ACTIVE) için yalnızca-ekleme günlüğü. Her değişiklik tek satırlık
+    kayıttır: open (tam durum), set (değişen alanlar), close. fsync `fsync_ms` aralığıyla
+    toplu yapılır; `compact_every` kayıtta bir durum anlık görüntüye (`path`, atomik) yazılır
+    ve günlük sıfırlanır. Açılışta görüntü + görüntüden sonraki kayıtlar yeniden oynatılır.
+    """
+
+    def __init__(self, path: str, fsync_ms: float = 200.0, compact_every: int = 500) -> None:
+        self.path = Path(path)
+        self.journal_path = self.path.with_name(self.path.name + ".journal")
+        self.fsync_s = fsync_ms / 1000.0
+        self.compact_every = max(1, compact_every)
+        self._lock = threading.Lock()
+        self._f: Any = None
+        self._seq = 0
+        self._since_snapshot = 0
+        self._unsynced = False
+        self._last_sync = 0.0
+        self.state: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"records": 0, "fsyncs": 0, "snapshots": 0, "replayed": 0}
+
+    # --- açılış ----------------------------------------------------------
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        snap = load_state(str(self.path))
+        with self._lock:
+            self.state = {s: dict(d) for s, d in (snap.get("active") or {}).items()}
+            self._seq = int(snap.get("seq", 0))
+            if self.journal_path.exists():
+                good = 0
+                with open(self.journal_path, "rb") as f:
+                    for line in f:
+                        try:
+                            rec = json.loads(line) if line.endswith(b"\n") else None
+                        except ValueError:
+                            rec = None
+                        if rec is None:
+                            break   # çökme anında yarım kalmış son satır
+                        good += len(line)
+                        if rec.get("n", 0) <= self._seq:
+                            continue   # görüntüye zaten dahil (görüntü yazıldı, günlük kesilmeden çökmüş)
+                        self._apply(rec)
+                        self._seq = rec["n"]
+                        self._since_snapshot += 1
+                        self.stats["replayed"] += 1
+                # Yarım satır kesilir: yeni kayıtlar onun arkasına eklenip okunamaz hale gelmesin
+                if good < self.journal_path.stat().st_size:
+                    os.truncate(self.journal_path, good)
+            return {s: dict(d) for s, d in self.state.items()}
+
+    def _apply(self, rec: Dict[str, Any]) -> None:
+        op, symbol = rec.get("op"), rec.get("s")
+        if op == "open":
+            self.state[symbol] = dict(rec.get("d") or {})
+        elif op == "set" and symbol in self.state:
+            self.state[symbol].update(rec.get("d") or {})
+        elif op == "close":
+            self.state.pop(symbol, None)
+
+    # --- kayıtlar --------------------------------------------------------
+    def _append(self, op: str, symbol: str, data: Dict[str, Any] | None = None) -> None:
+        with self._lock:
+            self._seq += 1
+            rec: Dict[str, Any] = {"n": self._seq, "op": op, "s": symbol}
+            if data is not None:
+                rec["d"] = data
+            self._apply(rec)
+            try:
+                if self._f is None:
+                    self._f = open(self.journal_path, "a", encoding="utf-8")
+                self._f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+                # Süreç çökmesine karşı OS'e hemen; güç kesintisine karşı fsync toplu
+                self._f.flush()
+                self._unsynced = True
+            except Exception:
+                pass
+            self._since_snapshot += 1
+            self.stats["records"] += 1
+
+    def open(self, symbol: str, state: Dict[str, Any]) -> None:
+        self._append("open", symbol, {k: v for k, v in state.items() if not k.startswith("_")})
+
+    def update(self, symbol: str, **fields: Any) -> None:
+        self._append("set", symbol, fields)
+
+    def close(self, symbol: str) -> None:
+        self._append("close", symbol)
+
+    # --- bakım -----------------------------------------------------------
+    def flush(self, force: bool = False) -> None:
+        """Periyodik çağrılır: zamanı geldiyse fsync, yeterli kayıt birikmişse anlık görüntü."""
+        with self._lock:
+            now = time.monotonic()
+            if self._f is not None and self._unsynced and (force or now - self._last_sync >= self.fsync_s):
+                try:
+                    os.fsync(self._f.fileno())
+                    self.stats["fsyncs"] += 1
+                except Exception:
+                    pass
+                self._unsynced = False
+                self._last_sync = now
+            if self._since_snapshot >= self.compact_every or (force and self._since_snapshot):
+                self._compact()
+
+    def _compact(self) -> None:
+        try:
+            _write_atomic(self.path, json.dumps({"seq": self._seq, "active": self.state}, ensure_ascii=False, separators=(",", ":")))
+        except Exception:
+            return
+        if self._f is not None:
+            self._f.close()
+        # Görüntü kalıcı: günlük sıfırdan başlar
+        self._f = open(self.journal_path, "w", encoding="utf-8")
+        self._unsynced = False
+        self._since_snapshot = 0
+        self.stats["snapshots"] += 1
+
+    def close_file(self) -> None:
+        self.flush(force=True)
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
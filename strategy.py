@@ -1,11 +1,12 @@
 from __future__ import annotations
+import threading, time
 from dataclasses import dataclass
-from typing import Literal
+from typing import Callable, Dict, List, Literal, Tuple
 import pandas as pd
 
-from indicators import heikin_ashi, rsi, atr, faytterro_bands, ssl_channel, supertrend, taker_flow_direction
 from config import CFG
-from orderblocks import detect_order_blocks, retest_hits
+from indicator_graph import IndicatorGraph
+from orderblocks import retest_hits
 
 
 SignalSide = Literal["LONG", "SHORT", "NONE"]
@@ -35,16 +36,6 @@ class Signal:
     tp2: float | None = None
 
 
-def _align_indicators(df: pd.DataFrame, params: StrategyParams) -> pd.DataFrame:
-    df = heikin_ashi(df)
-    df["rsi"] = rsi(df["close"], params.rsi_period)
-    df["atr"] = atr(df, params.atr_period)
-    df = faytterro_bands(df, params.bands_length, params.bands_multiplier)
-    df = ssl_channel(df, length=10)
-    df = supertrend(df, period=10, multiplier=3.0)
-    return df
-
-
 def _retest_ok(df: pd.DataFrame, idx: int, band_col: str, tol_pct: float) -> bool:
     # Check price came back within tolerance to band after a break
     if idx < 2:
@@ -54,89 +45,155 @@ def _retest_ok(df: pd.DataFrame, idx: int, band_col: str, tol_pct: float) -> boo
     return abs(price - band) / max(band, 1e-9) <= tol_pct
 
 
-def evaluate(
-    df_1m: pd.DataFrame,
-    df_5m: pd.DataFrame,
-    df_15m: pd.DataFrame,
-    df_1h: pd.DataFrame,
-    params: StrategyParams,
-) -> Signal:
-    df = _align_indicators(df_1m.copy(), params)
-    if len(df) < 50:
-        return Signal("NONE")
-    i = len(df) - 1
+class GateStats:
+    """Kapı başına geçen / reddedilen sayısı ve harcanan süre (süreçler arası birleştirilebilir)."""
 
-    # Order heat filter using taker buy fraction and price move across last 3 bars
-    flow_dir = taker_flow_direction(df, n=3)
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.rows: Dict[str, List[float]] = {}   # gate -> [passed, rejected, seconds]
+
+    def record(self, gate: str, passed: bool, dt_s: float) -> None:
+        with self._lock:
+            row = self.rows.setdefault(gate, [0, 0, 0.0])
+            row[0 if passed else 1] += 1
+            row[2] += dt_s
+
+    def merge(self, rows: Dict[str, List[float]]) -> None:
+        with self._lock:
+            for gate, (p, r, t) in rows.items():
+                row = self.rows.setdefault(gate, [0, 0, 0.0])
+                row[0] += p
+                row[1] += r
+                row[2] += t
+
+    def drain(self) -> Dict[str, List[float]]:
+        with self._lock:
+            rows, self.rows = self.rows, {}
+            return rows
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            rows = {g: list(r) for g, r in self.rows.items()}
+        order = ["bars"] + [g for g, _ in GATES]
+        out = []
+        for g in sorted(rows, key=lambda g: order.index(g) if g in order else len(order)):
+            p, r, t = rows[g]
+            n = p + r
+            out.append(f"{g}: {int(r)}/{int(n)} red ({100.0 * r / max(n, 1):.0f}%), ort {1000.0 * t / max(n, 1):.2f} ms")
+        return out
+
+
+GATE_STATS = GateStats()
+
+
+class _Inputs:
+    """Kapı girdileri paylaşılan gösterge grafından istenir; reddeden kapıdan sonrası hiç hesaplanmaz."""
+
+    def __init__(self, graph: IndicatorGraph, params: StrategyParams) -> None:
+        self.g = graph
+        self.df = graph.frame("1m")
+        self.params = params
+        self.i = len(self.df) - 1
+        self.side: SignalSide = "NONE"
 
+
+def _gate_ha(x: _Inputs) -> bool:
     # Heikin Ashi last 3 bodies alignment with trend
-    if not (
-        df["ha_body_dir"].iloc[i-2:i+1].sum() == 3 or df["ha_body_dir"].iloc[i-2:i+1].sum() == -3
-    ):
-        return Signal("NONE")
+    body_sum = x.g.get("ha_body_sum", "1m", 3)
+    if body_sum == 3:
+        x.side = "LONG"
+    elif body_sum == -3:
+        x.side = "SHORT"
+    return x.side != "NONE"
 
-    body_sum = df["ha_body_dir"].iloc[i-2:i+1].sum()
 
-    # Bands context and retest
-    touched_lower = df["low"].iloc[i] <= df["fb_lower"].iloc[i]
-    touched_upper = df["high"].iloc[i] >= df["fb_upper"].iloc[i]
+def _gate_flow(x: _Inputs) -> bool:
+    # Order heat filter using taker buy fraction and price move across last 3 bars
+    flow_dir = x.g.get("flow", "1m", 3)
+    return flow_dir >= 0 if x.side == "LONG" else flow_dir <= 0
 
-    retest_lower_ok = _retest_ok(df, i, "fb_lower", params.retest_tolerance_pct)
-    retest_upper_ok = _retest_ok(df, i, "fb_upper", params.retest_tolerance_pct)
 
+def _gate_rsi(x: _Inputs) -> bool:
     # RSI (HAB) gates
-    rsi_val = float(df["rsi"].iloc[i])
+    rsi_val = float(x.g.get("rsi", "1m", x.params.rsi_period).iloc[x.i])
+    return rsi_val <= x.params.hab_rsi_low if x.side == "LONG" else rsi_val >= x.params.hab_rsi_high
+
+
+def _gate_bands(x: _Inputs) -> bool:
+    # Bands context and retest
+    df, i = x.g.get("fb_bands", "1m", x.params.bands_length, x.params.bands_multiplier), x.i
+    if x.side == "LONG":
+        return bool(df["low"].iloc[i] <= df["fb_lower"].iloc[i]) and _retest_ok(df, i, "fb_lower", x.params.retest_tolerance_pct)
+    return bool(df["high"].iloc[i] >= df["fb_upper"].iloc[i]) and _retest_ok(df, i, "fb_upper", x.params.retest_tolerance_pct)
 
-    # MTF direction via RSI trend on higher TFs
-    df5 = df_5m.copy()
-    df15 = df_15m.copy()
-    df1h = df_1h.copy()
-    df5["rsi"] = rsi(df5["close"], params.rsi_period)
-    df15["rsi"] = rsi(df15["close"], params.rsi_period)
-    df1h["rsi"] = rsi(df1h["close"], params.rsi_period)
 
-    mtf_up = df5["rsi"].iloc[-1] >= df5["rsi"].iloc[-3] and df15["rsi"].iloc[-1] >= df15["rsi"].iloc[-3] and df1h["rsi"].iloc[-1] >= df1h["rsi"].iloc[-3]
-    mtf_dn = df5["rsi"].iloc[-1] <= df5["rsi"].iloc[-3] and df15["rsi"].iloc[-1] <= df15["rsi"].iloc[-3] and df1h["rsi"].iloc[-1] <= df1h["rsi"].iloc[-3]
+def _gate_mtf(x: _Inputs) -> bool:
+    # MTF direction via RSI trend on higher TFs (5m -> 15m -> 1h, ilk uyumsuzda durur)
+    for tf in ("5m", "15m", "1h"):
+        r = x.g.get("rsi", tf, x.params.rsi_period)
+        if not (r.iloc[-1] >= r.iloc[-3] if x.side == "LONG" else r.iloc[-1] <= r.iloc[-3]):
+            return False
+    return True
 
-    # Trend confirmation: SSL + Supertrend agree
-    df_ssl = ssl_channel(df, length=10)
-    df_st = supertrend(df, period=10, multiplier=3.0)
-    ssl_dir = int(df_ssl["ssl_dir"].iloc[i])
-    st_dir = int(df_st["st_dir"].iloc[i])
 
-    atr_val = float(df["atr"].iloc[i])
-    price = float(df["close"].iloc[i])
+def _gate_trend(x: _Inputs) -> bool:
+    # Trend confirmation: SSL + Supertrend agree (Supertrend döngüsü en pahalı adım, SSL önce)
+    sign = 1 if x.side == "LONG" else -1
+    if x.g.get("ssl_dir", "1m", 10) * sign <= 0:
+        return False
+    return x.g.get("st_dir", "1m", 10, 3.0) * sign > 0
 
+
+def _gate_ob(x: _Inputs) -> bool:
     # Optional OB retest confirmation
-    def ob_confirms(side: str) -> bool:
-        if not CFG.ob_enabled:
-            return True
-        look_df = df.tail(CFG.ob_lookback).copy()
-        zones = detect_order_blocks(look_df, atr_period=params.atr_period, swing_lb=3, impulse_atr_mult=CFG.ob_impulse_atr, max_age=CFG.ob_lookback)
-        i_local = len(look_df) - 1
-        if side == "LONG":
-            return any(z.side == "BULL" and retest_hits(look_df, z, i_local, CFG.ob_retest_tol) for z in zones)
-        else:
-            return any(z.side == "BEAR" and retest_hits(look_df, z, i_local, CFG.ob_retest_tol) for z in zones)
-
-    # Long conditions
-    if (
-        body_sum == 3 and flow_dir >= 0 and touched_lower and retest_lower_ok and rsi_val <= params.hab_rsi_low and mtf_up and ssl_dir > 0 and st_dir > 0 and ob_confirms("LONG")
-    ):
-        entry = price
-        sl = max(price - params.sl_atr_mult * atr_val, df["low"].iloc[i])
-        tp1 = price + params.tp1_atr_mult * atr_val
-        tp2 = price + params.tp2_atr_mult * atr_val
-        return Signal("LONG", entry=entry, sl=sl, tp1=tp1, tp2=tp2)
-
-    # Short conditions
-    if (
-        body_sum == -3 and flow_dir <= 0 and touched_upper and retest_upper_ok and rsi_val >= params.hab_rsi_high and mtf_dn and ssl_dir < 0 and st_dir < 0 and ob_confirms("SHORT")
-    ):
-        entry = price
-        sl = min(price + params.sl_atr_mult * atr_val, df["high"].iloc[i])
-        tp1 = price - params.tp1_atr_mult * atr_val
-        tp2 = price - params.tp2_atr_mult * atr_val
-        return Signal("SHORT", entry=entry, sl=sl, tp1=tp1, tp2=tp2)
-
-    return Signal("NONE")
+    if not CFG.ob_enabled:
+        return True
+    look_df, zones = x.g.get("ob_zones", "1m", CFG.ob_lookback, x.params.atr_period, CFG.ob_impulse_atr)
+    i_local = len(look_df) - 1
+    want = "BULL" if x.side == "LONG" else "BEAR"
+    return any(z.side == want and retest_hits(look_df, z, i_local, CFG.ob_retest_tol) for z in zones)
+
+
+# Ucuzdan pahalıya; çoğu bar ilk iki kapıda elenir
+GATES: List[Tuple[str, Callable[[_Inputs], bool]]] = [
+    ("ha", _gate_ha),
+    ("flow", _gate_flow),
+    ("rsi", _gate_rsi),
+    ("bands", _gate_bands),
+    ("mtf", _gate_mtf),
+    ("trend", _gate_trend),
+    ("ob", _gate_ob),
+]
+
+
+def evaluate(
+    df_1m: pd.DataFrame,
+    df_5m: pd.DataFrame,
+    df_15m: pd.DataFrame,
+    df_1h: pd.DataFrame,
+    params: StrategyParams,
+    stats: GateStats | None = GATE_STATS,
+    graph: IndicatorGraph | None = None,
+) -> Signal:
+    if len(df_1m) < 50:
+        if stats is not None:
+            stats.record("bars", False, 0.0)
+        return Signal("NONE")
+    graph = graph or IndicatorGraph({"1m": df_1m, "5m": df_5m, "15m": df_15m, "1h": df_1h})
+    x = _Inputs(graph, params)
+    for name, gate in GATES:
+        t0 = time.perf_counter()
+        ok = gate(x)
+        if stats is not None:
+            stats.record(name, ok, time.perf_counter() - t0)
+        if not ok:
+            return Signal("NONE")
+
+    i = x.i
+    price = float(df_1m["close"].iloc[i])
+    atr_val = float(graph.get("atr", "1m", params.atr_period).iloc[i])
+    if x.side == "LONG":
+        sl = max(price - params.sl_atr_mult * atr_val, df_1m["low"].iloc[i])
+        return Signal("LONG", entry=price, sl=sl, tp1=price + params.tp1_atr_mult * atr_val, tp2=price + params.tp2_atr_mult * atr_val)
+    sl = min(price + params.sl_atr_mult * atr_val, df_1m["high"].iloc[i])
+    return Signal("SHORT", entry=price, sl=sl, tp1=price - params.tp1_atr_mult * atr_val, tp2=price - params.tp2_atr_mult * atr_val)
@@ -1,20 +1,35 @@
 from __future__ import annotations
+import asyncio
+import threading
+import time
 import requests
-from typing import Any, Dict, List, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+# Komut işleyicisi: (tam komut metni, argümanlar)
+Handler = Callable[[str, List[str]], Awaitable[None]]
+
+
+def command_name(text: str) -> str:
+    # "/cmd arg" veya "/cmd@bot" -> "/cmd"
+    name = text.strip().split()[0].lower() if text.strip() else ""
+    return name.split("@", 1)[0]
 
 
 class TelegramCommandPoller:
-    def __init__(self, bot_token: str, chat_id: str) -> None:
+    def __init__(self, bot_token: str, chat_id: str, admin_user_id: str = "") -> None:
         self.base = f"https://api.telegram.org/bot{bot_token}"
         self.chat_id = str(chat_id)
+        self.admin_user_id = str(admin_user_id or "")
         self.offset: int | None = None
+        # Kalıcı oturum: her long-poll yeni bağlantı açmaz
+        self._session = requests.Session()
 
     def _fetch(self, timeout: int = 25) -> List[Dict[str, Any]]:
         params: Dict[str, Any] = {"timeout": timeout}
         if self.offset is not None:
             params["offset"] = self.offset
         try:
-            r = requests.get(f"{self.base}/getUpdates", params=params, timeout=timeout + 5)
+            r = self._session.get(f"{self.base}/getUpdates", params=params, timeout=timeout + 5)
             data = r.json()
             updates = data.get("result", [])
             if updates:
@@ -23,19 +38,82 @@ class TelegramCommandPoller:
         except Exception:
             return []
 
-    def get_commands(self) -> List[Tuple[str, str]]:
+    def _commands(self, updates: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
         cmds: List[Tuple[str, str]] = []
-        for u in self._fetch():
+        for u in updates:
             msg = u.get("message") or u.get("edited_message") or {}
             from_id = str((msg.get("from") or {}).get("id", ""))
             if str(msg.get("chat", {}).get("id")) != self.chat_id:
                 continue
+            # Yönetici kontrolü tek yerde: yetkisiz göndericinin komutu hiç dağıtılmaz
+            if self.admin_user_id and from_id != self.admin_user_id:
+                continue
             text = (msg.get("text") or "").strip().lower()
-            if (
-                text.startswith("/mode ")
-                or text in ("/pause", "/resume", "/status", "/flat", "/autocoins", "/symbols", "/risk", "/selftest", "selftest")
-                or text.startswith("/size ")
-                or text.startswith("/lev ")
-            ):
+            if text.startswith("/") or text == "selftest":
                 cmds.append((text, from_id))
         return cmds
+
+    def get_commands(self, timeout: int = 25) -> List[Tuple[str, str]]:
+        return self._commands(self._fetch(timeout))
+
+
+class CommandListener:
+    """
+    Long-poll komut dinleyici. getUpdates kalıcı oturumla ayrı bir thread'de kesintisiz bekler
+    (mesaj gelince istek hemen döner); her komut olay döngüsüne aktarılır ve kayıtlı işleyicisi
+    ayrı task olarak anında başlar, uzun süren bir komut (ör. /selftest) diğerlerini bekletmez.
+    Kayıtsız komutlar yok sayılır; yönetici kontrolü poller'dadır.
+    """
+
+    def __init__(self, bot_token: str, chat_id: str, admin_user_id: str = "", poll_timeout: int = 25, on_error: Callable[[str, Exception], None] | None = None) -> None:
+        self.poller = TelegramCommandPoller(bot_token, chat_id, admin_user_id)
+        self.poll_timeout = poll_timeout
+        self.on_error = on_error
+        self.handlers: Dict[str, Handler] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._stop = threading.Event()
+
+    def command(self, *names: str) -> Callable[[Handler], Handler]:
+        def deco(fn: Handler) -> Handler:
+            for n in names:
+                self.handlers[n] = fn
+            return fn
+        return deco
+
+    def dispatch(self, text: str) -> asyncio.Task | None:
+        name = command_name(text)
+        fn = self.handlers.get(name)
+        if fn is None:
+            return None
+        task = asyncio.get_running_loop().create_task(self._call(name, fn, text))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _call(self, name: str, fn: Handler, text: str) -> None:
+        try:
+            await fn(text, text.split()[1:])
+        except Exception as e:
+            if self.on_error is not None:
+                self.on_error(name, e)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[str] = asyncio.Queue()
+
+        def pump() -> None:
+            while not self._stop.is_set():
+                t0 = time.monotonic()
+                updates = self.poller._fetch(self.poll_timeout)
+                for text, _ in self.poller._commands(updates):
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+                if not updates and time.monotonic() - t0 < 1.0:
+                    # Boş ve hızlı dönüş = hata (long-poll normalde süre dolana kadar bekler)
+                    self._stop.wait(1.0)
+
+        threading.Thread(target=pump, name="telegram-commands", daemon=True).start()
+        try:
+            while True:
+                self.dispatch(await queue.get())
+        finally:
+            self._stop.set()
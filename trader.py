@@ -1,22 +1,28 @@
 from __future__ import annotations
 import math
 import os
+import threading
 import time
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Tuple
+from typing import Any, Dict, Tuple
 
 import numpy as np
 import pandas as pd
 
 from config import CFG
-from exchange.binance_client import BinanceClient
+from exchange.binance_client import BinanceClient, BracketError
 from indicators import to_dataframe
 from notifier.telegram import TelegramNotifier
-from strategy import StrategyParams, evaluate
+from strategy import GATE_STATS, StrategyParams, evaluate
 from simple_strategy import evaluate_simple
 from telegram_commands import TelegramCommandPoller
 from indicators import atr as atr_ind
-from state_store import load_state, save_state
+from state_store import StateJournal
+from account_cache import AccountCache
+from reconcile import commit as reconcile_commit, fetch_snapshot, plan as reconcile_plan, run_repairs_sync
+from ledger import Ledger, summary_text
+from user_stream import UserStream
+from price_feed import MarkPriceFeed
 
 
 def fmt_pct(x: float) -> str:
@@ -59,7 +65,7 @@ def format_signal_msg(symbol: str, side: str, entry: float, sl: float, tp1: floa
     )
 
 
-def maybe_move_to_lock_profit(symbol: str, price: float, client: BinanceClient, state: dict, tg: TelegramNotifier) -> None:
+def maybe_move_to_lock_profit(symbol: str, price: float, client: BinanceClient, state: dict, tg: TelegramNotifier, journal: StateJournal | None = None) -> None:
     if state.get("be_done"):
         return
     side = state["side"]
@@ -82,6 +88,8 @@ def maybe_move_to_lock_profit(symbol: str, price: float, client: BinanceClient,
             state["sl_order_id"] = resp.get("orderId") if isinstance(resp, dict) else None
             state["sl_price"] = float(new_sl_fmt)
             state["be_done"] = True
+            if journal is not None:
+                journal.update(symbol, sl_order_id=state["sl_order_id"], sl_price=state["sl_price"], be_done=True)
             tg.send(f"🔒 {symbol} SL kilit kâr (LONG): {new_sl_fmt}")
     else:
         target_sl = entry - lock_atr
@@ -96,19 +104,36 @@ def maybe_move_to_lock_profit(symbol: str, price: float, client: BinanceClient,
             state["sl_order_id"] = resp.get("orderId") if isinstance(resp, dict) else None
             state["sl_price"] = float(new_sl_fmt)
             state["be_done"] = True
+            if journal is not None:
+                journal.update(symbol, sl_order_id=state["sl_order_id"], sl_price=state["sl_price"], be_done=True)
             tg.send(f"🔒 {symbol} SL kilit kâr (SHORT): {new_sl_fmt}")
 
 
 def main() -> None:
-    client = BinanceClient(CFG.binance_api_key, CFG.binance_api_secret)
-    tg = TelegramNotifier(CFG.telegram_bot_token, CFG.telegram_chat_id)
-    poller = TelegramCommandPoller(CFG.telegram_bot_token, CFG.telegram_chat_id)
-
-    # server time drift check
+    client = BinanceClient(CFG.binance_api_key, CFG.binance_api_secret, CFG.universe_ttl_seconds, CFG.universe_score, CFG.clock_sync_seconds, CFG.recv_window_ms, base_url=CFG.binance_base_url)
+    tg = TelegramNotifier(CFG.telegram_bot_token, CFG.telegram_chat_id, CFG.tg_rate_per_s, CFG.tg_burst, CFG.tg_queue_max, CFG.tg_digest_ms)
+    poller = TelegramCommandPoller(CFG.telegram_bot_token, CFG.telegram_chat_id, CFG.admin_user_id)
+
+    # server time offset: imzalı istekler düzeltilmiş saatle damgalanır, arka planda takip edilir
+    client.clock.sync()
+    client.clock.start()
+    drift = abs(client.clock.offset_ms)
+    if drift > CFG.time_drift_max_ms:
+        tg.send(f"⚠️ Saat farkı yüksek: {drift:.0f} ms (istekler düzeltiliyor, NTP senkron önerilir)")
+
+    # Hesap önbelleği: REST ile bir kez doldurulur, user-data stream ile güncel tutulur
+    account = AccountCache(ledger=Ledger(CFG.ledger_path, CFG.ledger_sync_seconds, CFG.ledger_bootstrap_days))
+    us = UserStream(CFG.binance_api_key, CFG.binance_api_secret, base_url=CFG.binance_base_url, stream_url=CFG.binance_ws_url, listeners=[account.apply])
+    stream_ok = False
+    try:
+        us.open()
+        stream_ok = True
+    except Exception as e:
+        tg.send(f"⚠️ User stream başlatılamadı, REST ile devam: {e}")
+    snapshot = None
     try:
-        drift = abs(client.server_time() - int(datetime.now(timezone.utc).timestamp() * 1000))
-        if drift > CFG.time_drift_max_ms:
-            tg.send(f"⚠️ Saat farkı yüksek: {drift} ms (NTP senkron önerilir)")
+        snapshot = fetch_snapshot(client)
+        account.seed(client, *snapshot)
     except Exception:
         pass
 
@@ -118,10 +143,45 @@ def main() -> None:
     cooldown: Dict[Tuple[str, str], datetime] = {}
     active: Dict[str, Dict] = {}
 
-    # Load state
-    state = load_state(CFG.state_path)
-    if isinstance(state.get("active"), dict):
-        active = state["active"]  # type: ignore
+    # Load state: anlık görüntü + günlük; değişiklikler oluştukları yerde günlüğe eklenir
+    journal = StateJournal(CFG.state_path, CFG.state_fsync_ms, CFG.state_compact_every)
+    active = journal.load()
+    state: Dict[str, Any] = {}
+
+    # Açık pozisyonların fiyat tick'leri: WS thread'i yalnızca sembol başına son fiyatı yazar
+    # (tek slot, son gelen kazanır); REST'li SL taşıma tek işçi thread'inde yapılır, böylece
+    # yavaş bir emir fiyat akışını ve ana döngüyü bekletmez. `active` erişimi kilitle korunur.
+    active_lock = threading.Lock()
+    latest_px: Dict[str, float] = {}
+    px_ready = threading.Condition()
+
+    def on_price(symbol: str, px: float) -> None:
+        if not CFG.trailing_enabled:
+            return
+        with px_ready:
+            latest_px[symbol] = px
+            px_ready.notify()
+
+    def lock_profit_worker() -> None:
+        while True:
+            with px_ready:
+                while not latest_px:
+                    px_ready.wait()
+                ticks = dict(latest_px)
+                latest_px.clear()
+            for symbol, px in ticks.items():
+                with active_lock:
+                    st = active.get(symbol)
+                if st is None:
+                    continue
+                try:
+                    maybe_move_to_lock_profit(symbol, px, client, st, tg, journal)
+                except Exception as e:
+                    tg.send(f"⚠️ {symbol} SL taşıma hatası: {e}")
+
+    threading.Thread(target=lock_profit_worker, name="lock-profit", daemon=True).start()
+
+    feed = MarkPriceFeed(CFG.binance_ws_url, source=CFG.price_stream, debounce_ms=CFG.price_debounce_ms, listeners=[on_price])
 
     params = StrategyParams(
         rsi_period=CFG.rsi_period,
@@ -144,46 +204,68 @@ def main() -> None:
     last_pnl_sent_day = datetime.now(timezone.utc).date()
 
     def get_daily_pnl() -> float:
-        try:
-            start_ms = int(datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).timestamp() * 1000)
-            inc = client.income_history(start_time_ms=start_ms)
-            return sum(float(i.get("income", 0) or 0) for i in inc)
-        except Exception:
-            return 0.0
+        return account.realized_pnl_today()
 
     def update_losing_streak(_state: dict) -> None:
-        try:
-            inc = client.income_history()
-            last = [float(i.get("income", 0) or 0) for i in inc if i.get("incomeType") == "REALIZED_PNL"][-5:]
-            streak = 0
-            for v in reversed(last):
-                if v < 0:
-                    streak += 1
-                else:
-                    break
-            _state["losing_streak"] = streak
-        except Exception:
-            pass
+        _state["losing_streak"] = account.losing_streak(5)
 
     def cid(tag: str, symbol: str) -> str:
         return f"{symbol}-{tag}-{int(time.time()*1000)}"
 
+    # Açılış mutabakatı: günlükteki durum borsadaki pozisyon/emirlerle eşlenir, eksik koruma onarılır
+    if snapshot is not None and CFG.run_mode.upper() == "LIVE":
+        try:
+            t0 = time.monotonic()
+
+            def atr_for(symbol: str) -> float:
+                df = to_dataframe(client.get_klines(symbol, CFG.entry_tf, limit=CFG.atr_period + 2))
+                val = float(atr_ind(df, CFG.atr_period).iloc[-1])
+                return val if val == val else 0.0
+
+            report, repairs = reconcile_plan(client, *snapshot, active, cid, sl_atr_mult=CFG.sl_atr_mult, tp1_atr_mult=CFG.tp1_atr_mult, tp2_atr_mult=CFG.tp2_atr_mult, atr_for=atr_for)
+            run_repairs_sync(repairs, report)
+            reconcile_commit(report, active, journal)
+            report.elapsed_s = time.monotonic() - t0
+            tg.send(report.text())
+        except Exception as e:
+            tg.send(f"⚠️ Mutabakat başarısız: {e}")
+
     while True:
         now = datetime.now(timezone.utc)
 
-        # Daily PnL summary
+        # User stream yoksa önbelleği her turda REST ile tazele; varsa listenKey'i canlı tut
+        if not stream_ok:
+            try:
+                account.seed(client)
+            except Exception:
+                pass
+        else:
+            # Watchdog: ölü/cevapsız user stream yeniden kurulur, listenKey zamanında yenilenir
+            try:
+                if us.check():
+                    account.seed(client)
+                    tg.send("🔌 User stream yeniden bağlandı, hesap önbelleği tazelendi")
+            except Exception:
+                pass
+        if CFG.price_stream != "off":
+            try:
+                feed.set_symbols(list(active.keys()))
+                feed.check()
+            except Exception:
+                pass
+
+        # Daily PnL summary (biten gün, defterden)
         if now.date() != last_pnl_sent_day:
             try:
-                pnl = get_daily_pnl()
-                tg.send(f"📊 Günlük PnL: {pnl:.2f} USDT")
+                prev = datetime(last_pnl_sent_day.year, last_pnl_sent_day.month, last_pnl_sent_day.day, tzinfo=timezone.utc)
+                start_ms = int(prev.timestamp() * 1000)
+                tg.send(summary_text(account.ledger.day_summary(start_ms, start_ms + 86_400_000)))
             except Exception:
                 pass
             last_pnl_sent_day = now.date()
 
-        # Handle Telegram commands (admin-only if set)
+        # Handle Telegram commands (admin-only if set; poller filtreler)
         for (cmd, from_id) in poller.get_commands():
-            if CFG.admin_user_id and from_id != str(CFG.admin_user_id):
-                continue
             if cmd.startswith("/mode "):
                 if "simple" in cmd:
                     mode = "simple"; tg.send("✅ Mod: Basit")
@@ -209,14 +291,14 @@ def main() -> None:
                     tg.send(f"✅ Leverage: {lev}x")
                 except Exception:
                     tg.send("⚠️ /lev kullanım: /lev 15")
+            elif cmd == "/gates":
+                lines = GATE_STATS.lines()
+                tg.send("ℹ️ Kapılar (reddedilen/toplam, ort. süre):\n" + ("\n".join(lines) if lines else "henüz değerlendirme yok"))
             elif cmd == "/status":
                 tg.send(f"ℹ️ Mod={mode}, Paused={'Evet' if paused else 'Hayır'}, Lev={CFG.leverage}x, Size={CFG.order_usdt_size} USDT, RUN_MODE={CFG.run_mode}")
 
-        # Persist state
-        try:
-            save_state({"active": active}, CFG.state_path)
-        except Exception:
-            pass
+        # Persist state: yalnızca fsync / anlık görüntü bakımı (tam dosya yeniden yazımı yok)
+        journal.flush()
 
         # Risk guards
         daily_pnl = get_daily_pnl()
@@ -239,6 +321,7 @@ def main() -> None:
                     exclude=CFG.exclude_symbols,
                     price_max=CFG.preferred_price_max,
                     prefer_low_price_max=CFG.low_price_priority_max,
+                    min_quote_volume=CFG.universe_min_quote_volume,
                 )[:CFG.max_concurrent_symbols]
                 last_refresh = now
                 tg.send("🔁 Symbol list refreshed: " + ", ".join(symbols))
@@ -247,41 +330,29 @@ def main() -> None:
 
         for symbol in symbols:
             try:
-                price = client.get_price(symbol)
-
-                # position cleanup
-                try:
-                    pos_list = client.get_position_risk(symbol=symbol)
-                    pos_amt = 0.0
-                    for p in pos_list or []:
-                        if p.get("symbol") == symbol:
-                            pos_amt = float(p.get("positionAmt", 0.0) or 0.0)
-                            break
-                    if abs(pos_amt) < 1e-9 and symbol in active:
+                # position cleanup (hesap önbelleğinden)
+                if symbol in active and abs(account.position_amt(symbol)) < 1e-9:
+                    with active_lock:
                         active.pop(symbol, None)
-                except Exception:
-                    pass
+                    journal.close(symbol)
 
-                if CFG.trailing_enabled and symbol in active:
-                    maybe_move_to_lock_profit(symbol, price, client, active[symbol], tg)
+                # Fiyat akışı canlıysa kilit kâr tick'lerde işlenir; akış yoksa/bayatsa REST fiyatı
+                # aynı slota yazılır (taşımayı yine işçi yapar, iki thread aynı SL'yi taşımaz)
+                if CFG.trailing_enabled and symbol in active and feed.price(symbol) is None:
+                    on_price(symbol, client.get_price(symbol))
 
                 if paused:
                     continue
 
                 # max open positions guard
-                open_positions_cnt = 0
-                try:
-                    risks = client.get_position_risk()
-                    open_positions_cnt = sum(1 for p in risks if abs(float(p.get("positionAmt", 0) or 0)) > 1e-9)
-                except Exception:
-                    pass
-                if open_positions_cnt >= CFG.max_open_positions:
+                if account.open_positions_count() >= CFG.max_open_positions:
                     continue
 
                 df1 = load_klines(client, symbol, CFG.entry_tf, limit=500)
                 df5 = load_klines(client, symbol, CFG.mtf_fast, limit=300)
                 df15 = load_klines(client, symbol, CFG.mtf_slow1, limit=200)
                 df1h = load_klines(client, symbol, CFG.mtf_slow2, limit=200)
+                price = float(df1["close"].iloc[-1])
 
                 sig = evaluate_simple(df1, params) if mode == "simple" else evaluate(df1, df5, df15, df1h, params)
                 if sig.side == "NONE" or sig.entry is None or sig.sl is None or sig.tp1 is None or sig.tp2 is None:
@@ -313,6 +384,8 @@ def main() -> None:
                 tp1_price = client.format_price(symbol, adjust_tp_for_smart_close(sig.tp1, side, params.smart_close_adj_pct))
                 tp2_price = client.format_price(symbol, adjust_tp_for_smart_close(sig.tp2, side, params.smart_close_adj_pct))
                 tp_qty = client.format_qty(symbol, qty / 2.0)
+                # Native modda TP1 seviyesinde aktifleşen borsa tarafı trailing stop (iz = TRAIL_ATR_MULT × ATR)
+                trail = (tp1_price, client.callback_rate_for(CFG.trail_atr_mult * atr_val, tp1_price)) if CFG.trail_mode == "native" else None
 
                 if CFG.run_mode.upper() == "PAPER":
                     cooldown[cd_key] = now
@@ -324,15 +397,20 @@ def main() -> None:
                         "sl_price": float(sl_price),
                         "be_done": False,
                     }
+                    journal.open(symbol, active[symbol])
                     tg.send(f"🧪 PAPER {symbol} {side} entry={sig.entry:.6f} sl={sig.sl:.6f}")
                     time.sleep(0.2)
                     continue
 
                 # LIVE: idempotent + retry
                 order = client.place_market_order(symbol, side, qty, client_id=cid("MKT", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
-                sl_resp = client.place_stop_market(symbol, sl_side, sl_price_fmt, close_position=True, reduce_only=True, client_id=cid("SL", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
-                client.place_take_profit_market(symbol, sl_side, tp1_price, quantity=tp_qty, reduce_only=True, client_id=cid("TP1", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
-                client.place_take_profit_market(symbol, sl_side, tp2_price, quantity=tp_qty, reduce_only=True, client_id=cid("TP2", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
+                try:
+                    legs = client.place_bracket(symbol, sl_side, sl_price_fmt, tp1_price, tp2_price, tp_qty, client_ids={t: cid(t, symbol) for t in ("SL", "TP1", "TP2", "TRAIL")}, trail=trail, max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
+                except BracketError as be:
+                    client.place_market_order(symbol, sl_side, qty, reduce_only=True, client_id=cid("FLAT", symbol), max_retry=CFG.order_retry_max, backoff_ms=CFG.order_retry_backoff_ms)
+                    cooldown[cd_key] = now
+                    tg.send(f"⚠️ {symbol} bracket hatası, pozisyon kapatıldı: {be}")
+                    continue
 
                 cooldown[cd_key] = now
 
@@ -340,12 +418,16 @@ def main() -> None:
                     "side": side,
                     "entry": float(sig.entry),
                     "atr": atr_val,
-                    "sl_order_id": sl_resp.get("orderId") if isinstance(sl_resp, dict) else None,
+                    "sl_order_id": legs["SL"].order_id,
+                    "trail_order_id": legs["TRAIL"].order_id if "TRAIL" in legs else None,
+                    "tp1_order_id": legs["TP1"].order_id,
+                    "tp2_order_id": legs["TP2"].order_id,
                     "sl_price": float(sl_price_fmt),
                     "be_done": False,
                 }
+                journal.open(symbol, active[symbol])
 
-                tg.send(format_signal_msg(symbol, side, sig.entry, sig.sl, sig.tp1, sig.tp2, 0.0, atr_val))
+                tg.send(format_signal_msg(symbol, side, sig.entry, sig.sl, sig.tp1, sig.tp2, 0.0, atr_val), html=True)
 
                 time.sleep(1)
 
@@ -0,0 +1,95 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, Callable, Dict
+
+from exchange.binance_client import BinanceClient
+from notifier.telegram import TelegramNotifier
+
+
+class TrailingManager:
+    """
+    TP1 sonrası trailing SL'nin tek sahibi. Fiyatlar `on_price` ile sembol başına son değere
+    birleşir; ayrı task her pencerede kirli sembolleri toplu işler. Hedef, TP1'den beri görülen
+    en iyi fiyattan hesaplanır; SL yalnızca iyileşme eşiği (tick veya ATR oranı) aşıldığında
+    ve sembol başına en az `min_interval_s` arayla taşınır. Eşik altındaki iyileşme
+    `settle_s` sonra yine uygulanır: stop, her tick'te taşınsaydı varacağı seviyeye varır.
+    """
+
+    def __init__(self, active: Dict[str, dict], move: Callable[..., None], trail_atr_mult: float = 1.0, min_ticks: int = 3, min_atr_frac: float = 0.1, min_interval_s: float = 10.0, settle_s: float = 60.0, batch_ms: float = 250.0) -> None:
+        self.active = active
+        self.move = move                    # schedule_sl_move(symbol, target, tag, client, tg, note)
+        self.trail_atr_mult = trail_atr_mult
+        self.min_ticks = min_ticks
+        self.min_atr_frac = min_atr_frac
+        self.min_interval_s = min_interval_s
+        self.settle_s = settle_s
+        self.batch_s = batch_ms / 1000.0
+        self._dirty: Dict[str, float] = {}
+        self._track: Dict[str, Dict[str, float]] = {}   # symbol -> {"best", "last"}
+        self._wake: asyncio.Event | None = None
+        self.stats = {"ticks": 0, "moves": 0, "suppressed": 0, "settled": 0}
+
+    def on_price(self, symbol: str, price: float) -> None:
+        st = self.active.get(symbol)
+        if not st or not st.get("tp1_hit") or price is None:
+            return
+        self._dirty[symbol] = float(price)
+        self.stats["ticks"] += 1
+        if self._wake is not None:
+            self._wake.set()
+
+    def _update(self, symbol: str, price: float | None, now: float, client: BinanceClient, tg: TelegramNotifier) -> None:
+        st = self.active.get(symbol)
+        if not st or not st.get("tp1_hit"):
+            self._track.pop(symbol, None)
+            return
+        buy = st["side"] == "BUY"
+        tr = self._track.get(symbol)
+        if tr is None:
+            if price is None:
+                return
+            # İlk eşik aşan iyileşme beklemeden uygulanır; yerleşme süresi buradan sayılır
+            tr = self._track[symbol] = {"best": price, "last": now - self.min_interval_s}
+        elif price is not None:
+            tr["best"] = max(tr["best"], price) if buy else min(tr["best"], price)
+        atr_val = float(st["atr"])
+        trail = self.trail_atr_mult * atr_val
+        current = float(st.get("sl_target", st["sl_price"]))
+        target = client.format_price(symbol, tr["best"] - trail if buy else tr["best"] + trail)
+        gain = (target - current) if buy else (current - target)
+        tick = client.tick_size(symbol)
+        if gain < max(tick, 1e-12) * 0.5:
+            return
+        since = now - tr["last"]
+        if gain >= max(self.min_ticks * tick, self.min_atr_frac * atr_val) and since >= self.min_interval_s:
+            self.stats["moves"] += 1
+        elif since >= self.settle_s:
+            self.stats["settled"] += 1
+        else:
+            if price is not None:
+                self.stats["suppressed"] += 1
+            return
+        tr["last"] = now
+        self.move(symbol, target, "SLTR", client, tg, f"🧭 {symbol} SL trail ({'LONG' if buy else 'SHORT'}): {{sl}}")
+
+    async def run(self, client: BinanceClient, tg: TelegramNotifier) -> None:
+        self._wake = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=1.0)
+                # Pencere: aynı anda gelen tick'ler (ve bar kapanışları) tek geçişte işlenir
+                await asyncio.sleep(self.batch_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            dirty, self._dirty = self._dirty, {}
+            now = time.monotonic()
+            for symbol in set(dirty) | set(self._track):
+                try:
+                    self._update(symbol, dirty.get(symbol), now, client, tg)
+                except Exception:
+                    pass
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "tracked": len(self._track)}
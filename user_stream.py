@@ -1,40 +1,147 @@
 from __future__ import annotations
-import asyncio, json
+import asyncio, json, time
+from typing import Awaitable, Callable, Dict, List
 from binance.um_futures import UMFutures
 from binance.websocket.um_futures.websocket_client import UMFuturesWebsocketClient
 
+from ws_manager import backoff_delay, close_ws
+
+# listenKey 60 dk geçerli; Binance 30 dk'da bir yenilemeyi önerir
+KEEPALIVE_SECONDS = 30 * 60
+
+
 class UserStream:
-    def __init__(self, api_key: str, api_secret: str) -> None:
-        self.rest = UMFutures(key=api_key, secret=api_secret)
-        self.ws = UMFuturesWebsocketClient()
+    def __init__(self, api_key: str, api_secret: str, listeners: List[Callable[[Dict], None]] | None = None, base_url: str | None = None, stream_url: str = "wss://fstream.binance.com") -> None:
+        self.rest = UMFutures(key=api_key, secret=api_secret, **({"base_url": base_url} if base_url else {}))
+        self.stream_url = stream_url
+        self.ws: UMFuturesWebsocketClient | None = None
         self.q: asyncio.Queue = asyncio.Queue()
+        # WS thread'inde senkron çağrılır (ör. AccountCache.apply)
+        self.listeners: List[Callable[[Dict], None]] = list(listeners or [])
+        self._loop: asyncio.AbstractEventLoop | None = None
         self._listen_key: str | None = None
         self._started: bool = False
+        # Liveness: user-data akışı uzun süre sessiz kalabilir, bu yüzden ping/pong ile yoklanır
+        self.dead: bool = False
+        self.last_msg: float = time.monotonic()
+        self.last_pong: float = time.monotonic()
+        self._ping_sent: float | None = None
+        self._last_keepalive: float = time.monotonic()
+        self._attempts: int = 0
+        self._next_retry: float = 0.0
+        self.reconnects: int = 0
 
-    async def start(self) -> None:
-        if self._started:
+    def _on_msg(self, _, msg: str) -> None:
+        self.last_msg = time.monotonic()
+        try:
+            evt = json.loads(msg)
+        except Exception:
             return
-        lk = self.rest.new_listen_key()["listenKey"]
-        self._listen_key = lk
-        def cb(_, msg: str):
+        for fn in self.listeners:
             try:
-                self.q.put_nowait(json.loads(msg))
+                fn(evt)
             except Exception:
                 pass
-        self.ws.user_data(listen_key=lk, callback=cb)
+        # asyncio.Queue thread-safe değil; olay döngüsüne devret
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.q.put_nowait, evt)
+
+    def _on_pong(self, *_) -> None:
+        self.last_pong = time.monotonic()
+
+    def _on_dead(self, *_) -> None:
+        self.dead = True
+
+    def open(self) -> None:
+        """Senkron başlatma (trader.py); olaylar yalnızca listener'lara gider."""
+        if self._started:
+            return
+        lk = self.rest.new_listen_key()["listenKey"]
+        self._listen_key = lk
+        self.ws = UMFuturesWebsocketClient(stream_url=self.stream_url, on_message=self._on_msg, on_pong=self._on_pong, on_close=self._on_dead, on_error=self._on_dead)
+        self.ws.user_data(listen_key=lk)
+        now = time.monotonic()
+        self.dead = False
+        self.last_msg = self.last_pong = self._last_keepalive = now
+        self._ping_sent = None
         self._started = True
 
-    async def stop(self) -> None:
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self.open()
+
+    def close(self) -> None:
         try:
-            await asyncio.to_thread(self.ws.stop)
+            if self.ws is not None:
+                close_ws(self.ws)
         except Exception:
             pass
         self._started = False
 
+    async def stop(self) -> None:
+        await asyncio.to_thread(self.close)
+
+    def keepalive(self) -> None:
+        if self._listen_key:
+            self.rest.renew_listen_key(self._listen_key)
+            self._last_keepalive = time.monotonic()
+
+    def check(self, ping_every_s: float = 30.0, pong_timeout_s: float = 10.0) -> bool:
+        """
+        Watchdog adımı (engelleyici). Ölü soket veya cevapsız ping'de yeni listenKey ile
+        yeniden bağlanır; zamanı gelince listenKey'i yeniler. Yeniden bağlandıysa True döner,
+        çağıran kaçırılmış olaylar için hesap önbelleğini REST ile tazelemeli.
+        """
+        if not self._started:
+            return False
+        now = time.monotonic()
+        pong_overdue = self._ping_sent is not None and self.last_pong < self._ping_sent and now - self._ping_sent > pong_timeout_s
+        if self.dead or pong_overdue:
+            if now < self._next_retry:
+                return False
+            try:
+                self.close()
+                self.open()
+            except Exception:
+                # Bir sonraki denemede tekrar denensin
+                self.dead = True
+                self._started = True
+                self._next_retry = now + backoff_delay(self._attempts)
+                self._attempts += 1
+                return False
+            self._attempts = 0
+            self.reconnects += 1
+            return True
+        if self.ws is not None and now - max(self.last_msg, self.last_pong, self._ping_sent or 0.0) > ping_every_s:
+            try:
+                self.ws.ping()
+                self._ping_sent = now
+            except Exception:
+                self.dead = True
+        if now - self._last_keepalive > KEEPALIVE_SECONDS:
+            try:
+                self.keepalive()
+            except Exception:
+                # listenKey geçersiz: bir sonraki adımda yeni anahtarla yeniden bağlan
+                self.dead = True
+        return False
+
+    async def supervise(self, on_reconnect: Callable[[], Awaitable[None]] | None = None, interval_s: float = 1.0) -> None:
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                reconnected = await asyncio.to_thread(self.check)
+            except Exception:
+                continue
+            if reconnected and on_reconnect is not None:
+                try:
+                    await on_reconnect()
+                except Exception:
+                    pass
+
     async def refresh_listen_key(self) -> None:
         try:
-            if self._listen_key:
-                await asyncio.to_thread(self.rest.keepalive_listen_key, self._listen_key)
+            await asyncio.to_thread(self.keepalive)
         except Exception:
             # Fallback: restart user stream
             await self.stop()
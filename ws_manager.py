@@ -1,49 +1,364 @@
 from __future__ import annotations
-import asyncio, json, time
+import asyncio, itertools, json, random, threading, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, NamedTuple, Set, Tuple
 from binance.websocket.um_futures.websocket_client import UMFuturesWebsocketClient
 
+try:  # opsiyonel hızlı ayrıştırıcı
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Binance: bağlantı başına en fazla 200 stream (combined) ve saniyede 10 gelen mesaj
+MAX_STREAMS_PER_CONN = 200
+SUBSCRIBE_BATCH = 50
+MSG_INTERVAL_S = 0.15
+
+
+# Binance çerçeveleri boşluksuz JSON; kapanmamış kline güncellemeleri ayrıştırılmadan elenir
+_FINAL_KLINE = '"x":true'
+
+
+class ClosedBar(NamedTuple):
+    symbol: str
+    interval: str
+    # indicators.to_dataframe sırası: ot,o,h,l,c,v,ct,q,n,V,Q,ignore
+    row: list
+    recv: float = 0.0   # WS çerçevesinin alındığı an (monotonic); REST ile tamamlananlarda 0
+
+
+def kline_row(k: Dict[str, Any]) -> list:
+    return [
+        int(k["t"]), float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"]),
+        int(k["T"]), float(k.get("q", 0.0)), int(k.get("n", 0)), float(k.get("V", 0.0)), float(k.get("Q", 0.0)), "",
+    ]
+
+
+def rest_kline_row(r: List[Any]) -> list:
+    """REST /klines satırını (string alanlar) bar önbelleği satırına çevir."""
+    return [int(r[0]), float(r[1]), float(r[2]), float(r[3]), float(r[4]), float(r[5]), int(r[6]), float(r[7]), int(r[8]), float(r[9]), float(r[10]), ""]
+
+
+def backoff_delay(attempt: int, base_s: float = 1.0, cap_s: float = 30.0) -> float:
+    """Üstel geri çekilme, ±%50 jitter (eşzamanlı yeniden bağlanmaları dağıtır)."""
+    return min(cap_s, base_s * (2 ** attempt)) * random.uniform(0.5, 1.5)
+
+
+def close_ws(ws: UMFuturesWebsocketClient, timeout_s: float = 2.0) -> None:
+    """
+    SDK'nın stop()'u okuyucu thread'i join ile bekler; sessizce ölmüş sokette sonsuza
+    kadar asılı kalabilir. Close frame gönderilir, soket zorla kapatılır, join sınırlıdır.
+    """
+    sm = getattr(ws, "socket_manager", None)
+    if sm is None:
+        return
+    try:
+        sm.close()
+    except Exception:
+        pass
+    try:
+        sm.ws.abort()
+    except Exception:
+        pass
+    sm.join(timeout_s)
+
+
+def decode_closed_kline(msg: str | bytes) -> ClosedBar | None:
+    """Yalnızca kapanmış kline çerçevelerini tam ayrıştırır; diğerleri için None."""
+    if isinstance(msg, bytes):
+        if b'"x":true' not in msg:
+            return None
+    elif _FINAL_KLINE not in msg:
+        return None
+    data = json_loads(msg)
+    # combined stream: {"stream": "...", "data": {...}}
+    data = data.get("data", data)
+    k = data.get("k")
+    if data.get("e") != "kline" or not k or not k.get("x"):
+        return None
+    return ClosedBar(str(k["s"]).upper(), str(k["i"]), kline_row(k))
+
+
+class CoalescingBridge:
+    """
+    WS thread'inden asyncio döngüsüne thread-safe, sınırlı aktarım. Her anahtar
+    (ör. (symbol, tf)) için tek bir bekleyen slot tutulur: tüketici gerideyse yeni
+    öğe eskisinin yerine geçer (son gelen kazanır), böylece bayat barlar geç
+    işlenmez. Kapasite dolarsa en eski slot düşürülür.
+    """
+
+    def __init__(self, maxsize: int = 2048) -> None:
+        self.maxsize = maxsize
+        self._slots: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._ready = asyncio.Event()
+        self.received = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def put(self, key: Hashable, item: Any, stale: Callable[[Any, Any], bool] | None = None) -> None:
+        """
+        Herhangi bir thread'den çağrılabilir. `stale(bekleyen, yeni)` True dönerse bekleyen
+        öğe korunur ve yeni öğe atılır (ör. geç gelen backfill barı canlı barı ezmesin).
+        """
+        with self._lock:
+            self.received += 1
+            if key in self._slots:
+                if stale is None or not stale(self._slots[key], item):
+                    self._slots[key] = item
+                self.coalesced += 1
+                return
+            if len(self._slots) >= self.maxsize:
+                self._slots.popitem(last=False)
+                self.dropped += 1
+            self._slots[key] = item
+            depth = len(self._slots)
+            self.max_depth = max(self.max_depth, depth)
+        # Yalnızca boş -> dolu geçişinde döngü uyandırılır
+        if depth == 1 and self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._ready.set)
+            except RuntimeError:
+                pass
+
+    async def get(self) -> Any:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._slots:
+                    _, item = self._slots.popitem(last=False)
+                    self.delivered += 1
+                    return item
+                self._ready.clear()
+            await self._ready.wait()
+
+    def drain(self) -> List[Any]:
+        """Bekleyen tüm öğeleri engellemeden al (batch tüketimi için)."""
+        with self._lock:
+            items = list(self._slots.values())
+            self._slots.clear()
+            self.delivered += len(items)
+            return items
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._slots)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "depth": len(self._slots),
+                "max_depth": self.max_depth,
+                "received": self.received,
+                "delivered": self.delivered,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+            }
+
+
+class _Shard:
+    def __init__(self) -> None:
+        self.ws: UMFuturesWebsocketClient | None = None
+        self.streams: Set[str] = set()
+        self.last_msg = time.monotonic()
+        self.last_msg_ms = int(time.time() * 1000)
+        self.dead = False
+        self.attempts = 0
+        self.next_retry = 0.0
+        self.reconnects = 0
+
+
 class WSManager:
-    def __init__(self, symbols: list[str], intervals: list[str]) -> None:
+    """
+    Kline akışları combined-stream bağlantı(lar)ı üzerinden taşınır. Sembol yenilemede
+    bağlantılar kapatılmaz; eski/yeni stream kümeleri karşılaştırılıp yalnızca farklar
+    için SUBSCRIBE/UNSUBSCRIBE gönderilir. Stream sayısı bağlantı limitini aşarsa
+    yeni bir shard açılır, boşalan shard kapatılır.
+    """
+
+    def __init__(self, symbols: list[str], intervals: list[str], stream_url: str = "wss://fstream.binance.com", max_streams_per_conn: int = MAX_STREAMS_PER_CONN, bridge_maxsize: int = 2048) -> None:
         self.symbols = [s.lower() for s in symbols]
         self.intervals = intervals
-        self.ws = UMFuturesWebsocketClient()
-        self.q: asyncio.Queue = asyncio.Queue()
+        self.stream_url = stream_url
+        self.max_streams_per_conn = max_streams_per_conn
+        self.shards: List[_Shard] = []
+        # Kapanan barlar (symbol, interval) slotlarında birleşir; bkz. CoalescingBridge
+        self.bridge = CoalescingBridge(bridge_maxsize)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
         self._started: bool = False
+        # stream -> son mesaj zamanı (monotonic); watchdog ve /status için
+        self.last_seen: Dict[str, float] = {}
+        self.reconnects = 0
 
-    def _on_msg(self, *args) -> None:
+    @staticmethod
+    def streams_for(symbols: Iterable[str], intervals: Iterable[str]) -> Set[str]:
+        return {f"{s.lower()}@kline_{tf}" for s in symbols for tf in intervals}
+
+    @property
+    def subscribed(self) -> Set[str]:
+        return set().union(*(sh.streams for sh in self.shards)) if self.shards else set()
+
+    def _on_msg(self, shard: _Shard, msg: str) -> None:
+        now = time.monotonic()
+        shard.last_msg = now
+        shard.last_msg_ms = int(time.time() * 1000)
         try:
-            msg = args[-1]
-            data = json.loads(msg)
-            if data.get("e") == "kline":
-                k = data["k"]
-                if k.get("x"):
-                    self.q.put_nowait(k)
+            # {"stream":"<ad>","data":...}: stream adı tam ayrıştırmadan okunur
+            if msg.startswith('{"stream":"'):
+                self.last_seen[msg[11:msg.index('"', 11)]] = now
+            bar = decode_closed_kline(msg)
+            if bar is not None:
+                self.bridge.put((bar.symbol, bar.interval), bar._replace(recv=now))
         except Exception:
             pass
 
+    def _connect(self, shard: _Shard) -> None:
+        def dead(*_: Any) -> None:
+            shard.dead = True
+
+        shard.ws = UMFuturesWebsocketClient(
+            stream_url=self.stream_url,
+            on_message=lambda _, msg: self._on_msg(shard, msg),
+            on_close=dead,
+            on_error=dead,
+            is_combined=True,
+        )
+        shard.dead = False
+        shard.last_msg = time.monotonic()
+
+    def _new_shard(self) -> _Shard:
+        shard = _Shard()
+        self._connect(shard)
+        self.shards.append(shard)
+        return shard
+
+    def _send(self, shard: _Shard, method: str, streams: List[str]) -> None:
+        for i in range(0, len(streams), SUBSCRIBE_BATCH):
+            chunk = streams[i:i + SUBSCRIBE_BATCH]
+            if method == "SUBSCRIBE":
+                shard.ws.subscribe(chunk, id=next(self._ids))
+                shard.streams.update(chunk)
+            else:
+                shard.ws.unsubscribe(chunk, id=next(self._ids))
+                shard.streams.difference_update(chunk)
+            time.sleep(MSG_INTERVAL_S)
+
+    def _apply(self, desired: Set[str]) -> Dict[str, int]:
+        with self._lock:
+            removed = 0
+            for shard in self.shards:
+                gone = sorted(shard.streams - desired)
+                if gone:
+                    self._send(shard, "UNSUBSCRIBE", gone)
+                    removed += len(gone)
+            # Boşalan shard'ları kapat (en az bir bağlantı açık kalır)
+            for shard in [sh for sh in self.shards if not sh.streams][: max(len(self.shards) - 1, 0)]:
+                close_ws(shard.ws)
+                self.shards.remove(shard)
+            todo = sorted(desired - self.subscribed)
+            added = len(todo)
+            while todo:
+                shard = next((sh for sh in self.shards if len(sh.streams) < self.max_streams_per_conn), None) or self._new_shard()
+                room = self.max_streams_per_conn - len(shard.streams)
+                self._send(shard, "SUBSCRIBE", todo[:room])
+                todo = todo[room:]
+            return {"added": added, "removed": removed, "connections": len(self.shards)}
+
+    def reconnect_stale(self, stale_s: float = 10.0) -> List[Tuple[List[str], int]]:
+        """
+        Ölü veya `stale_s` boyunca sessiz shard'ları yeniden bağlar ve aboneliklerini
+        geri yükler. Dönüş: (stream listesi, kesintinin başladığı epoch ms) — REST backfill için.
+        """
+        gaps: List[Tuple[List[str], int]] = []
+        with self._lock:
+            now = time.monotonic()
+            for shard in self.shards:
+                if not shard.streams or now < shard.next_retry:
+                    continue
+                if not shard.dead and now - shard.last_msg < stale_s:
+                    continue
+                since_ms = shard.last_msg_ms
+                streams = sorted(shard.streams)
+                try:
+                    if shard.ws is not None:
+                        close_ws(shard.ws)
+                    self._connect(shard)
+                    shard.streams = set()
+                    self._send(shard, "SUBSCRIBE", streams)
+                    shard.attempts = 0
+                    shard.reconnects += 1
+                    self.reconnects += 1
+                    gaps.append((streams, since_ms))
+                except Exception:
+                    shard.dead = True
+                    shard.streams = set(streams)
+                    shard.next_retry = time.monotonic() + backoff_delay(shard.attempts)
+                    shard.attempts += 1
+        return gaps
+
+    async def supervise(self, on_gap: Callable[[List[str], int], Awaitable[None]] | None = None, interval_s: float = 1.0, stale_s: float = 10.0) -> None:
+        """Liveness watchdog: sessiz/ölü bağlantıyı saniyeler içinde yeniden kurar."""
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                gaps = await asyncio.to_thread(self.reconnect_stale, stale_s)
+            except Exception:
+                continue
+            for streams, since_ms in gaps:
+                if on_gap is not None:
+                    try:
+                        await on_gap(streams, since_ms)
+                    except Exception:
+                        pass
+
     async def start(self) -> None:
         if self._started:
             return
-        for s in self.symbols:
-            for tf in self.intervals:
-                self.ws.kline(symbol=s, interval=tf, id=int(time.time()*1000), callback=self._on_msg)
+        self.bridge.bind(asyncio.get_running_loop())
+        await asyncio.to_thread(self._apply, self.streams_for(self.symbols, self.intervals))
         self._started = True
 
+    async def update(self, symbols: list[str], intervals: list[str]) -> Dict[str, int]:
+        """Yalnızca değişen stream'ler için abone ol / aboneliği bırak; bağlantılar korunur."""
+        self.symbols = [s.lower() for s in symbols]
+        self.intervals = intervals
+        return await asyncio.to_thread(self._apply, self.streams_for(self.symbols, self.intervals))
+
+    async def restart(self, symbols: list[str], intervals: list[str]) -> None:
+        # Geriye dönük uyumluluk: artık bağlantıyı yıkmadan fark uygular
+        await self.update(symbols, intervals)
+
     async def stop(self) -> None:
         # Try best-effort stop; wrap in thread as SDK may block
-        try:
-            await asyncio.to_thread(self.ws.stop)
-        except Exception:
-            pass
+        for shard in self.shards:
+            try:
+                if shard.ws is not None:
+                    await asyncio.to_thread(close_ws, shard.ws)
+            except Exception:
+                pass
+        self.shards = []
         self._started = False
 
-    async def restart(self, symbols: list[str], intervals: list[str]) -> None:
-        await self.stop()
-        # Re-initialize underlying client to ensure clean subscriptions
-        self.symbols = [s.lower() for s in symbols]
-        self.intervals = intervals
-        self.ws = UMFuturesWebsocketClient()
-        await self.start()
+    async def get_closed_bar(self) -> ClosedBar:
+        return await self.bridge.get()
+
+    async def get_closed_batch(self, window_s: float = 0.0) -> List[ClosedBar]:
+        """İlk kapanmış barı bekle, `window_s` kadar aynı sınırdaki diğer barları topla."""
+        first = await self.bridge.get()
+        if window_s > 0:
+            await asyncio.sleep(window_s)
+        return [first] + self.bridge.drain()
 
-    async def get_closed_bar(self) -> dict:
-        return await self.q.get()
+    def stats(self) -> Dict[str, int]:
+        now = time.monotonic()
+        oldest = max((now - self.last_seen.get(st, now) for st in self.subscribed), default=0.0)
+        return dict(self.bridge.stats(), connections=len(self.shards), streams=len(self.subscribed), reconnects=self.reconnects, oldest_stream_age_s=int(oldest))